@@ -30,15 +30,18 @@
 ###############################################################################
 
 import glob
+import json
 import os
 import os.path
 import shutil
+import sqlite3
+import struct
 import sys
 
 import pytest
 import test_py_scripts  # noqa  # pylint: disable=E0401
 
-from osgeo import gdal  # noqa
+from osgeo import gdal, osr  # noqa
 from osgeo_utils.gdalcompare import compare_db
 
 
@@ -647,3 +650,559 @@ def test_gdal2tiles_py_webp():
 
     if pil_available:
         _run_webp_test(script_path, "antialias")
+
+
+def _compare_tile_folders(expected_folder, got_folder, ext="png"):
+    expected_tiles = sorted(
+        os.path.relpath(filename, expected_folder)
+        for filename in glob.glob(os.path.join(expected_folder, "*", "*", "*." + ext))
+    )
+    got_tiles = sorted(
+        os.path.relpath(filename, got_folder)
+        for filename in glob.glob(os.path.join(got_folder, "*", "*", "*." + ext))
+    )
+    assert expected_tiles
+    assert got_tiles == expected_tiles
+
+    for tile in expected_tiles:
+        diff_found = compare_db(
+            gdal.Open(os.path.join(got_folder, tile)),
+            gdal.Open(os.path.join(expected_folder, tile)),
+        )
+        assert not diff_found, tile
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        "--processes=2",
+        "--in-memory-pyramid",
+        "--processes=2 --in-memory-pyramid",
+        "--threads=2",
+        "--threads=3 --in-memory-pyramid",
+        "--metatile=2",
+        "--metatile=4 --processes=2 --in-memory-pyramid",
+    ],
+)
+def test_gdal2tiles_py_sub_pyramids(options):
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    shutil.rmtree("tmp/out_gdal2tiles_smallworld_ref", ignore_errors=True)
+    shutil.rmtree("tmp/out_gdal2tiles_smallworld_sub_pyramids", ignore_errors=True)
+
+    try:
+        # Reference: single process, overview tiles generated zoom level by
+        # zoom level from the tiles on disk
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif tmp/out_gdal2tiles_smallworld_ref",
+        )
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 "
+            + options
+            + " "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif tmp/out_gdal2tiles_smallworld_sub_pyramids",
+        )
+
+        # PNG is lossless, so tiles must be identical whatever the scheduling
+        _compare_tile_folders(
+            "tmp/out_gdal2tiles_smallworld_ref",
+            "tmp/out_gdal2tiles_smallworld_sub_pyramids",
+        )
+    finally:
+        shutil.rmtree("tmp/out_gdal2tiles_smallworld_ref", ignore_errors=True)
+        shutil.rmtree("tmp/out_gdal2tiles_smallworld_sub_pyramids", ignore_errors=True)
+
+
+@pytest.mark.parametrize(
+    "options", ["--processes=2", "--threads=2", "--in-memory-pyramid"]
+)
+def test_gdal2tiles_py_sub_pyramids_progress(options):
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    shutil.rmtree("tmp/out_gdal2tiles_smallworld_progress", ignore_errors=True)
+
+    try:
+        ret = test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-z 0-3 "
+            + options
+            + " "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif tmp/out_gdal2tiles_smallworld_progress",
+        )
+
+        # Base tiles (with the overview tiles of their sub-pyramid), then the
+        # overview tiles above the roots of the sub-pyramids
+        assert "Generating Base Tiles:" in ret
+        assert "Generating Overview Tiles:" in ret
+        base_progress, overview_progress = ret.split("Generating Overview Tiles:")
+        assert "0...10...20...30...40...50...60...70...80...90...100" in base_progress
+        assert "0...10...20...30...40...50...60...70...80...90...100" in (
+            overview_progress
+        )
+    finally:
+        shutil.rmtree("tmp/out_gdal2tiles_smallworld_progress", ignore_errors=True)
+
+
+def _remove_file(filename):
+    if os.path.isfile(filename):
+        os.unlink(filename)
+
+
+@pytest.mark.parametrize(
+    "ext,options",
+    [
+        ("mbtiles", ""),
+        ("mbtiles", "--processes=2"),
+        ("mbtiles", "--threads=2"),
+        ("gpkg", ""),
+        ("gpkg", "--processes=2"),
+    ],
+)
+def test_gdal2tiles_py_single_file_output(ext, options):
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    out_filename = "tmp/out_gdal2tiles_smallworld." + ext
+    shutil.rmtree("tmp/out_gdal2tiles_smallworld_ref", ignore_errors=True)
+    _remove_file(out_filename)
+
+    try:
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif tmp/out_gdal2tiles_smallworld_ref",
+        )
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 "
+            + options
+            + " "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif "
+            + out_filename,
+        )
+
+        conn = sqlite3.connect(out_filename)
+        if ext == "mbtiles":
+            table_name = "tiles"
+            metadata = dict(conn.execute("SELECT name, value FROM metadata"))
+            assert metadata["format"] == "png"
+            assert metadata["minzoom"] == "0"
+            assert metadata["maxzoom"] == "3"
+        else:
+            table_name = '"out_gdal2tiles_smallworld"'
+            assert conn.execute(
+                "SELECT srs_id FROM gpkg_tile_matrix_set"
+            ).fetchone() == (3857,)
+        rows = conn.execute(
+            "SELECT zoom_level, tile_column, tile_row, tile_data FROM " + table_name
+        ).fetchall()
+        conn.close()
+
+        ref_tiles = glob.glob(
+            os.path.join("tmp/out_gdal2tiles_smallworld_ref", "*", "*", "*.png")
+        )
+        assert len(rows) == len(ref_tiles)
+
+        for tz, tx, ty, data in rows:
+            if ext == "gpkg":
+                # GeoPackage rows are counted from the top of the matrix
+                ty = (1 << tz) - 1 - ty
+            gdal.FileFromMemBuffer("/vsimem/tile.png", bytes(data))
+            ref_filename = "tmp/out_gdal2tiles_smallworld_ref/%d/%d/%d.png" % (
+                tz,
+                tx,
+                ty,
+            )
+            diff_found = compare_db(
+                gdal.Open("/vsimem/tile.png"), gdal.Open(ref_filename)
+            )
+            gdal.Unlink("/vsimem/tile.png")
+            assert not diff_found, ref_filename
+
+        if ext == "gpkg" and gdal.GetDriverByName("GPKG") is not None:
+            ds = gdal.Open(out_filename)
+            assert ds.RasterCount == 4
+            assert ds.GetRasterBand(1).GetOverviewCount() == 3
+    finally:
+        shutil.rmtree("tmp/out_gdal2tiles_smallworld_ref", ignore_errors=True)
+        _remove_file(out_filename)
+
+
+def test_gdal2tiles_py_pmtiles_output():
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    out_filename = "tmp/out_gdal2tiles_smallworld.pmtiles"
+    _remove_file(out_filename)
+
+    try:
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 --processes=2 "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif "
+            + out_filename,
+        )
+
+        # Staging database removed once the archive is written
+        assert not os.path.exists(out_filename + ".tmp")
+
+        with open(out_filename, "rb") as f:
+            header = f.read(127)
+        fields = struct.unpack("<7sB11Q6B4iBii", header)
+        assert fields[0] == b"PMTiles"
+        assert fields[1] == 3
+        # Addressed tiles, tile entries and tile contents
+        assert fields[10] > 0
+        assert fields[10] == fields[11] == fields[12]
+        # Tile type: PNG
+        assert fields[16] == 2
+        # Min and max zoom
+        assert fields[17:19] == (0, 3)
+    finally:
+        _remove_file(out_filename)
+
+
+def _create_uniform_raster(filename):
+    # Single colour raster covering the whole Web Mercator extent
+    ds = gdal.GetDriverByName("GTiff").Create(filename, 512, 512, 3)
+    ds.SetGeoTransform(
+        [
+            -20037508.342789244,
+            78271.51696402048,
+            0,
+            20037508.342789244,
+            0,
+            -78271.51696402048,
+        ]
+    )
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(3857)
+    ds.SetSpatialRef(srs)
+    for i, value in enumerate((10, 20, 30)):
+        ds.GetRasterBand(i + 1).Fill(value)
+    ds = None
+
+
+@pytest.mark.parametrize("ext", ["", ".mbtiles", ".pmtiles"])
+def test_gdal2tiles_py_deduplicate_tiles(ext):
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    src_filename = "tmp/test_gdal2tiles_uniform.tif"
+    output = "tmp/out_gdal2tiles_dedup" + ext
+    _create_uniform_raster(src_filename)
+    shutil.rmtree(output, ignore_errors=True)
+    _remove_file(output)
+
+    try:
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-2 --deduplicate-tiles %s %s" % (src_filename, output),
+        )
+
+        if ext == "":
+            # All the tiles have the same content, at all zoom levels
+            tiles = glob.glob(os.path.join(output, "*", "*", "*.png"))
+            assert len(tiles) == 21
+            assert os.stat(tiles[0]).st_nlink == 21
+        elif ext == ".mbtiles":
+            conn = sqlite3.connect(output)
+            assert conn.execute("SELECT COUNT(*) FROM map").fetchone() == (21,)
+            assert conn.execute("SELECT COUNT(*) FROM images").fetchone() == (1,)
+            assert conn.execute("SELECT COUNT(*) FROM tiles").fetchone() == (21,)
+            conn.close()
+        else:
+            with open(output, "rb") as f:
+                fields = struct.unpack("<7sB11Q6B4iBii", f.read(127))
+            # 21 addressed tiles, in a single run of identical tiles
+            assert fields[10:13] == (21, 1, 1)
+    finally:
+        _remove_file(src_filename)
+        shutil.rmtree(output, ignore_errors=True)
+        _remove_file(output)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        "--update-extent=-180,72,-144,90",
+        "--update-extent=-180,72,-144,90 --processes=2",
+        "--update-extent=-180,72,-144,90 --in-memory-pyramid",
+        "--changed-files=tmp/test_gdal2tiles_changed_files.txt",
+    ],
+)
+def test_gdal2tiles_py_incremental_update(options):
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    src_filename = "tmp/test_gdal2tiles_small_world.tif"
+    patch_filename = "tmp/test_gdal2tiles_small_world_patch.tif"
+    changed_files = "tmp/test_gdal2tiles_changed_files.txt"
+    shutil.rmtree("tmp/out_gdal2tiles_smallworld_ref", ignore_errors=True)
+    shutil.rmtree("tmp/out_gdal2tiles_smallworld_update", ignore_errors=True)
+
+    try:
+        gdal.Translate(
+            src_filename, test_py_scripts.get_data_path("gdrivers") + "small_world.tif"
+        )
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 %s tmp/out_gdal2tiles_smallworld_update" % src_filename,
+        )
+        untouched_tile = "tmp/out_gdal2tiles_smallworld_update/3/7/7.png"
+        os.utime(untouched_tile, (0, 0))
+
+        # Change the north-west corner of the source (-180 -144 72 90)
+        ds = gdal.Open(src_filename, gdal.GA_Update)
+        for i in range(ds.RasterCount):
+            ds.GetRasterBand(i + 1).WriteRaster(0, 0, 40, 20, b"\xff" * 800)
+        ds = None
+        gdal.Translate(patch_filename, src_filename, srcWin=[0, 0, 40, 20])
+        with open(changed_files, "wt") as f:
+            f.write(patch_filename + "\n")
+
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 %s tmp/out_gdal2tiles_smallworld_ref" % src_filename,
+        )
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 %s %s tmp/out_gdal2tiles_smallworld_update"
+            % (options, src_filename),
+        )
+
+        _compare_tile_folders(
+            "tmp/out_gdal2tiles_smallworld_ref",
+            "tmp/out_gdal2tiles_smallworld_update",
+        )
+        assert os.stat(untouched_tile).st_mtime == 0
+    finally:
+        shutil.rmtree("tmp/out_gdal2tiles_smallworld_ref", ignore_errors=True)
+        shutil.rmtree("tmp/out_gdal2tiles_smallworld_update", ignore_errors=True)
+        for filename in (src_filename, patch_filename, changed_files):
+            _remove_file(filename)
+
+
+@pytest.mark.parametrize(
+    "ext,options", [("", ""), (".mbtiles", ""), (".mbtiles", "--deduplicate-tiles")]
+)
+def test_gdal2tiles_py_incremental_update_transparent(ext, options):
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    src_filename = "tmp/test_gdal2tiles_uniform.tif"
+    output = "tmp/out_gdal2tiles_update_transparent" + ext
+    _create_uniform_raster(src_filename)
+    shutil.rmtree(output, ignore_errors=True)
+    _remove_file(output)
+
+    def get_tiles():
+        if ext == "":
+            return set(
+                tuple(
+                    int(x)
+                    for x in os.path.splitext(os.path.relpath(filename, output))[
+                        0
+                    ].split(os.sep)
+                )
+                for filename in glob.glob(os.path.join(output, "*", "*", "*.png"))
+            )
+        conn = sqlite3.connect(output)
+        tiles = set(conn.execute("SELECT zoom_level, tile_column, tile_row FROM tiles"))
+        conn.close()
+        return tiles
+
+    try:
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -x -a 0 -z 0-2 %s %s %s" % (options, src_filename, output),
+        )
+        assert len(get_tiles()) == 21
+
+        # Make the north-west quarter of the source transparent
+        ds = gdal.Open(src_filename, gdal.GA_Update)
+        for i in range(ds.RasterCount):
+            ds.GetRasterBand(i + 1).WriteRaster(0, 0, 256, 256, b"\x00" * 65536)
+        ds = None
+
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -x -a 0 -z 0-2 --update-extent=-20037508,0,0,20037508 %s %s %s"
+            % (options, src_filename, output),
+        )
+
+        # The tiles generated before the update in that quarter are removed
+        removed_tiles = {(1, 0, 1)} | {(2, tx, ty) for tx in (0, 1) for ty in (2, 3)}
+        tiles = get_tiles()
+        assert len(tiles) == 16
+        assert not tiles & removed_tiles
+    finally:
+        _remove_file(src_filename)
+        shutil.rmtree(output, ignore_errors=True)
+        _remove_file(output)
+
+
+def test_gdal2tiles_py_vectorized_tile_math():
+
+    numpy = pytest.importorskip("numpy")
+    from osgeo_utils import gdal2tiles
+
+    if not gdal2tiles.numpy_available:
+        pytest.skip("numpy not available")
+
+    tx = numpy.arange(0, 16)
+    for profile, coords in (
+        (gdal2tiles.GlobalMercator(), numpy.linspace(-2e7, 2e7, 51)),
+        (gdal2tiles.GlobalGeodetic(None), numpy.linspace(-90, 90, 51)),
+    ):
+        bounds = profile.TileBounds(tx, 5, 4)
+        for i in range(len(tx)):
+            assert tuple(numpy.broadcast_to(b, tx.shape)[i] for b in bounds) == (
+                profile.TileBounds(int(tx[i]), 5, 4)
+            )
+
+        tiles_x, tiles_y = profile.PixelsToTile(coords * 10, coords * 20)
+        for i in range(len(coords)):
+            assert (tiles_x[i], tiles_y[i]) == profile.PixelsToTile(
+                float(coords[i] * 10), float(coords[i] * 20)
+            )
+
+    tile_details = gdal2tiles.TileDetails.from_columns(
+        **{field: tx for field in gdal2tiles.tile_detail_fields}
+    )
+    tile_details.append(gdal2tiles.TileDetail(tx=100, ty=200))
+    assert len(tile_details) == 17
+    assert [(t.tx, t.ty, t.querysize) for t in tile_details] == [
+        (i, i, i) for i in range(16)
+    ] + [(100, 200, 0)]
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        "",
+        "--processes=2 --in-memory-pyramid",
+        "--deduplicate-tiles",
+    ],
+)
+def test_gdal2tiles_py_pillow_encoder(options):
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    pytest.importorskip("numpy")
+    pytest.importorskip("PIL")
+
+    shutil.rmtree("tmp/out_gdal2tiles_smallworld_ref", ignore_errors=True)
+    shutil.rmtree("tmp/out_gdal2tiles_smallworld_pillow", ignore_errors=True)
+
+    try:
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif tmp/out_gdal2tiles_smallworld_ref",
+        )
+        ret = test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-v -z 0-3 --encoder=pillow "
+            + options
+            + " "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif tmp/out_gdal2tiles_smallworld_pillow",
+        )
+        assert "Tile encoding (pillow)" in ret
+
+        # Encoded files differ, but PNG being lossless the pixels must not
+        _compare_tile_folders(
+            "tmp/out_gdal2tiles_smallworld_ref",
+            "tmp/out_gdal2tiles_smallworld_pillow",
+        )
+    finally:
+        shutil.rmtree("tmp/out_gdal2tiles_smallworld_ref", ignore_errors=True)
+        shutil.rmtree("tmp/out_gdal2tiles_smallworld_pillow", ignore_errors=True)
+
+
+@pytest.mark.parametrize("options", ["", "--processes=2", "--in-memory-pyramid"])
+def test_gdal2tiles_py_profile_report(options):
+
+    script_path = test_py_scripts.get_py_script("gdal2tiles")
+    if script_path is None:
+        pytest.skip()
+
+    out_dir = "tmp/out_gdal2tiles_smallworld_profile"
+    report_filename = "tmp/out_gdal2tiles_smallworld_profile.json"
+    shutil.rmtree(out_dir, ignore_errors=True)
+    _remove_file(report_filename)
+
+    try:
+        test_py_scripts.run_py_script_as_external_script(
+            script_path,
+            "gdal2tiles",
+            "-q -z 0-3 -r bilinear --profile-report="
+            + report_filename
+            + " "
+            + options
+            + " "
+            + test_py_scripts.get_data_path("gdrivers")
+            + "small_world.tif "
+            + out_dir,
+        )
+
+        with open(report_filename) as f:
+            report = json.load(f)
+
+        assert report["wall_time"] > 0
+        for stage in ("details", "read", "resample", "encode", "write", "overview"):
+            assert report["stages"][stage]["count"] > 0, stage
+            assert report["stages"][stage]["wall"] >= 0, stage
+
+        tiles = glob.glob(os.path.join(out_dir, "*", "*", "*.png"))
+        assert report["stages"]["write"]["count"] == len(tiles)
+        assert report["encoders"]["gdal"]["tiles"] == len(tiles)
+        assert report["counters"]["bytes_written"] == sum(
+            os.stat(filename).st_size for filename in tiles
+        )
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+        _remove_file(report_filename)
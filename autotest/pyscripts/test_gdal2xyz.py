@@ -138,3 +138,61 @@ def test_gdal2xyz_py_3():
 
     assert os.path.exists("tmp/out.xyz")
     os.unlink("tmp/out.xyz")
+
+
+###############################################################################
+# Test the .npy output and -skip / srcwin against the numpy arrays output
+
+
+def test_gdal2xyz_py_4():
+
+    ds = gdal.Open(test_py_scripts.get_data_path("gcore") + "byte.tif")
+    npy_filename = "tmp/out.npy"
+
+    for skip, srcwin in ((1, None), (3, (2, 1, 15, 17)), ((2, 5), (0, 3, 20, 10))):
+        geo_x, geo_y, data, _ = gdal2xyz.gdal2xyz(
+            ds,
+            None,
+            srcwin=srcwin,
+            skip=skip,
+            return_np_arrays=True,
+            progress_callback=None,
+        )
+        x_skip, y_skip = skip if isinstance(skip, tuple) else (skip, skip)
+        x_off, y_off, x_size, y_size = srcwin or (0, 0, 20, 20)
+        assert len(geo_x) == len(range(0, x_size, x_skip)) * len(
+            range(0, y_size, y_skip)
+        )
+
+        gdal2xyz.gdal2xyz(
+            ds, npy_filename, srcwin=srcwin, skip=skip, progress_callback=None
+        )
+        records = np.load(npy_filename)
+        assert records.dtype.names == ("x", "y", "band_1")
+        assert np.array_equal(records["x"], geo_x)
+        assert np.array_equal(records["y"], geo_y)
+        assert np.array_equal(records["band_1"], data[0])
+
+    os.unlink(npy_filename)
+
+
+def test_gdal2xyz_py_5():
+    """test a large skip over several blocks of rows"""
+
+    xsize, ysize = 3000, 1000
+    ds = gdal.GetDriverByName("MEM").Create("", xsize, ysize, 1, gdal.GDT_Int16)
+    values = np.arange(xsize * ysize, dtype=np.int64).reshape(ysize, xsize) % 32749
+    ds.GetRasterBand(1).WriteArray(values)
+
+    for skip in (100, (7, 1), (1000, 3)):
+        geo_x, geo_y, data, _ = gdal2xyz.gdal2xyz(
+            ds, None, skip=skip, return_np_arrays=True, progress_callback=None
+        )
+        x_skip, y_skip = skip if isinstance(skip, tuple) else (skip, skip)
+        expected = values[::y_skip, ::x_skip]
+        assert np.array_equal(data[0], expected.ravel())
+        cols, rows = np.meshgrid(
+            np.arange(0, xsize, x_skip), np.arange(0, ysize, y_skip)
+        )
+        assert np.array_equal(geo_x, cols.ravel() + 0.5)
+        assert np.array_equal(geo_y, rows.ravel() + 0.5)
@@ -36,6 +36,7 @@ import shutil
 from collections import defaultdict
 from copy import copy
 
+import gdaltest
 import pytest
 import test_py_scripts
 
@@ -615,6 +616,266 @@ def test_gdal_calc_py_multiple_inputs_same_alpha():
     assert cs == cs_ref
 
 
+def test_gdal_calc_py_threads():
+    """test that evaluating in threads gives the same result as in sequence"""
+
+    script_path = test_py_scripts.get_py_script("gdal_calc")
+    if script_path is None:
+        pytest.skip("gdal_calc script not found")
+
+    infile = get_input_file()
+    test_id, test_count = 10, 1
+    out = make_temp_filename_list(test_id, test_count)
+
+    test_py_scripts.run_py_script(
+        script_path,
+        "gdal_calc",
+        f"-A {infile} --calc=A --threads 3 --overwrite --outfile {out[0]}",
+    )
+    check_file(out[0], input_checksum[0])
+
+    for kwargs in (
+        {"calc": "A*(A>100)", "allBands": "A"},
+        {"calc": ["(A+B)/2", "A*B"], "B": infile, "B_band": 2, "NoDataValue": 0},
+        {"calc": "sum(A,axis=0)", "A": [infile, infile], "A_band": 3},
+    ):
+        kwargs = {"A": infile, **kwargs}
+        ref_ds = gdal_calc.Calc(format="MEM", type="Float32", quiet=True, **kwargs)
+        ds = gdal_calc.Calc(
+            format="MEM", type="Float32", quiet=True, threads=3, **kwargs
+        )
+        assert ds.RasterCount == ref_ds.RasterCount
+        assert np.array_equal(ds.ReadAsArray(), ref_ds.ReadAsArray()), kwargs
+
+    with pytest.raises(Exception):
+        gdal_calc.Calc(calc="A", A=infile, format="MEM", quiet=True, threads=-1)
+
+
+@pytest.mark.parametrize("evaluator", ["auto", "numpy", "numexpr"])
+def test_gdal_calc_py_evaluator(evaluator):
+    """test that the evaluators give the same results as eval()"""
+
+    if evaluator == "numexpr":
+        pytest.importorskip("numexpr")
+
+    infile = get_input_file()
+    src_ds = gdal.Open(infile)
+    float_ds = gdal.Translate("", infile, format="MEM", outputType=gdal.GDT_Float32)
+
+    for calc, inputs in (
+        ("(A-B)/(A+B+1)", {"A": src_ds, "B": src_ds, "B_band": 2}),
+        ("(A-B)/(A+B+1)", {"A": float_ds, "B": float_ds, "B_band": 2}),
+        ("where(A>B, A*2, sqrt(B))", {"A": float_ds, "B": float_ds, "B_band": 3}),
+        ("A*logical_and(A>100,A<150)", {"A": src_ds}),
+        ("sum(A.astype(numpy.float32),axis=0)", {"A": [src_ds, src_ds]}),
+    ):
+        if evaluator == "numexpr" and inputs["A"] is src_ds:
+            # numexpr does not overflow on Byte inputs like numpy does
+            continue
+        ref = np.asarray(
+            eval(
+                calc,
+                {**vars(np), "numpy": np},
+                {
+                    alpha: np.stack([ds.GetRasterBand(1).ReadAsArray() for ds in value])
+                    if isinstance(value, list)
+                    else value.GetRasterBand(
+                        inputs.get(alpha + "_band", 1)
+                    ).ReadAsArray()
+                    for alpha, value in inputs.items()
+                    if not alpha.endswith("_band")
+                },
+            )
+        )
+        ds = gdal_calc.Calc(
+            calc,
+            format="MEM",
+            type="Float64",
+            NoDataValue="none",
+            evaluator=evaluator,
+            quiet=True,
+            **inputs,
+        )
+        got = ds.GetRasterBand(1).ReadAsArray()
+        if evaluator == "numexpr":
+            assert np.allclose(got, ref, rtol=1e-6), calc
+        else:
+            assert np.array_equal(got, ref), calc
+
+
+@pytest.mark.parametrize(
+    "calc", ["__import__('os').getcwd()", "A.__class__", "[a for a in A]", "A+"]
+)
+def test_gdal_calc_py_disallowed_syntax(calc):
+
+    with pytest.raises(Exception, match="Error!"):
+        gdal_calc.Calc(calc, A=get_input_file(), format="MEM", quiet=True)
+
+
+def test_gdal_calc_py_nodata_mask():
+    """test nodata propagation from nodata values (including NaN) and mask bands"""
+
+    infile = get_input_file()
+    src_ds = gdal.Open(infile)
+    data = src_ds.GetRasterBand(1).ReadAsArray()
+    alpha = src_ds.GetRasterBand(4).ReadAsArray()
+    assert (alpha == 0).any()
+
+    # the alpha band is only used with use_mask_band
+    for use_mask_band in (False, True):
+        ds = gdal_calc.Calc(
+            "A*2",
+            A=infile,
+            format="MEM",
+            type="Int16",
+            NoDataValue=-1,
+            use_mask_band=use_mask_band,
+            quiet=True,
+        )
+        expected = (data * 2).astype(np.int16)
+        if use_mask_band:
+            expected[alpha == 0] = -1
+        assert np.array_equal(ds.GetRasterBand(1).ReadAsArray(), expected)
+
+    float_ds = gdal.Translate(
+        "", infile, format="MEM", outputType=gdal.GDT_Float32, bandList=[1, 2]
+    )
+    a = float_ds.GetRasterBand(1).ReadAsArray()
+    a[a < 50] = np.nan
+    float_ds.GetRasterBand(1).WriteArray(a)
+    float_ds.GetRasterBand(1).SetNoDataValue(float("nan"))
+    b = float_ds.GetRasterBand(2).ReadAsArray()
+    float_ds.GetRasterBand(2).SetNoDataValue(100)
+
+    ds = gdal_calc.Calc(
+        "A+B",
+        A=float_ds,
+        B=float_ds,
+        B_band=2,
+        format="MEM",
+        NoDataValue=-9999,
+        quiet=True,
+    )
+    assert ds.GetRasterBand(1).DataType == gdal.GDT_Float32
+    expected = np.where(np.isnan(a) | (b == 100), np.float32(-9999), a + b)
+    assert np.array_equal(ds.GetRasterBand(1).ReadAsArray(), expected)
+
+
+def test_gdal_calc_py_block_plan():
+    """test that blocks are aligned on all the inputs and fit in the budget"""
+
+    infile = get_input_file()
+    src_ds = gdal.Open(infile)
+    xsize, ysize = src_ds.RasterXSize, src_ds.RasterYSize
+    tiled_ds = gdal.Translate(
+        "/vsimem/test_gdal_calc_py_block_plan.tif",
+        src_ds,
+        creationOptions=["TILED=YES", "BLOCKXSIZE=32", "BLOCKYSIZE=32"],
+    )
+    striped_ds = gdal.Translate(
+        "/vsimem/test_gdal_calc_py_block_plan_striped.tif",
+        src_ds,
+        creationOptions=["BLOCKYSIZE=24"],
+    )
+    out_ds = gdal.GetDriverByName("MEM").Create("", xsize, ysize)
+    input_bands = [tiled_ds.GetRasterBand(1), striped_ds.GetRasterBand(1)]
+
+    plan = gdal_calc.plan_calc_block_size(
+        input_bands, out_ds.GetRasterBand(1), xsize, ysize
+    )
+    assert plan.aligned_xsize == xsize
+    assert plan.aligned_ysize == min(96, ysize)
+    assert plan.xsize == xsize
+    assert plan.ysize % plan.aligned_ysize == 0 or plan.ysize == ysize
+
+    # threads keep the raster split in several blocks
+    plan = gdal_calc.plan_calc_block_size(
+        input_bands, out_ds.GetRasterBand(1), xsize, ysize, threads=4
+    )
+    assert plan.ysize < ysize or plan.aligned_ysize == ysize
+
+    # a small block cache gives smaller blocks, and the same result
+    ref_ds = gdal_calc.Calc(
+        "A+B", A=tiled_ds, B=striped_ds, format="MEM", type="Int16", quiet=True
+    )
+    old_cache_max = gdal.GetCacheMax()
+    gdal.SetCacheMax(1)
+    try:
+        plan = gdal_calc.plan_calc_block_size(
+            input_bands, out_ds.GetRasterBand(1), xsize, ysize
+        )
+        assert plan.xsize * plan.ysize == plan.aligned_xsize * plan.aligned_ysize
+        ds = gdal_calc.Calc(
+            "A+B", A=tiled_ds, B=striped_ds, format="MEM", type="Int16", quiet=True
+        )
+    finally:
+        gdal.SetCacheMax(old_cache_max)
+    assert np.array_equal(ds.ReadAsArray(), ref_ds.ReadAsArray())
+
+    tiled_ds = striped_ds = None
+    gdal.Unlink("/vsimem/test_gdal_calc_py_block_plan.tif")
+    gdal.Unlink("/vsimem/test_gdal_calc_py_block_plan_striped.tif")
+
+
+def test_gdal_calc_py_lazy():
+    """test that a lazy VRT evaluates the calculations when it is read"""
+
+    infile = get_input_file()
+    out = "tmp/test_gdal_calc_py_lazy.vrt"
+
+    kwargs = {
+        "calc": ["A*2", "(A+B)/2"],
+        "A": infile,
+        "B": infile,
+        "B_band": 2,
+        "type": "Float32",
+        "NoDataValue": -1,
+        "quiet": True,
+    }
+    ref_ds = gdal_calc.Calc(format="MEM", **kwargs)
+    ds = gdal_calc.Calc(outfile=out, format="VRT", lazy=True, overwrite=True, **kwargs)
+    assert ds.RasterCount == 2
+    assert ds.GetRasterBand(1).GetNoDataValue() == -1
+    assert ds.GetGeoTransform() == ref_ds.GetGeoTransform()
+    ds = None
+
+    with open(out) as f:
+        content = f.read()
+    assert "VRTDerivedRasterBand" in content
+    assert "(A+B)/2" in content
+
+    with gdaltest.config_option("GDAL_VRT_ENABLE_PYTHON", "YES"):
+        ds = gdal.Open(out)
+        assert np.array_equal(ds.ReadAsArray(), ref_ds.ReadAsArray())
+    ds = None
+    gdal.Unlink(out)
+
+    # integer output: fractional and out of range values are rounded and clamped
+    kwargs = {
+        "calc": ["A*1.5-20", "A*3-200"],
+        "A": infile,
+        "type": "Byte",
+        "quiet": True,
+    }
+    ref_ds = gdal_calc.Calc(format="MEM", **kwargs)
+    ds = gdal_calc.Calc(outfile=out, format="VRT", lazy=True, overwrite=True, **kwargs)
+    ds = None
+    with gdaltest.config_option("GDAL_VRT_ENABLE_PYTHON", "YES"):
+        ds = gdal.Open(out)
+        ref = ref_ds.ReadAsArray()
+        assert ref.min() == 0 and ref.max() == 255
+        assert np.array_equal(ds.ReadAsArray(), ref)
+    ds = None
+    gdal.Unlink(out)
+
+    with pytest.raises(Exception, match="VRT"):
+        gdal_calc.Calc(format="MEM", lazy=True, **kwargs)
+    with pytest.raises(Exception, match="is not allowed"):
+        gdal_calc.Calc(
+            "__import__('os')", A=infile, outfile=out, format="VRT", lazy=True
+        )
+
+
 def test_gdal_calc_py_cleanup():
     """cleanup all temporary files that were created in this pytest"""
     global temp_counter_dict
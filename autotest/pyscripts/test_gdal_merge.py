@@ -29,6 +29,7 @@
 ###############################################################################
 
 
+import json
 import os
 
 import pytest
@@ -249,6 +250,156 @@ def test_gdal_merge_5():
     assert ds.GetRasterBand(4).Checksum() == cs, "Wrong checksum"
 
 
+###############################################################################
+# Test merging into a tiled and compressed output, walked in block order
+
+
+def test_gdal_merge_6():
+
+    script_path = test_py_scripts.get_py_script("gdal_merge")
+    if script_path is None:
+        pytest.skip()
+
+    pytest.importorskip("numpy")
+
+    test_py_scripts.run_py_script(
+        script_path,
+        "gdal_merge",
+        "-q -o tmp/test_gdal_merge_6.tif -co TILED=YES -co BLOCKXSIZE=16 "
+        "-co BLOCKYSIZE=16 -co COMPRESS=DEFLATE "
+        "tmp/in1.tif tmp/in2.tif tmp/in3.tif tmp/in4.tif",
+    )
+
+    ds = gdal.Open("tmp/test_gdal_merge_6.tif")
+    assert ds.GetRasterBand(1).GetBlockSize() == [16, 16]
+    assert ds.GetRasterBand(1).Checksum() == 3508, "Wrong checksum"
+    ds = None
+
+    # sources overlapping the same blocks, with a nodata value: the last
+    # source wins where it is valid
+    drv = gdal.GetDriverByName("GTiff")
+    ds = drv.Create("tmp/in7.tif", 10, 10, 1)
+    ds.SetGeoTransform([2.5, 0.1, 0, 48.5, 0, -0.1])
+    ds.GetRasterBand(1).Fill(1)
+    ds.GetRasterBand(1).WriteRaster(0, 0, 5, 10, b"\0" * 50)
+    ds = None
+    gdal.Unlink("tmp/test_gdal_merge_6.tif")
+
+    test_py_scripts.run_py_script(
+        script_path,
+        "gdal_merge",
+        "-q -o tmp/test_gdal_merge_6.tif -co TILED=YES -co BLOCKXSIZE=16 "
+        "-co BLOCKYSIZE=16 -n 0 "
+        "tmp/in1.tif tmp/in2.tif tmp/in3.tif tmp/in4.tif tmp/in7.tif",
+    )
+
+    ds = gdal.Open("tmp/test_gdal_merge_6.tif")
+    data = ds.GetRasterBand(1).ReadRaster(0, 0, 20, 20)
+    ds = None
+    # in1 (0) is nodata; in7 only overwrites its right half
+    assert data[5 * 20 + 2] == 0
+    assert data[5 * 20 + 7] == 0
+    assert data[5 * 20 + 12] == 1
+    assert data[12 * 20 + 12] == 1
+    assert data[12 * 20 + 7] == 127
+    assert data[18 * 20 + 18] == 255
+
+
+###############################################################################
+# Test -threads and -footprint_cache
+
+
+def test_gdal_merge_7():
+
+    script_path = test_py_scripts.get_py_script("gdal_merge")
+    if script_path is None:
+        pytest.skip()
+
+    for _ in range(2):
+        gdal.Unlink("tmp/test_gdal_merge_7.tif")
+        test_py_scripts.run_py_script(
+            script_path,
+            "gdal_merge",
+            "-q -o tmp/test_gdal_merge_7.tif -co TILED=YES -co BLOCKXSIZE=16 "
+            "-co BLOCKYSIZE=16 -threads 3 -footprint_cache tmp/test_gdal_merge_7.json "
+            "tmp/in1.tif tmp/in2.tif tmp/in3.tif tmp/in4.tif",
+        )
+
+        ds = gdal.Open("tmp/test_gdal_merge_7.tif")
+        assert ds.GetRasterBand(1).Checksum() == 3508, "Wrong checksum"
+        ds = None
+
+    with open("tmp/test_gdal_merge_7.json") as f:
+        cache = json.load(f)
+    assert sorted(cache["files"]) == [
+        "tmp/in1.tif",
+        "tmp/in2.tif",
+        "tmp/in3.tif",
+        "tmp/in4.tif",
+    ]
+    assert cache["files"]["tmp/in2.tif"]["info"]["geotransform"] == [
+        3,
+        0.1,
+        0,
+        49,
+        0,
+        -0.1,
+    ]
+
+
+###############################################################################
+# Test compositing with an alpha band only where it is opaque, and that the
+# output is kept where no input pixel is valid
+
+
+def test_gdal_merge_8():
+
+    script_path = test_py_scripts.get_py_script("gdal_merge")
+    if script_path is None:
+        pytest.skip()
+
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("osgeo.gdal_array")
+
+    drv = gdal.GetDriverByName("GTiff")
+    ds = drv.Create("tmp/in8.tif", 10, 10, 4, options=["PHOTOMETRIC=RGB", "ALPHA=YES"])
+    ds.SetGeoTransform([2, 0.1, 0, 49, 0, -0.1])
+    for i in range(1, 4):
+        ds.GetRasterBand(i).Fill(i)
+    alpha = np.zeros((10, 10), np.uint8)
+    alpha[:, 5:] = 255
+    ds.GetRasterBand(4).WriteArray(alpha)
+    ds = None
+
+    test_py_scripts.run_py_script(
+        script_path,
+        "gdal_merge",
+        "-q -init 10 -co TILED=YES -co BLOCKXSIZE=16 -co BLOCKYSIZE=16 "
+        "-ul_lr 1.5 49 3 48 -o tmp/test_gdal_merge_8.tif tmp/in8.tif",
+    )
+
+    ds = gdal.Open("tmp/test_gdal_merge_8.tif")
+    assert ds.RasterXSize == 15 and ds.RasterYSize == 10
+    for i in range(1, 4):
+        data = ds.GetRasterBand(i).ReadAsArray()
+        assert (data[:, :10] == 10).all()
+        assert (data[:, 10:] == i).all()
+    ds = None
+
+    # same with the per-file copy
+    from osgeo_utils import gdal_merge
+
+    fi = gdal_merge.names_to_fileinfos(["tmp/in8.tif"])[0]
+    ds = gdal.GetDriverByName("MEM").Create("", 15, 10, 3)
+    ds.SetGeoTransform([1.5, 0.1, 0, 49, 0, -0.1])
+    for i in range(1, 4):
+        ds.GetRasterBand(i).Fill(10)
+        fi.copy_into(ds, i, i)
+        data = ds.GetRasterBand(i).ReadAsArray()
+        assert (data[:, :10] == 10).all()
+        assert (data[:, 10:] == i).all()
+
+
 ###############################################################################
 # Cleanup
 
@@ -261,12 +412,18 @@ def test_gdal_merge_cleanup():
         "tmp/test_gdal_merge_3.tif",
         "tmp/test_gdal_merge_4.tif",
         "tmp/test_gdal_merge_5.tif",
+        "tmp/test_gdal_merge_6.tif",
+        "tmp/test_gdal_merge_7.tif",
+        "tmp/test_gdal_merge_7.json",
+        "tmp/test_gdal_merge_8.tif",
         "tmp/in1.tif",
         "tmp/in2.tif",
         "tmp/in3.tif",
         "tmp/in4.tif",
         "tmp/in5.tif",
         "tmp/in6.tif",
+        "tmp/in7.tif",
+        "tmp/in8.tif",
     ]
     for filename in lst:
         try:
@@ -338,6 +338,188 @@ def test_gdal_retile_5():
     ds = None
 
 
+###############################################################################
+# Test gdal_retile.py -processes
+
+
+def test_gdal_retile_6():
+
+    script_path = test_py_scripts.get_py_script("gdal_retile")
+    if script_path is None:
+        pytest.skip()
+
+    for dirname in ("tmp/outretile6_seq", "tmp/outretile6_par"):
+        try:
+            os.mkdir(dirname)
+        except OSError:
+            pass
+
+    for dirname, options in (
+        ("tmp/outretile6_seq", ""),
+        ("tmp/outretile6_par", "-processes 3"),
+    ):
+        test_py_scripts.run_py_script(
+            script_path,
+            "gdal_retile",
+            "-q -ps 8 7 -overlap 3 -levels 1 -csv tiles.csv %s -targetDir %s "
+            % (options, dirname)
+            + test_py_scripts.get_data_path("gcore")
+            + "byte.tif",
+        )
+
+    for subdir in ("", "1/"):
+        seq_files = sorted(os.listdir("tmp/outretile6_seq/" + subdir))
+        par_files = sorted(os.listdir("tmp/outretile6_par/" + subdir))
+        assert seq_files == par_files
+        for filename in seq_files:
+            if filename.endswith(".csv"):
+                with open("tmp/outretile6_seq/" + subdir + filename) as f:
+                    seq_csv = f.read()
+                with open("tmp/outretile6_par/" + subdir + filename) as f:
+                    par_csv = f.read()
+                assert seq_csv == par_csv
+            elif filename.endswith(".tif"):
+                seq_ds = gdal.Open("tmp/outretile6_seq/" + subdir + filename)
+                par_ds = gdal.Open("tmp/outretile6_par/" + subdir + filename)
+                assert seq_ds.GetGeoTransform() == par_ds.GetGeoTransform()
+                assert (
+                    seq_ds.GetRasterBand(1).Checksum()
+                    == par_ds.GetRasterBand(1).Checksum()
+                ), filename
+                seq_ds = None
+                par_ds = None
+
+
+###############################################################################
+# Test that source tiles are only opened once when they all fit in the cache
+
+
+def test_gdal_retile_7():
+
+    script_path = test_py_scripts.get_py_script("gdal_retile")
+    if script_path is None:
+        pytest.skip()
+
+    drv = gdal.GetDriverByName("GTiff")
+    names = []
+    for row in range(2):
+        for col in range(2):
+            name = "tmp/in7_%d_%d.tif" % (row, col)
+            ds = drv.Create(name, 10, 10, 1)
+            ds.SetGeoTransform([col * 10, 1, 0, 100 - row * 10, 0, -1])
+            ds.GetRasterBand(1).Fill(row * 2 + col)
+            ds = None
+            names.append(name)
+
+    try:
+        os.mkdir("tmp/outretile7")
+    except OSError:
+        pass
+
+    ret = test_py_scripts.run_py_script(
+        script_path,
+        "gdal_retile",
+        "-v -ps 3 3 -targetDir tmp/outretile7 " + " ".join(names),
+    )
+
+    line = [x for x in ret.split("\n") if "source dataset cache" in x][0]
+    hits, misses = [int(x.split()[0]) for x in line.split(":")[1].split(",")]
+    assert misses <= len(names)
+    assert hits > 0
+
+    ds = gdal.Open("tmp/outretile7/in7_0_0_7_7.tif")
+    assert ds.RasterXSize == 2 and ds.RasterYSize == 2
+    assert ds.ReadRaster() == b"\x03" * 4
+    ds = None
+
+
+###############################################################################
+# Test that -resume rebuilds missing tiles of all levels identically
+
+
+def test_gdal_retile_8():
+
+    script_path = test_py_scripts.get_py_script("gdal_retile")
+    if script_path is None:
+        pytest.skip()
+
+    try:
+        os.mkdir("tmp/outretile8")
+    except OSError:
+        pass
+
+    args = (
+        "-q -ps 8 7 -overlap 2 -levels 2 -r bilinear -targetDir tmp/outretile8 "
+        + test_py_scripts.get_data_path("gcore")
+        + "byte.tif"
+    )
+    test_py_scripts.run_py_script(script_path, "gdal_retile", args)
+
+    filenames = []
+    for subdir in ("", "1/", "2/"):
+        filenames += [
+            "tmp/outretile8/" + subdir + filename
+            for filename in os.listdir("tmp/outretile8/" + subdir)
+            if filename.endswith(".tif")
+        ]
+    checksums = {}
+    for filename in filenames:
+        ds = gdal.Open(filename)
+        checksums[filename] = ds.GetRasterBand(1).Checksum()
+        ds = None
+
+    os.remove("tmp/outretile8/byte_2_2.tif")
+    os.remove("tmp/outretile8/1/byte_1_2.tif")
+    test_py_scripts.run_py_script(script_path, "gdal_retile", "-resume " + args)
+
+    for filename in filenames:
+        ds = gdal.Open(filename)
+        assert ds.GetRasterBand(1).Checksum() == checksums[filename], filename
+        ds = None
+
+
+###############################################################################
+# Test that with a lossy output, pyramid levels are built from the written tiles
+
+
+def test_gdal_retile_9():
+
+    script_path = test_py_scripts.get_py_script("gdal_retile")
+    if script_path is None:
+        pytest.skip()
+    if "JPEG" not in gdal.GetDriverByName("GTiff").GetMetadataItem(
+        "DMD_CREATIONOPTIONLIST"
+    ):
+        pytest.skip("JPEG compression not available")
+
+    for dirname, options in (
+        ("tmp/outretile9_seq", ""),
+        ("tmp/outretile9_par", "-processes 2"),
+    ):
+        try:
+            os.mkdir(dirname)
+        except OSError:
+            pass
+        test_py_scripts.run_py_script(
+            script_path,
+            "gdal_retile",
+            "-q -ps 8 7 -levels 2 -r bilinear -co COMPRESS=JPEG %s -targetDir %s "
+            % (options, dirname)
+            + test_py_scripts.get_data_path("gcore")
+            + "byte.tif",
+        )
+
+    for subdir in ("1/", "2/"):
+        for filename in os.listdir("tmp/outretile9_seq/" + subdir):
+            seq_ds = gdal.Open("tmp/outretile9_seq/" + subdir + filename)
+            par_ds = gdal.Open("tmp/outretile9_par/" + subdir + filename)
+            assert (
+                seq_ds.GetRasterBand(1).Checksum() == par_ds.GetRasterBand(1).Checksum()
+            ), filename
+            seq_ds = None
+            par_ds = None
+
+
 ###############################################################################
 # Cleanup
 
@@ -380,3 +562,21 @@ def test_gdal_retile_cleanup():
 
     if os.path.exists("tmp/outretile5"):
         shutil.rmtree("tmp/outretile5")
+
+    for row in range(2):
+        for col in range(2):
+            try:
+                os.remove("tmp/in7_%d_%d.tif" % (row, col))
+            except OSError:
+                pass
+
+    for dirname in (
+        "tmp/outretile6_seq",
+        "tmp/outretile6_par",
+        "tmp/outretile7",
+        "tmp/outretile8",
+        "tmp/outretile9_seq",
+        "tmp/outretile9_par",
+    ):
+        if os.path.exists(dirname):
+            shutil.rmtree(dirname)
@@ -44,7 +44,14 @@ pytest.importorskip("osgeo_utils")
 
 import gdaltest
 
-from osgeo_utils.auxiliary import array_util, base, color_table, raster_creation, util
+from osgeo_utils.auxiliary import (
+    array_util,
+    base,
+    block_util,
+    color_table,
+    raster_creation,
+    util,
+)
 from osgeo_utils.auxiliary.color_palette import ColorPalette
 from osgeo_utils.auxiliary.color_table import get_color_table
 from osgeo_utils.auxiliary.extent_util import Extent
@@ -295,6 +302,85 @@ def test_read_write_color_table_from_raster():
     gdaltest.tiff_drv.Delete("tmp/ct8.tif")
 
 
+def test_utils_block_util():
+    np = pytest.importorskip("numpy")
+
+    xsize, ysize = 1000, 500
+    ds = []
+    for i, (block_xsize, block_ysize) in enumerate(((16, 16), (48, 32))):
+        ds.append(
+            gdal.GetDriverByName("GTiff").Create(
+                f"/vsimem/test_utils_block_util_{i}.tif",
+                xsize,
+                ysize,
+                1,
+                options=[
+                    "TILED=YES",
+                    f"BLOCKXSIZE={block_xsize}",
+                    f"BLOCKYSIZE={block_ysize}",
+                ],
+            )
+        )
+    bands = [d.GetRasterBand(1) for d in ds]
+
+    # windows are aligned on the least common multiple of the block sizes
+    assert block_util.get_window_size(bands, max_pixels=1) == (48, 32)
+    assert block_util.get_window_size(bands, max_pixels=48 * 32 * 5) == (240, 32)
+    # whole rows of aligned blocks
+    assert block_util.get_window_size(bands, max_pixels=xsize * 32 * 3) == (1000, 96)
+
+    cache_max = gdal.GetCacheMax()
+    try:
+        # 2 bytes per pixel, and the blocks of a window should fit twice in the cache
+        gdal.SetCacheMax(2 * 2 * 48 * 32 * 5)
+        assert block_util.get_window_size(bands) == (240, 32)
+
+        gdal.SetCacheMax(1024 * 1024 * 1024)
+        assert block_util.get_window_size(bands) == (1000, 500)
+        # at least 4 windows per thread
+        assert block_util.get_window_size(bands, threads=4) == (960, 32)
+        # the temporary arrays count in the memory budget
+        work_bytes_per_pixel = block_util.MaxWindowBytes // (48 * 32 * 5) - 2
+        assert block_util.get_window_size(
+            bands, work_bytes_per_pixel=work_bytes_per_pixel
+        ) == (240, 32)
+    finally:
+        gdal.SetCacheMax(cache_max)
+
+    rng = np.random.RandomState(0)
+    src = rng.randint(0, 255, (ysize, xsize)).astype(np.uint8)
+    bands[0].WriteArray(src)
+    dst_ds = gdal.GetDriverByName("MEM").Create("", xsize, ysize, 2, gdal.GDT_Int16)
+    dst_bands = [dst_ds.GetRasterBand(i + 1) for i in range(2)]
+    for threads in (None, 3):
+        dst_ds.GetRasterBand(1).Fill(0)
+        dst_ds.GetRasterBand(2).Fill(0)
+        progress = []
+        block_util.process_by_blocks(
+            bands[:1],
+            dst_bands,
+            lambda a: [a.astype(np.int16) - 100, a.astype(np.int16) * 2],
+            threads=threads,
+            max_pixels=48 * 32 * 5,
+            callback=progress.append,
+        )
+        assert np.array_equal(dst_bands[0].ReadAsArray(), src.astype(np.int16) - 100)
+        assert np.array_equal(dst_bands[1].ReadAsArray(), src.astype(np.int16) * 2)
+        assert progress == sorted(progress) and progress[-1] == 1
+
+    # an error in a thread is raised by process_by_blocks
+    def fail(a):
+        raise ValueError("block_util test")
+
+    with pytest.raises(ValueError, match="block_util test"):
+        block_util.process_by_blocks(bands[:1], dst_bands[:1], fail, threads=3)
+
+    bands = None
+    ds = None
+    for i in range(2):
+        gdal.Unlink(f"/vsimem/test_utils_block_util_{i}.tif")
+
+
 def test_utils_py_cleanup():
     for filename in temp_files:
         try:
@@ -35,6 +35,8 @@ import pytest
 np = pytest.importorskip("numpy")
 pytest.importorskip("osgeo_utils.samples.gdallocationinfo")
 
+import io
+import json
 import os
 from itertools import product
 
@@ -225,6 +227,128 @@ def test_gdallocationinfo_py_7():
             assert_allclose(expected, actual, rtol=1e-4, atol=1e-3)
 
 
+def test_gdallocationinfo_py_8():
+    """Test sample_by_blocks against values computed from the whole raster"""
+    filename = "tmp/test_gdallocationinfo_py_8.tif"
+    xsize, ysize = 50, 40
+    ds = gdal.GetDriverByName("GTiff").Create(
+        filename,
+        xsize,
+        ysize,
+        3,
+        gdal.GDT_Float32,
+        options=["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"],
+    )
+    temp_files.append(filename)
+    rng = np.random.RandomState(0)
+    data = rng.uniform(0, 100, (3, ysize, xsize)).astype(np.float32)
+    for i in range(3):
+        ds.GetRasterBand(i + 1).WriteArray(data[i])
+    bands = [ds.GetRasterBand(i) for i in (3, 1)]
+
+    pixels = rng.uniform(0, xsize, 500)
+    lines = rng.uniform(0, ysize, 500)
+    results = gdallocationinfo.sample_by_blocks(ds, bands, pixels, lines)
+    expected = data[[2, 0]][:, lines.astype(int), pixels.astype(int)]
+    assert_allclose(results, expected)
+
+    # bilinear, away from the edges so that no kernel tap is renormalized
+    pixels = rng.uniform(1, xsize - 1, 500)
+    lines = rng.uniform(1, ysize - 1, 500)
+    results = gdallocationinfo.sample_by_blocks(
+        ds, bands, pixels, lines, resample_alg=gdal.GRIORA_Bilinear
+    )
+    col = np.floor(pixels - 0.5).astype(int)
+    row = np.floor(lines - 0.5).astype(int)
+    dx = pixels - 0.5 - col
+    dy = lines - 0.5 - row
+    d = data[[2, 0]].astype(np.float64)
+    expected = (
+        d[:, row, col] * (1 - dx) * (1 - dy)
+        + d[:, row, col + 1] * dx * (1 - dy)
+        + d[:, row + 1, col] * (1 - dx) * dy
+        + d[:, row + 1, col + 1] * dx * dy
+    )
+    assert_allclose(results, expected, rtol=1e-5)
+
+    # NaN pixels are left out of the kernel, even without nodata value
+    bands[0].WriteArray(np.array([[np.nan]], dtype=np.float32), 10, 10)
+    results = gdallocationinfo.sample_by_blocks(
+        ds, bands[:1], [10.9], [10.9], resample_alg=gdal.GRIORA_Bilinear
+    )
+    d = data[2].astype(np.float64)
+    expected = (0.24 * d[10, 11] + 0.24 * d[11, 10] + 0.16 * d[11, 11]) / 0.64
+    assert results[0, 0] == pytest.approx(expected, rel=1e-5)
+    bands[0].WriteArray(data[2][10:11, 10:11], 10, 10)
+
+    # out of raster points get the nodata value
+    bands[0].SetNoDataValue(-1)
+    results = gdallocationinfo.sample_by_blocks(ds, bands, [-1, 0.5], [0.5, 0.5])
+    assert_allclose(results, [[-1, data[2, 0, 0]], [0, data[0, 0, 0]]])
+    ds = None
+
+
+def test_gdallocationinfo_py_9():
+    """Test LocationSampler and its JSON lines service"""
+    filename = "../gcore/data/byte.tif"
+    sampler = gdallocationinfo.LocationSampler(max_datasets=1)
+    pixels, lines, results = sampler.sample(filename, [0, 0.5], [0, 0.5])
+    assert results.tolist() == [[107, 107]]
+    ds = sampler.datasets[filename][0]
+
+    ds_x, ds_y = 440720.0, 3751320.0
+    _, _, results = sampler.sample(
+        filename, ds_x, ds_y, srs=LocationInfoSRS.SameAsDS_SRS
+    )
+    assert results.tolist() == [[107]]
+    assert sampler.datasets[filename][0] is ds
+
+    requests = io.StringIO(
+        '{"x": [0, 1], "y": [0, 0]}\n'
+        '{"x": 440720, "y": 3751320, "srs": 26711}\n'
+        '{"x": 0, "y": 0, "filename": "non_existing.tif"}\n'
+    )
+    responses = io.StringIO()
+    sampler.serve(requests, responses, filename=filename)
+    responses = [json.loads(line) for line in responses.getvalue().splitlines()]
+    assert responses[0]["values"] == [[107, 123]]
+    assert responses[1]["values"] == [[107]]
+    assert "error" in responses[2]
+
+    # the srs of a request is in the traditional GIS axis order, unless it gives axis_order
+    _, _, expected = sampler.sample(filename, 1.5, 1.5)
+    ct = get_transform(
+        ds.GetSpatialRef(), get_srs(4326, axis_order=osr.OAMS_TRADITIONAL_GIS_ORDER)
+    )
+    lon, lat, _ = ct.TransformPoint(440810.0, 3751230.0)
+    requests = io.StringIO(
+        json.dumps({"x": lon, "y": lat, "srs": "EPSG:4326"})
+        + "\n"
+        + json.dumps(
+            {"x": lat, "y": lon, "srs": "EPSG:4326", "axis_order": "authority"}
+        )
+        + "\n"
+    )
+    responses = io.StringIO()
+    sampler.serve(requests, responses, filename=filename)
+    responses = [json.loads(line) for line in responses.getvalue().splitlines()]
+    assert responses[0]["values"] == expected.tolist()
+    assert responses[1]["values"] == expected.tolist()
+
+    # NaN values are answered as null
+    float_filename = "/vsimem/test_gdallocationinfo_py_9.tif"
+    float_ds = gdal.GetDriverByName("GTiff").Create(
+        float_filename, 2, 1, 1, gdal.GDT_Float32
+    )
+    float_ds.GetRasterBand(1).WriteArray(np.array([[1.5, np.nan]]))
+    float_ds = None
+    response = sampler.answer({"filename": float_filename, "x": [0, 1], "y": [0, 0]})
+    assert response["values"] == [[1.5, None]]
+    json.dumps(response, allow_nan=False)
+    sampler = None
+    gdal.Unlink(float_filename)
+
+
 def test_gdallocationinfo_py_cleanup():
     for filename in temp_files:
         try:
@@ -198,6 +198,36 @@ def test_pct2rgb_4():
     ori_ds = None
 
 
+###############################################################################
+# Test pct2rgb on a tiled file, with threads
+
+
+def test_pct2rgb_5():
+    script_path = test_py_scripts.get_py_script("pct2rgb")
+    if script_path is None:
+        pytest.skip()
+
+    gdal.Translate(
+        "tmp/test_pct2rgb_5_src.tif",
+        "tmp/test_rgb2pct_1.tif",
+        creationOptions=["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"],
+    )
+    test_py_scripts.run_py_script(
+        script_path,
+        "pct2rgb",
+        "-threads 2 tmp/test_pct2rgb_5_src.tif tmp/test_pct2rgb_5.tif",
+    )
+
+    ds = gdal.Open("tmp/test_pct2rgb_5.tif")
+    ref_ds = gdal.Open("tmp/test_pct2rgb_1.tif")
+    assert ds.GetRasterBand(1).Checksum() == 20963
+    assert [ds.GetRasterBand(i + 1).Checksum() for i in range(3)] == [
+        ref_ds.GetRasterBand(i + 1).Checksum() for i in range(3)
+    ]
+    ds = None
+    ref_ds = None
+
+
 def test_gdalattachpct_1():
     pct_filename = "tmp/test_rgb2pct_2.tif"
     src_filename = test_py_scripts.get_data_path("gcore") + "rgbsmall.tif"
@@ -271,6 +301,8 @@ def test_rgb2pct_cleanup():
         "tmp/test_rgb2pct_3.tif",
         "tmp/test_pct2rgb_1.tif",
         "tmp/test_pct2rgb_4.tif",
+        "tmp/test_pct2rgb_5_src.tif",
+        "tmp/test_pct2rgb_5.tif",
         "tmp/test_gdalattachpct_1_4.txt",
     ]
     for filename in lst:
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ******************************************************************************
+#
+#  Project:  GDAL utils.auxiliary
+#  Purpose:  utility functions for processing rasters by blocks
+#
+# ******************************************************************************
+#  Permission is hereby granted, free of charge, to any person obtaining a
+#  copy of this software and associated documentation files (the "Software"),
+#  to deal in the Software without restriction, including without limitation
+#  the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#  and/or sell copies of the Software, and to permit persons to whom the
+#  Software is furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included
+#  in all copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+#  OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#  THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#  FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#  DEALINGS IN THE SOFTWARE.
+# ******************************************************************************
+import collections
+import concurrent.futures
+import math
+from typing import Callable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from osgeo import gdal, gdal_array
+
+# xoff, yoff, xsize, ysize
+Window = Tuple[int, int, int, int]
+
+# upper bound of the memory used by the arrays of a window, in bytes
+MaxWindowBytes = 64 * 1024 * 1024
+
+
+def get_window_size(
+    bands: Sequence[gdal.Band],
+    max_pixels: Optional[int] = None,
+    threads: Optional[int] = None,
+    work_bytes_per_pixel: int = 0,
+) -> Tuple[int, int]:
+    """
+    Returns the size of the windows in which the given bands are processed.
+
+    Windows are aligned on the blocks of all the bands, so that no block is read or written
+    piecewise by several windows, and are made of whole rows of aligned blocks when they fit
+    in max_pixels (by default, as many pixels as the memory budget and GDAL_CACHEMAX allow).
+    work_bytes_per_pixel is the size of the temporary arrays the processing allocates per
+    pixel of a window, which count in the memory budget along with the arrays of the bands.
+    With threads, the raster is split in enough windows to keep them busy.
+    """
+    xsize, ysize = bands[0].XSize, bands[0].YSize
+    aligned_xsize = aligned_ysize = 1
+    for band in bands:
+        block_xsize, block_ysize = band.GetBlockSize()
+        aligned_xsize = min(
+            aligned_xsize * block_xsize // math.gcd(aligned_xsize, block_xsize), xsize
+        )
+        aligned_ysize = min(
+            aligned_ysize * block_ysize // math.gcd(aligned_ysize, block_ysize), ysize
+        )
+
+    if max_pixels is None:
+        pixel_bytes = max(
+            1, sum(gdal.GetDataTypeSize(band.DataType) // 8 for band in bands)
+        )
+        max_pixels = min(
+            MaxWindowBytes // (pixel_bytes + work_bytes_per_pixel),
+            # the blocks of a window should stay in the block cache
+            gdal.GetCacheMax() // (2 * pixel_bytes),
+        )
+        if threads and threads > 1:
+            # at least 4 windows per thread when possible
+            max_pixels = min(max_pixels, xsize * ysize // (4 * threads))
+    max_pixels = max(max_pixels, aligned_xsize * aligned_ysize)
+
+    if aligned_xsize == xsize or xsize * aligned_ysize <= max_pixels:
+        rows = max(1, max_pixels // (xsize * aligned_ysize))
+        return xsize, min(ysize, rows * aligned_ysize)
+    columns = max(1, max_pixels // (aligned_xsize * aligned_ysize))
+    return min(xsize, columns * aligned_xsize), aligned_ysize
+
+
+def get_windows(
+    xsize: int, ysize: int, win_xsize: int, win_ysize: int
+) -> Iterator[Window]:
+    """Yields the windows of the given size covering a raster, row by row"""
+    for yoff in range(0, ysize, win_ysize):
+        for xoff in range(0, xsize, win_xsize):
+            yield xoff, yoff, min(win_xsize, xsize - xoff), min(win_ysize, ysize - yoff)
+
+
+def process_by_blocks(
+    src_bands: Sequence[gdal.Band],
+    dst_bands: Sequence[gdal.Band],
+    func: Callable[..., Sequence[np.ndarray]],
+    threads: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+    work_bytes_per_pixel: int = 0,
+    callback: Optional[Callable[[float], None]] = None,
+):
+    """
+    Computes dst_bands from src_bands, window by window (see get_window_size() for the
+    meaning of max_pixels and work_bytes_per_pixel).
+
+    func is called with the arrays of src_bands for a window, and returns the arrays of
+    dst_bands for this window, in the same order.
+    Without threads the read buffers are reused from one window to the next, so func must not
+    keep references to its arguments. With threads, func is run by a pool of threads while
+    the reading and writing are done by the calling thread, as a GDAL dataset must not be used
+    from several threads at once; at most 2 * threads windows are in flight.
+    callback, if given, is called with the completed fraction after each window.
+    """
+    xsize, ysize = src_bands[0].XSize, src_bands[0].YSize
+    win_xsize, win_ysize = get_window_size(
+        list(src_bands) + list(dst_bands),
+        max_pixels=max_pixels,
+        threads=threads,
+        work_bytes_per_pixel=work_bytes_per_pixel,
+    )
+    windows = list(get_windows(xsize, ysize, win_xsize, win_ysize))
+    typecodes = [
+        gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType) for band in src_bands
+    ]
+    buffers = {}
+
+    def read_window(window, reuse_buffers):
+        xoff, yoff, w, h = window
+        arrays = []
+        for band_idx, (band, typecode) in enumerate(zip(src_bands, typecodes)):
+            buf_obj = None
+            if reuse_buffers and typecode is not None:
+                key = (band_idx, w, h)
+                buf_obj = buffers.get(key)
+                if buf_obj is None:
+                    buf_obj = buffers[key] = np.empty((h, w), dtype=typecode)
+            arrays.append(band.ReadAsArray(xoff, yoff, w, h, buf_obj=buf_obj))
+        return arrays
+
+    def write_window(idx, window, results):
+        xoff, yoff = window[0], window[1]
+        for band, array in zip(dst_bands, results):
+            band.WriteArray(array, xoff, yoff)
+        if callback is not None:
+            callback((idx + 1.0) / len(windows))
+
+    if not threads or threads <= 1:
+        for idx, window in enumerate(windows):
+            write_window(idx, window, func(*read_window(window, True)))
+        return
+
+    max_pending = 2 * threads
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        try:
+            for idx, window in enumerate(windows):
+                arrays = read_window(window, False)
+                pending.append((idx, window, executor.submit(func, *arrays)))
+                if len(pending) >= max_pending:
+                    idx, window, future = pending.popleft()
+                    write_window(idx, window, future.result())
+            while pending:
+                idx, window, future = pending.popleft()
+                write_window(idx, window, future.result())
+        finally:
+            # on error, do not compute the windows that are not needed
+            for _, _, future in pending:
+                future.cancel()
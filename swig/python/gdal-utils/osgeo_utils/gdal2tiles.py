@@ -38,19 +38,39 @@
 
 from __future__ import division, print_function
 
+import array
+import bisect
+import concurrent.futures
 import contextlib
 import glob
+import gzip
+import hashlib
+import io
 import json
 import math
 import optparse
 import os
 import shutil
+import sqlite3
 import stat
+import struct
 import sys
 import tempfile
 import threading
+import time
 from functools import partial
-from typing import Any, List, NoReturn, Optional, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NoReturn,
+    Optional,
+    Set,
+    Tuple,
+)
 from uuid import uuid4
 from xml.etree import ElementTree
 
@@ -87,6 +107,23 @@ resampling_list = (
     "q3",
 )
 webviewer_list = ("all", "google", "openlayers", "leaflet", "mapml", "none")
+# Fields of TileDetail, in the order they are stored in TileDetails
+tile_detail_fields = (
+    "tx",
+    "ty",
+    "tz",
+    "rx",
+    "ry",
+    "rxsize",
+    "rysize",
+    "wx",
+    "wy",
+    "wxsize",
+    "wysize",
+    "querysize",
+)
+# Single-file tile containers, selected from the extension of the output path
+tile_sink_formats = {".mbtiles": "MBTiles", ".gpkg": "GPKG", ".pmtiles": "PMTiles"}
 
 
 def makedirs(path):
@@ -141,6 +178,14 @@ class UnsupportedTileMatrixSet(Exception):
     pass
 
 
+def pixels_to_tile(p, tile_size):
+    "Index of the tile containing pixel coordinate(s) p (float or numpy array)"
+
+    if numpy_available and isinstance(p, numpy.ndarray):
+        return numpy.ceil(p / float(tile_size)).astype(numpy.int64) - 1
+    return int(math.ceil(p / float(tile_size)) - 1)
+
+
 class TileMatrixSet(object):
     def __init__(self) -> None:
         self.identifier = None
@@ -189,7 +234,7 @@ class TileMatrixSet(object):
         return mx, my
 
     def TileBounds(self, tx, ty, zoom, overriden_tile_size):
-        "Returns bounds of the given tile in georef coordinates"
+        "Returns bounds of the given tile(s) in georef coordinates (tx, ty: int or numpy arrays)"
 
         minx, miny = self.PixelsToMeters(
             tx * overriden_tile_size,
@@ -482,9 +527,7 @@ class GlobalMercator(object):
     def PixelsToTile(self, px, py):
         "Returns a tile covering region in given pixel coordinates"
 
-        tx = int(math.ceil(px / float(self.tile_size)) - 1)
-        ty = int(math.ceil(py / float(self.tile_size)) - 1)
-        return tx, ty
+        return pixels_to_tile(px, self.tile_size), pixels_to_tile(py, self.tile_size)
 
     def PixelsToRaster(self, px, py, zoom):
         "Move the origin of pixel coordinates to top-left corner"
@@ -499,7 +542,7 @@ class GlobalMercator(object):
         return self.PixelsToTile(px, py)
 
     def TileBounds(self, tx, ty, zoom):
-        "Returns bounds of the given tile in EPSG:3857 coordinates"
+        "Returns bounds of the given tile(s) in EPSG:3857 coordinates (tx, ty: int or numpy arrays)"
 
         minx, miny = self.PixelsToMeters(tx * self.tile_size, ty * self.tile_size, zoom)
         maxx, maxy = self.PixelsToMeters(
@@ -611,9 +654,7 @@ class GlobalGeodetic(object):
     def PixelsToTile(self, px, py):
         "Returns coordinates of the tile covering region in pixel coordinates"
 
-        tx = int(math.ceil(px / float(self.tile_size)) - 1)
-        ty = int(math.ceil(py / float(self.tile_size)) - 1)
-        return tx, ty
+        return pixels_to_tile(px, self.tile_size), pixels_to_tile(py, self.tile_size)
 
     def LonLatToTile(self, lon, lat, zoom):
         "Returns the tile for zoom which covers given lon/lat coordinates"
@@ -635,7 +676,7 @@ class GlobalGeodetic(object):
         return MAXZOOMLEVEL - 1
 
     def TileBounds(self, tx, ty, zoom):
-        "Returns bounds of the given tile"
+        "Returns bounds of the given tile(s) (tx, ty: int or numpy arrays)"
         res = self.resFact / 2**zoom
         return (
             tx * self.tile_size * res - 180,
@@ -897,17 +938,26 @@ def scale_query_to_tile(dsquery, dstile, options, tilefilename=""):
             )
         im = Image.fromarray(array, "RGBA")  # Always four bands
         im1 = im.resize((tile_size, tile_size), Image.LANCZOS)
-        if os.path.exists(tilefilename):
-            im0 = Image.open(tilefilename)
-            im1 = Image.composite(im1, im0, im1)
-
-        params = {}
-        if options.tiledriver == "WEBP":
-            if options.webp_lossless:
-                params["lossless"] = True
-            else:
-                params["quality"] = options.webp_quality
-        im1.save(tilefilename, options.tiledriver, **params)
+
+        # No file name when the tile is not stored as a file of its own: the
+        # tile sink will encode dstile
+        if tilefilename:
+            if os.path.exists(tilefilename):
+                im0 = Image.open(tilefilename)
+                im1 = Image.composite(im1, im0, im1)
+
+            params = {}
+            if options.tiledriver == "WEBP":
+                if options.webp_lossless:
+                    params["lossless"] = True
+                else:
+                    params["quality"] = options.webp_quality
+            im1.save(tilefilename, options.tiledriver, **params)
+
+        # Also keep the result in dstile for callers that reuse the tile in memory
+        array = numpy.array(im1)
+        for i in range(tilebands):
+            dstile.GetRasterBand(i + 1).WriteArray(array[:, :, i])
 
     else:
 
@@ -1295,26 +1345,1345 @@ def _get_creation_options(options):
     return copts
 
 
-def create_base_tile(tile_job_info: "TileJobInfo", tile_detail: "TileDetail") -> None:
+def get_output_format(output_path: str) -> str:
+    """Tile container to write to: 'directory', 'MBTiles', 'GPKG' or 'PMTiles'"""
+    ext = os.path.splitext(output_path)[1].lower()
+    return tile_sink_formats.get(ext, "directory")
+
+
+class TileEncoder(object):
+    """
+    Base class of the tile encoders, which turn an in-memory tile into an encoded
+    PNG or WEBP file, and account for the number of tiles, bytes and time spent.
+    """
+
+    name = ""
+
+    def __init__(self, tile_job_info: "TileJobInfo") -> None:
+        self.tile_job_info = tile_job_info
+        self.options = tile_job_info.options
+        self.nb_tiles = 0
+        self.nb_bytes = 0
+        self.seconds = 0.0
+
+    def encode(self, dstile: gdal.Dataset, raw: Optional[bytes] = None) -> bytes:
+        """
+        Encode dstile, whose band interleaved pixels (as returned by ReadRaster())
+        may be passed in raw to avoid reading them again
+        """
+        with profile_stage(self.options, "encode"):
+            start = time.perf_counter()
+            data = self.encode_tile(dstile, raw)
+            self.account(start, len(data))
+        return data
+
+    def encode_tile(self, dstile: gdal.Dataset, raw: Optional[bytes]) -> bytes:
+        raise NotImplementedError
+
+    def account(self, start: float, nb_bytes: int) -> None:
+        self.seconds += time.perf_counter() - start
+        self.nb_tiles += 1
+        self.nb_bytes += nb_bytes
+
+    def pop_stats(self) -> Dict[str, Any]:
+        """Return the statistics accumulated since the last call, and reset them"""
+        stats = {
+            "tiles": self.nb_tiles,
+            "bytes": self.nb_bytes,
+            "seconds": self.seconds,
+        }
+        self.nb_tiles = 0
+        self.nb_bytes = 0
+        self.seconds = 0.0
+        return stats
+
+
+class GDALTileEncoder(TileEncoder):
+    """Encode tiles with the GDAL PNG or WEBP driver"""
+
+    name = "gdal"
+
+    def __init__(self, tile_job_info: "TileJobInfo") -> None:
+        super().__init__(tile_job_info)
+        self.driver = gdal.GetDriverByName(tile_job_info.tile_driver)
+        self.creation_options = _get_creation_options(self.options)
+
+    def encode_tile(self, dstile: gdal.Dataset, raw: Optional[bytes]) -> bytes:
+        tmp_filename = "/vsimem/gdal2tiles_%s.%s" % (
+            uuid4(),
+            self.tile_job_info.tile_extension,
+        )
+        self.driver.CreateCopy(
+            tmp_filename, dstile, strict=0, options=self.creation_options
+        )
+        try:
+            f = gdal.VSIFOpenL(tmp_filename, "rb")
+            if f is None:
+                raise Exception("Cannot encode tile")
+            gdal.VSIFSeekL(f, 0, 2)
+            size = gdal.VSIFTellL(f)
+            gdal.VSIFSeekL(f, 0, 0)
+            data = gdal.VSIFReadL(1, size, f)
+            gdal.VSIFCloseL(f)
+        finally:
+            gdal.Unlink(tmp_filename)
+            if gdal.VSIStatL(tmp_filename + ".aux.xml") is not None:
+                gdal.Unlink(tmp_filename + ".aux.xml")
+        return data
+
+    def encode_to_file(self, dstile: gdal.Dataset, filename: str) -> int:
+        """
+        Encode dstile straight into filename, without an intermediate buffer, and
+        return the size of the file
+        """
+        with profile_stage(self.options, "encode"):
+            start = time.perf_counter()
+            self.driver.CreateCopy(
+                filename, dstile, strict=0, options=self.creation_options
+            )
+            # Remove useless side car file
+            aux_xml = filename + ".aux.xml"
+            if gdal.VSIStatL(aux_xml) is not None:
+                gdal.Unlink(aux_xml)
+            stat_res = gdal.VSIStatL(filename)
+            size = stat_res.size if stat_res is not None else 0
+            self.account(start, size)
+        return size
+
+
+class PillowTileEncoder(TileEncoder):
+    """
+    Encode tiles with Pillow, straight from their pixel buffer, which avoids the
+    round trip through a /vsimem/ file and the GDAL driver machinery
+    """
+
+    name = "pillow"
+
+    def __init__(self, tile_job_info: "TileJobInfo") -> None:
+        super().__init__(tile_job_info)
+        self.format = tile_job_info.tile_driver
+        self.params = {}
+        if self.format == "WEBP":
+            if self.options.webp_lossless:
+                self.params["lossless"] = True
+            else:
+                self.params["quality"] = self.options.webp_quality
+
+    def encode_tile(self, dstile: gdal.Dataset, raw: Optional[bytes]) -> bytes:
+        if raw is None:
+            raw = dstile.ReadRaster()
+        nb_bands = dstile.RasterCount
+        array = numpy.frombuffer(raw, dtype=numpy.uint8).reshape(
+            nb_bands, dstile.RasterYSize, dstile.RasterXSize
+        )
+        # The image mode (L, LA, RGB or RGBA) follows from the number of bands
+        if nb_bands == 1:
+            im = Image.fromarray(array[0])
+        else:
+            im = Image.fromarray(numpy.ascontiguousarray(array.transpose(1, 2, 0)))
+        f = io.BytesIO()
+        im.save(f, self.format, **self.params)
+        return f.getvalue()
+
+
+tile_encoders = {"gdal": GDALTileEncoder, "pillow": PillowTileEncoder}
+
+
+def get_tile_encoder(tile_job_info: "TileJobInfo") -> TileEncoder:
+    """Tile encoder selected by --encoder, kept by thread and process"""
+
+    options = tile_job_info.options
+    name = getattr(options, "encoder", None) or "gdal"
+    key = (name, tile_job_info.tile_driver, tuple(_get_creation_options(options)))
+    encoders = get_process_local("tile_encoders")
+    encoder = encoders.get(key)
+    if encoder is None:
+        encoder = tile_encoders[name](tile_job_info)
+        encoders[key] = encoder
+    return encoder
+
+
+def merge_stats(total: Dict[str, Any], stats: Dict[str, Any]) -> None:
+    """Add the (nested dictionaries of) counters of stats, e.g. from a worker, to total"""
+    for k, v in stats.items():
+        if isinstance(v, dict):
+            merge_stats(total.setdefault(k, {}), v)
+        else:
+            total[k] = total.get(k, 0) + v
+
+
+def pop_encoder_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Statistics of the tile encoders of the current thread since the last call,
+    by encoder name
+    """
+    stats = {}
+    for encoder in get_process_local("tile_encoders").values():
+        merge_stats(stats, {encoder.name: encoder.pop_stats()})
+    return stats
+
+
+def print_encoder_stats(stats: Dict[str, Dict[str, Any]]) -> None:
+    """Print the tile encoding throughput, seconds being summed over the workers"""
+    for name, encoder_stats in sorted(stats.items()):
+        if not encoder_stats["tiles"]:
+            continue
+        seconds = max(encoder_stats["seconds"], 1e-9)
+        megabytes = encoder_stats["bytes"] / (1024.0 * 1024.0)
+        print(
+            "Tile encoding (%s): %d tiles, %.2f MB in %.2f s: "
+            "%.1f tiles/s, %.2f MB/s"
+            % (
+                name,
+                encoder_stats["tiles"],
+                megabytes,
+                encoder_stats["seconds"],
+                encoder_stats["tiles"] / seconds,
+                megabytes / seconds,
+            )
+        )
+
+
+# CPU time of the current thread (of the whole process before Python 3.7)
+thread_time = getattr(time, "thread_time", time.process_time)
+
+
+class TileProfile(object):
+    """
+    Wall and CPU times spent by the current thread in each stage of the tile
+    generation, with counters of bytes written and skipped tiles, for
+    --profile-report.
+
+    The time of a stage excludes the stages nested in it (e.g. encoding inside
+    writing), so that the times of all stages add up.
+    """
+
+    def __init__(self) -> None:
+        self.stages = {}
+        self.counters = {}
+        self.nested_times = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self.nested_times.append([0.0, 0.0])
+        start_wall = time.perf_counter()
+        start_cpu = thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = thread_time() - start_cpu
+            nested_wall, nested_cpu = self.nested_times.pop()
+            if self.nested_times:
+                self.nested_times[-1][0] += wall
+                self.nested_times[-1][1] += cpu
+            stats = self.stages.setdefault(name, {"count": 0, "wall": 0.0, "cpu": 0.0})
+            stats["count"] += 1
+            stats["wall"] += wall - nested_wall
+            stats["cpu"] += cpu - nested_cpu
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def pop_stats(self) -> Dict[str, Any]:
+        """Return the statistics accumulated since the last call, and reset them"""
+        stats = {"stages": self.stages, "counters": self.counters}
+        self.stages = {}
+        self.counters = {}
+        return stats
+
+
+class NoProfileStage(object):
+    """Context manager doing nothing, used when --profile-report is not set"""
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, tb):
+        pass
+
+
+no_profile_stage = NoProfileStage()
+
+
+def get_tile_profile(options: Options) -> Optional[TileProfile]:
+    """Profile of the current thread, or None without --profile-report"""
+
+    if not getattr(options, "profile_report", None):
+        return None
+    local = get_process_local("tile_profile")
+    profile = local.get("profile")
+    if profile is None:
+        profile = local["profile"] = TileProfile()
+    return profile
+
+
+def profile_stage(options: Options, name: str):
+    """Context manager accounting for the time spent in a stage of the tile generation"""
+    profile = get_tile_profile(options)
+    if profile is None:
+        return no_profile_stage
+    return profile.stage(name)
+
+
+def profile_count(options: Options, name: str, value: int = 1) -> None:
+    """Increment a counter of the --profile-report"""
+    profile = get_tile_profile(options)
+    if profile is not None:
+        profile.count(name, value)
+
+
+def pop_worker_stats(options: Options) -> Dict[str, Any]:
+    """
+    Encoder statistics and profile of the current thread since the last call, to
+    be merged by the parent process with merge_stats()
+    """
+    stats = {"encoders": pop_encoder_stats()}
+    profile = get_tile_profile(options)
+    if profile is not None:
+        stats.update(profile.pop_stats())
+    return stats
+
+
+def report_tiling_stats(
+    options: Options, stats: Dict[str, Any], wall_time: float, nb_workers: int
+) -> None:
+    """Print the encoder statistics in verbose mode, and write the --profile-report"""
+
+    if options.verbose:
+        print_encoder_stats(stats.get("encoders", {}))
+
+    if not getattr(options, "profile_report", None):
+        return
+
+    report = {
+        "wall_time": wall_time,
+        "workers": nb_workers,
+        "stages": stats.get("stages", {}),
+        "counters": stats.get("counters", {}),
+        "encoders": stats.get("encoders", {}),
+    }
+    for stage_stats in report["stages"].values():
+        stage_stats["wall_per_call"] = stage_stats["wall"] / max(
+            stage_stats["count"], 1
+        )
+    with open(options.profile_report, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def decode_tile(data: bytes, tile_job_info: "TileJobInfo") -> gdal.Dataset:
+    """Decode an encoded tile into an in-memory dataset with an alpha band"""
+
+    tmp_filename = "/vsimem/gdal2tiles_%s.%s" % (uuid4(), tile_job_info.tile_extension)
+    gdal.FileFromMemBuffer(tmp_filename, data)
+    try:
+        ds = read_tile_from_disk(tmp_filename, tile_job_info)
+        return gdal.GetDriverByName("MEM").CreateCopy("", ds, 0)
+    finally:
+        gdal.Unlink(tmp_filename)
+
+
+def get_process_local(name: str) -> dict:
+    """
+    Dictionary attached to the current thread under name, which is not shared
+    with the processes forked from it
+    """
+
+    pid_name = name + "_pid"
+    if getattr(threadLocal, pid_name, None) != os.getpid():
+        setattr(threadLocal, name, {})
+        setattr(threadLocal, pid_name, os.getpid())
+    return getattr(threadLocal, name)
+
+
+def is_transparent(alpha: bytes) -> bool:
+    """Whether an alpha buffer (as returned by ReadRaster()) is fully transparent"""
+    if numpy_available:
+        return not numpy.frombuffer(alpha, dtype=numpy.uint8).any()
+    return len(alpha) == alpha.count(b"\x00")
+
+
+def get_uniform_value(raw: bytes, nb_bands: int) -> Optional[bytes]:
+    """
+    Return the pixel value (one byte per band) if all the pixels of a band
+    interleaved buffer are equal, or None otherwise
+    """
+
+    band_size = len(raw) // nb_bands
+    if numpy_available:
+        array = numpy.frombuffer(raw, dtype=numpy.uint8).reshape(nb_bands, band_size)
+        first = array[:, :1]
+        if (array == first).all():
+            return first.tobytes()
+        return None
+
+    value = raw[::band_size][:nb_bands]
+    for i in range(nb_bands):
+        if raw[i * band_size : (i + 1) * band_size] != value[i : i + 1] * band_size:
+            return None
+    return value
+
+
+class TileContent(object):
+    """
+    Pixel content of a tile, used to detect uniform tiles (empty, nodata or single
+    colour areas) and to identify tiles with the same content.
+
+    The key and the encoded tile are computed on demand. Uniform tiles are keyed
+    by their pixel value and encoded once per process.
+    """
+
+    # Maximum number of encoded uniform tiles kept by process
+    max_cached_uniform_tiles = 1024
+
+    def __init__(self, dstile: gdal.Dataset, tile_job_info: "TileJobInfo") -> None:
+        self.dstile = dstile
+        self.tile_job_info = tile_job_info
+        self.raw = dstile.ReadRaster()
+        self.uniform_value = get_uniform_value(self.raw, dstile.RasterCount)
+        self._key = None
+        self._data = None
+
+    @property
+    def key(self) -> str:
+        if self._key is None:
+            if self.uniform_value is not None:
+                self._key = "uniform-%d-%s" % (
+                    self.dstile.RasterXSize,
+                    self.uniform_value.hex(),
+                )
+            else:
+                self._key = hashlib.sha1(self.raw).hexdigest()
+        return self._key
+
+    @property
+    def data(self) -> bytes:
+        if self._data is not None:
+            return self._data
+
+        encoder = get_tile_encoder(self.tile_job_info)
+        if self.uniform_value is None:
+            self._data = encoder.encode(self.dstile, self.raw)
+            return self._data
+
+        cache = get_process_local("uniform_tiles")
+        cache_key = (
+            self.key,
+            self.tile_job_info.tile_driver,
+            tuple(_get_creation_options(self.tile_job_info.options)),
+        )
+        self._data = cache.get(cache_key)
+        if self._data is None:
+            self._data = encoder.encode(self.dstile, self.raw)
+            if len(cache) >= self.max_cached_uniform_tiles:
+                cache.clear()
+            cache[cache_key] = self._data
+        return self._data
+
+
+def write_file(filename: str, data: bytes) -> None:
+    """Write data into a (possibly /vsi) file"""
+    f = gdal.VSIFOpenL(filename, "wb")
+    if f is None:
+        raise Exception("Cannot create %s" % filename)
+    try:
+        if gdal.VSIFWriteL(data, 1, len(data), f) != len(data):
+            raise Exception("Cannot write %s" % filename)
+    finally:
+        gdal.VSIFCloseL(f)
+
+
+class DirectoryTileSink(object):
+    """
+    Write tiles as {z}/{x}/{y}.{ext} files in the output folder.
+
+    Tile coordinates passed to the methods of tile sinks are the ones of the
+    tile grid (TMS numbering), whatever the output numbering is.
+    """
+
+    def __init__(self, tile_job_info: "TileJobInfo") -> None:
+        self.tile_job_info = tile_job_info
+        self.filename = tile_job_info.output_file_path
+        self.deduplicate = tile_job_info.options.deduplicate_tiles and not (
+            self.filename.startswith("/vsi")
+        )
+
+    def create(self, metadata: dict) -> None:
+        makedirs(self.filename)
+
+    def tile_filename(self, tz: int, tx: int, ty: int) -> str:
+        ty_real = GDAL2Tiles.getYTile(ty, tz, self.tile_job_info.options)
+        return os.path.join(
+            self.filename,
+            str(tz),
+            str(tx),
+            "%s.%s" % (ty_real, self.tile_job_info.tile_extension),
+        )
+
+    def make_tile_dirs(self, tz: int, tminx: int, tmaxx: int) -> None:
+        for tx in range(tminx, tmaxx + 1):
+            makedirs(os.path.join(self.filename, str(tz), str(tx)))
+
+    def tile_exists(self, tz: int, tx: int, ty: int) -> bool:
+        return isfile(self.tile_filename(tz, tx, ty))
+
+    def read_tile(self, tz: int, tx: int, ty: int) -> Optional[gdal.Dataset]:
+        return read_tile_from_disk(self.tile_filename(tz, tx, ty), self.tile_job_info)
+
+    def write_tile(self, tz: int, tx: int, ty: int, dstile: gdal.Dataset) -> None:
+        options = self.tile_job_info.options
+        if options.resampling == "antialias":
+            # Already saved by PIL in scale_query_to_tile()
+            return
+        tilefilename = self.tile_filename(tz, tx, ty)
+        if not tilefilename.startswith("/vsi"):
+            self.unlink_shared_tile(tilefilename)
+
+        content = TileContent(dstile, self.tile_job_info)
+        if self.deduplicate:
+            dedup_table = get_process_local("tile_dedup_table")
+            existing_filename = dedup_table.get(content.key)
+            if existing_filename is not None:
+                try:
+                    if os.path.lexists(tilefilename):
+                        os.unlink(tilefilename)
+                    os.link(existing_filename, tilefilename)
+                    profile_count(options, "tiles_deduplicated")
+                    return
+                except OSError:
+                    # e.g. file system without hard links
+                    pass
+            dedup_table[content.key] = tilefilename
+        elif content.uniform_value is None:
+            encoder = get_tile_encoder(self.tile_job_info)
+            if isinstance(encoder, GDALTileEncoder):
+                size = encoder.encode_to_file(dstile, tilefilename)
+                profile_count(options, "bytes_written", size)
+                return
+
+        write_file(tilefilename, content.data)
+        profile_count(options, "bytes_written", len(content.data))
+
+    def delete_tile(self, tz: int, tx: int, ty: int) -> None:
+        """Remove a tile generated by a previous run"""
+        tilefilename = self.tile_filename(tz, tx, ty)
+        if isfile(tilefilename):
+            gdal.Unlink(tilefilename)
+
+    @staticmethod
+    def unlink_shared_tile(tilefilename: str) -> None:
+        """
+        Remove an existing tile file hard linked to other tiles (by a previous
+        --deduplicate-tiles run), so that overwriting it does not modify them
+        """
+        try:
+            if os.stat(tilefilename).st_nlink > 1:
+                os.unlink(tilefilename)
+        except OSError:
+            pass
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def finalize(self) -> None:
+        pass
+
+
+class SQLiteTileSink(object):
+    """
+    Base class of the tile sinks storing tiles in a SQLite database.
+
+    Each process (or thread) writes through its own connection. Tiles are encoded
+    as they are generated, and the resulting rows kept in memory until batch_size
+    tiles are pending: they are then written in a single short transaction, so
+    that the database write lock is only held while the rows are inserted, and
+    not while the next tiles are rendered. The database is switched to WAL mode
+    while the tiles are generated, so that readers do not block writers. WAL
+    relies on shared memory between the processes accessing the database, and
+    does not work on network filesystems: the output must be on a local disk.
+    """
+
+    # Number of tiles inserted by transaction
+    batch_size = 256
+
+    select_tile_sql = ""
+    insert_tile_sql = ""
+    delete_tile_sql = ""
+
+    def __init__(self, tile_job_info: "TileJobInfo", filename: str = "") -> None:
+        self.tile_job_info = tile_job_info
+        self.filename = filename or tile_job_info.output_file_path
+        # Transactions are explicitly opened by create() and flush()
+        self.conn = sqlite3.connect(self.filename, timeout=3600, isolation_level=None)
+        self.nb_pending_tiles = 0
+        # Parameters of the pending statements, by statement
+        self.pending_rows = {}
+        # Encoded data of the pending tiles by key, and of the pending shared
+        # tile data by content key, so that they can be read back before flush()
+        self.pending_tiles = {}
+        self.pending_contents = {}
+
+    def create(self, metadata: dict) -> None:
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.create_tables(metadata)
+        self.conn.commit()
+
+    def create_tables(self, metadata: dict) -> None:
+        raise NotImplementedError
+
+    def tile_key(self, tz: int, tx: int, ty: int) -> Tuple[int, ...]:
+        raise NotImplementedError
+
+    def tile_filename(self, tz: int, tx: int, ty: int) -> str:
+        # Tiles are not stored as individual files
+        return ""
+
+    def make_tile_dirs(self, tz: int, tminx: int, tmaxx: int) -> None:
+        pass
+
+    def read_tile_data(self, tz: int, tx: int, ty: int) -> Optional[bytes]:
+        key = self.tile_key(tz, tx, ty)
+        if key in self.pending_tiles:
+            # None if the tile is to be deleted
+            return self.pending_tiles[key]
+        row = self.conn.execute(self.select_tile_sql, key).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def tile_exists(self, tz: int, tx: int, ty: int) -> bool:
+        return self.read_tile_data(tz, tx, ty) is not None
+
+    def read_tile(self, tz: int, tx: int, ty: int) -> Optional[gdal.Dataset]:
+        data = self.read_tile_data(tz, tx, ty)
+        if data is None:
+            return None
+        return decode_tile(data, self.tile_job_info)
+
+    def write_tile(self, tz: int, tx: int, ty: int, dstile: gdal.Dataset) -> None:
+        self.insert_tile(
+            self.tile_key(tz, tx, ty), TileContent(dstile, self.tile_job_info)
+        )
+        self.nb_pending_tiles += 1
+        if self.nb_pending_tiles >= self.batch_size:
+            self.flush()
+
+    def delete_tile(self, tz: int, tx: int, ty: int) -> None:
+        """Remove a tile generated by a previous run"""
+        key = self.tile_key(tz, tx, ty)
+        self.queue_row(self.delete_tile_sql, key)
+        self.pending_tiles[key] = None
+        self.nb_pending_tiles += 1
+        if self.nb_pending_tiles >= self.batch_size:
+            self.flush()
+
+    def queue_row(self, sql: str, params: Tuple) -> None:
+        """Keep a row to be written by sql at the next flush()"""
+        self.pending_rows.setdefault(sql, []).append(params)
+
+    def insert_tile(self, key: Tuple[int, ...], content: TileContent) -> None:
+        data = content.data
+        self.queue_row(self.insert_tile_sql, key + (sqlite3.Binary(data),))
+        self.pending_tiles[key] = data
+        profile_count(self.tile_job_info.options, "bytes_written", len(data))
+
+    def insert_shared_tile(
+        self,
+        key: Tuple[int, ...],
+        content: TileContent,
+        select_content_sql: str,
+        insert_content_sql: str,
+        insert_reference_sql: str,
+    ) -> None:
+        """
+        Insert a tile whose encoded data is stored once by content key, and only
+        encoded if no other tile with the same content has been stored yet
+        """
+        options = self.tile_job_info.options
+        content_key = content.key
+        data = self.pending_contents.get(content_key)
+        if data is None:
+            row = self.conn.execute(select_content_sql, (content_key,)).fetchone()
+            if row is not None:
+                data = row[0]
+        if data is None:
+            data = content.data
+            self.queue_row(insert_content_sql, (sqlite3.Binary(data), content_key))
+            self.pending_contents[content_key] = data
+            profile_count(options, "bytes_written", len(data))
+        else:
+            profile_count(options, "tiles_deduplicated")
+        self.queue_row(insert_reference_sql, key + (content_key,))
+        self.pending_tiles[key] = data
+
+    def flush(self) -> None:
+        """Write the pending rows in a single transaction"""
+        if self.pending_rows:
+            # Take the write lock upfront, rather than upgrading a read lock
+            # which may fail with a concurrent writer
+            self.conn.execute("BEGIN IMMEDIATE")
+            for sql, rows in self.pending_rows.items():
+                self.conn.executemany(sql, rows)
+            self.conn.commit()
+        self.pending_rows = {}
+        self.pending_tiles = {}
+        self.pending_contents = {}
+        self.nb_pending_tiles = 0
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def finalize(self) -> None:
+        """Make the database a single file again, once all tiles are written"""
+        self.flush()
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.close()
+
+
+class MBTilesTileSink(SQLiteTileSink):
+    """
+    Write tiles in a MBTiles 1.3 file.
+
+    With --deduplicate-tiles, tiles are stored with the map / images schema,
+    tiles being a view on them, so that identical tiles share their tile_data.
+    """
+
+    select_tile_sql = (
+        "SELECT tile_data FROM tiles "
+        "WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?"
+    )
+    insert_tile_sql = (
+        "INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) "
+        "VALUES (?, ?, ?, ?)"
+    )
+
+    def __init__(self, tile_job_info: "TileJobInfo", filename: str = "") -> None:
+        super(MBTilesTileSink, self).__init__(tile_job_info, filename)
+        self.deduplicate = tile_job_info.options.deduplicate_tiles
+        # tiles is a view with --deduplicate-tiles
+        self.delete_tile_sql = (
+            "DELETE FROM %s WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?"
+            % ("map" if self.deduplicate else "tiles")
+        )
+
+    def create_tables(self, metadata: dict) -> None:
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT, "
+            "UNIQUE (name))"
+        )
+        tiles_type = self.conn.execute(
+            "SELECT type FROM sqlite_master WHERE name = 'tiles'"
+        ).fetchone()
+        if self.deduplicate:
+            if tiles_type == ("table",):
+                raise Exception(
+                    "%s has a tiles table: --deduplicate-tiles cannot be used on it"
+                    % self.filename
+                )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS map (zoom_level INTEGER, "
+                "tile_column INTEGER, tile_row INTEGER, tile_id TEXT, "
+                "UNIQUE (zoom_level, tile_column, tile_row))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS images (tile_data BLOB, tile_id TEXT, "
+                "UNIQUE (tile_id))"
+            )
+            self.conn.execute(
+                "CREATE VIEW IF NOT EXISTS tiles AS SELECT "
+                "map.zoom_level AS zoom_level, map.tile_column AS tile_column, "
+                "map.tile_row AS tile_row, images.tile_data AS tile_data "
+                "FROM map JOIN images ON images.tile_id = map.tile_id"
+            )
+        else:
+            if tiles_type == ("view",):
+                raise Exception(
+                    "%s has deduplicated tiles: --deduplicate-tiles must be used"
+                    % self.filename
+                )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, "
+                "tile_column INTEGER, tile_row INTEGER, tile_data BLOB, "
+                "UNIQUE (zoom_level, tile_column, tile_row))"
+            )
+        south, west, north, east = metadata["swne"]
+        values = {
+            "name": metadata["title"],
+            "format": self.tile_job_info.tile_extension,
+            "bounds": "%.17g,%.17g,%.17g,%.17g" % (west, south, east, north),
+            "center": "%.17g,%.17g,%d"
+            % ((west + east) / 2, (south + north) / 2, metadata["tminz"]),
+            "minzoom": str(metadata["tminz"]),
+            "maxzoom": str(metadata["tmaxz"]),
+            "type": "overlay",
+            "version": "1.1",
+            "description": metadata["title"],
+        }
+        if metadata["copyright"]:
+            values["attribution"] = metadata["copyright"]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+            values.items(),
+        )
+
+    def tile_key(self, tz: int, tx: int, ty: int) -> Tuple[int, ...]:
+        # MBTiles uses the TMS numbering
+        return (tz, tx, ty)
+
+    def insert_tile(self, key: Tuple[int, ...], content: TileContent) -> None:
+        if not self.deduplicate:
+            super(MBTilesTileSink, self).insert_tile(key, content)
+            return
+        self.insert_shared_tile(
+            key,
+            content,
+            "SELECT tile_data FROM images WHERE tile_id = ?",
+            "INSERT OR IGNORE INTO images (tile_data, tile_id) VALUES (?, ?)",
+            "INSERT OR REPLACE INTO map (zoom_level, tile_column, tile_row, tile_id) "
+            "VALUES (?, ?, ?, ?)",
+        )
+
+
+class GPKGTileSink(SQLiteTileSink):
+    """Write tiles in a tile pyramid user data table of a GeoPackage 1.2 file"""
+
+    def __init__(self, tile_job_info: "TileJobInfo", filename: str = "") -> None:
+        super(GPKGTileSink, self).__init__(tile_job_info, filename)
+        self.table_name = os.path.splitext(os.path.basename(self.filename))[0]
+        quoted_table_name = '"%s"' % self.table_name.replace('"', '""')
+        self.select_tile_sql = (
+            "SELECT tile_data FROM %s "
+            "WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?"
+            % quoted_table_name
+        )
+        self.insert_tile_sql = (
+            "INSERT OR REPLACE INTO %s (zoom_level, tile_column, tile_row, tile_data) "
+            "VALUES (?, ?, ?, ?)" % quoted_table_name
+        )
+        self.delete_tile_sql = (
+            "DELETE FROM %s WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?"
+            % quoted_table_name
+        )
+
+        options = tile_job_info.options
+        tile_size = tile_job_info.tile_size
+        if options.profile == "mercator":
+            mercator = GlobalMercator(tile_size=tile_size)
+            self.srs_id = 3857
+            self.origin = (-mercator.originShift, -mercator.originShift)
+            self.matrix_size = (1, 1)
+            self.resolution = mercator.Resolution(0)
+        else:
+            geodetic = GlobalGeodetic(options.tmscompatible, tile_size=tile_size)
+            self.srs_id = 4326
+            self.origin = (-180.0, -90.0)
+            self.matrix_size = (2 if options.tmscompatible else 1, 1)
+            self.resolution = geodetic.Resolution(0)
+
+    def create_tables(self, metadata: dict) -> None:
+        tile_size = self.tile_job_info.tile_size
+        conn = self.conn
+        conn.execute("PRAGMA application_id = %d" % 0x47504B47)
+        conn.execute("PRAGMA user_version = 10200")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys ("
+            "srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, "
+            "organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, "
+            "definition TEXT NOT NULL, description TEXT)"
+        )
+        srs_rows = [
+            ("Undefined cartesian SRS", -1, "NONE", -1, "undefined", None),
+            ("Undefined geographic SRS", 0, "NONE", 0, "undefined", None),
+        ]
+        for srs_name, epsg in (
+            ("WGS 84 geodetic", 4326),
+            ("WGS 84 / Pseudo-Mercator", 3857),
+        ):
+            if epsg == 3857 and self.srs_id != 3857:
+                continue
+            srs = osr.SpatialReference()
+            srs.ImportFromEPSG(epsg)
+            srs_rows.append((srs_name, epsg, "EPSG", epsg, srs.ExportToWkt(), None))
+        conn.executemany(
+            "INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)",
+            srs_rows,
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS gpkg_contents ("
+            "table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, "
+            "identifier TEXT UNIQUE, description TEXT DEFAULT '', "
+            "last_change DATETIME NOT NULL DEFAULT "
+            "(strftime('%Y-%m-%dT%H:%M:%fZ','now')), "
+            "min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, "
+            "srs_id INTEGER, "
+            "CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) "
+            "REFERENCES gpkg_spatial_ref_sys(srs_id))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS gpkg_tile_matrix_set ("
+            "table_name TEXT NOT NULL PRIMARY KEY, srs_id INTEGER NOT NULL, "
+            "min_x DOUBLE NOT NULL, min_y DOUBLE NOT NULL, "
+            "max_x DOUBLE NOT NULL, max_y DOUBLE NOT NULL, "
+            "CONSTRAINT fk_gtms_table_name FOREIGN KEY (table_name) "
+            "REFERENCES gpkg_contents(table_name), "
+            "CONSTRAINT fk_gtms_srs FOREIGN KEY (srs_id) "
+            "REFERENCES gpkg_spatial_ref_sys (srs_id))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS gpkg_tile_matrix ("
+            "table_name TEXT NOT NULL, zoom_level INTEGER NOT NULL, "
+            "matrix_width INTEGER NOT NULL, matrix_height INTEGER NOT NULL, "
+            "tile_width INTEGER NOT NULL, tile_height INTEGER NOT NULL, "
+            "pixel_x_size DOUBLE NOT NULL, pixel_y_size DOUBLE NOT NULL, "
+            "CONSTRAINT pk_ttm PRIMARY KEY (table_name, zoom_level), "
+            "CONSTRAINT fk_tmm_table_name FOREIGN KEY (table_name) "
+            "REFERENCES gpkg_contents(table_name))"
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS "%s" ('
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, zoom_level INTEGER NOT NULL, "
+            "tile_column INTEGER NOT NULL, tile_row INTEGER NOT NULL, "
+            "tile_data BLOB NOT NULL, UNIQUE (zoom_level, tile_column, tile_row))"
+            % self.table_name.replace('"', '""')
+        )
+
+        min_x, min_y, max_x, max_y = metadata["extent"]
+        conn.execute(
+            "INSERT OR REPLACE INTO gpkg_contents (table_name, data_type, identifier, "
+            "description, min_x, min_y, max_x, max_y, srs_id) "
+            "VALUES (?, 'tiles', ?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.table_name,
+                metadata["title"],
+                metadata["copyright"],
+                min_x,
+                min_y,
+                max_x,
+                max_y,
+                self.srs_id,
+            ),
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO gpkg_tile_matrix_set VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                self.table_name,
+                self.srs_id,
+                self.origin[0],
+                self.origin[1],
+                self.origin[0] + self.matrix_size[0] * tile_size * self.resolution,
+                self.origin[1] + self.matrix_size[1] * tile_size * self.resolution,
+            ),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO gpkg_tile_matrix VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    self.table_name,
+                    tz,
+                    self.matrix_size[0] << tz,
+                    self.matrix_size[1] << tz,
+                    tile_size,
+                    tile_size,
+                    self.resolution / 2**tz,
+                    self.resolution / 2**tz,
+                )
+                for tz in range(metadata["tminz"], metadata["tmaxz"] + 1)
+            ],
+        )
+
+        if self.tile_job_info.tile_driver == "WEBP":
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS gpkg_extensions ("
+                "table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, "
+                "definition TEXT NOT NULL, scope TEXT NOT NULL, "
+                "CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name))"
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO gpkg_extensions VALUES "
+                "(?, 'tile_data', 'gpkg_webp', "
+                "'http://www.geopackage.org/spec120/#extension_tiles_webp', "
+                "'read-write')",
+                (self.table_name,),
+            )
+
+    def tile_key(self, tz: int, tx: int, ty: int) -> Tuple[int, ...]:
+        # GeoPackage numbers rows from the top of the tile matrix
+        return (tz, tx, (self.matrix_size[1] << tz) - 1 - ty)
+
+
+def pmtiles_tile_id(tz: int, tx: int, ty: int) -> int:
+    """
+    PMTiles identifier of a tile in XYZ numbering: its position along the Hilbert
+    curve of its zoom level, after all the tiles of the lower zoom levels
+    """
+
+    n = 1 << tz
+    tile_id = (n * n - 1) // 3
+    s = n >> 1
+    while s > 0:
+        rx = 1 if tx & s else 0
+        ry = 1 if ty & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                tx = n - 1 - tx
+                ty = n - 1 - ty
+            tx, ty = ty, tx
+        s >>= 1
+    return tile_id
+
+
+def _write_varint(buf: bytearray, value: int) -> None:
+    while value >= 0x80:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def serialize_pmtiles_directory(entries: List[Tuple[int, int, int, int]]) -> bytes:
+    """
+    Serialize and compress a PMTiles directory.
+
+    entries are (tile_id, offset, length, run_length) tuples, sorted by tile_id.
+    """
+
+    buf = bytearray()
+    _write_varint(buf, len(entries))
+    last_tile_id = 0
+    for tile_id, _, _, _ in entries:
+        _write_varint(buf, tile_id - last_tile_id)
+        last_tile_id = tile_id
+    for _, _, _, run_length in entries:
+        _write_varint(buf, run_length)
+    for _, _, length, _ in entries:
+        _write_varint(buf, length)
+    for i, (_, offset, _, _) in enumerate(entries):
+        if i > 0 and offset == entries[i - 1][1] + entries[i - 1][2]:
+            _write_varint(buf, 0)
+        else:
+            _write_varint(buf, offset + 1)
+    return gzip.compress(bytes(buf))
+
+
+def build_pmtiles_directories(
+    entries: List[Tuple[int, int, int, int]]
+) -> Tuple[bytes, bytes]:
+    """
+    Build the root directory and the leaf directories of a PMTiles archive, so
+    that the header and the root directory fit in the first 16 KB of the file.
+    """
+
+    max_root_size = 16384 - 127
+    root = serialize_pmtiles_directory(entries)
+    if len(root) <= max_root_size:
+        return root, b""
+
+    leaf_size = 4096
+    while True:
+        leaves = bytearray()
+        root_entries = []
+        for i in range(0, len(entries), leaf_size):
+            leaf = serialize_pmtiles_directory(entries[i : i + leaf_size])
+            root_entries.append((entries[i][0], len(leaves), len(leaf), 0))
+            leaves += leaf
+        root = serialize_pmtiles_directory(root_entries)
+        if len(root) <= max_root_size:
+            return root, bytes(leaves)
+        leaf_size *= 2
+
+
+class PMTilesTileSink(SQLiteTileSink):
+    """
+    Write tiles in a PMTiles version 3 archive.
+
+    Tiles are first staged in a temporary SQLite database next to the output
+    file, keyed by their PMTiles tile identifier, tiles with the same content
+    sharing their encoded data. finalize() then writes the archive in a single
+    sequential pass, with tiles clustered by tile identifier: identical tiles
+    point to the same tile data, and runs of them share a directory entry.
+    """
+
+    select_tile_sql = (
+        "SELECT tile_data FROM tiles JOIN contents USING (content_id) "
+        "WHERE tile_id = ?"
+    )
+    delete_tile_sql = "DELETE FROM tiles WHERE tile_id = ?"
+
+    def __init__(self, tile_job_info: "TileJobInfo", filename: str = "") -> None:
+        self.archive_filename = filename or tile_job_info.output_file_path
+        super(PMTilesTileSink, self).__init__(
+            tile_job_info, self.archive_filename + ".tmp"
+        )
+
+    def create_tables(self, metadata: dict) -> None:
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT, "
+            "UNIQUE (name))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tiles (tile_id INTEGER PRIMARY KEY, "
+            "content_id TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS contents (content_id TEXT PRIMARY KEY, "
+            "tile_data BLOB)"
+        )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO metadata (name, value) VALUES ('json', ?)",
+            (json.dumps(metadata),),
+        )
+
+    def tile_key(self, tz: int, tx: int, ty: int) -> Tuple[int, ...]:
+        # PMTiles uses the XYZ numbering
+        return (pmtiles_tile_id(tz, tx, (1 << tz) - 1 - ty),)
+
+    def insert_tile(self, key: Tuple[int, ...], content: TileContent) -> None:
+        self.insert_shared_tile(
+            key,
+            content,
+            "SELECT tile_data FROM contents WHERE content_id = ?",
+            "INSERT OR IGNORE INTO contents (tile_data, content_id) VALUES (?, ?)",
+            "INSERT OR REPLACE INTO tiles (tile_id, content_id) VALUES (?, ?)",
+        )
+
+    def finalize(self) -> None:
+        self.flush()
+        metadata = json.loads(
+            self.conn.execute(
+                "SELECT value FROM metadata WHERE name = 'json'"
+            ).fetchone()[0]
+        )
+
+        tiles_sql = (
+            "SELECT tile_id, content_id, %s FROM tiles JOIN contents "
+            "USING (content_id) ORDER BY tile_id"
+        )
+
+        # Tile data is written in the order of the first tile using it
+        entries = []
+        content_locations = {}
+        nb_tiles = 0
+        offset = 0
+        for tile_id, content_id, length in self.conn.execute(
+            tiles_sql % "length(tile_data)"
+        ):
+            nb_tiles += 1
+            location = content_locations.get(content_id)
+            if location is None:
+                location = (offset, length)
+                content_locations[content_id] = location
+                offset += length
+            elif entries:
+                last_tile_id, last_offset, _, run_length = entries[-1]
+                if last_offset == location[0] and last_tile_id + run_length == tile_id:
+                    entries[-1] = (last_tile_id, last_offset, length, run_length + 1)
+                    continue
+            entries.append((tile_id, location[0], location[1], 1))
+        tile_data_length = offset
+
+        root, leaves = build_pmtiles_directories(entries)
+        json_metadata = {
+            "name": metadata["title"],
+            "description": metadata["title"],
+            "type": "overlay",
+        }
+        if metadata["copyright"]:
+            json_metadata["attribution"] = metadata["copyright"]
+        json_metadata = gzip.compress(json.dumps(json_metadata).encode("utf-8"))
+
+        south, west, north, east = metadata["swne"]
+        root_offset = 127
+        metadata_offset = root_offset + len(root)
+        leaves_offset = metadata_offset + len(json_metadata)
+        tile_data_offset = leaves_offset + len(leaves)
+        header = struct.pack(
+            "<7sB11Q6B4iBii",
+            b"PMTiles",
+            3,
+            root_offset,
+            len(root),
+            metadata_offset,
+            len(json_metadata),
+            leaves_offset,
+            len(leaves),
+            tile_data_offset,
+            tile_data_length,
+            nb_tiles,  # addressed tiles
+            len(entries),  # tile entries
+            len(content_locations),  # tile contents
+            1,  # clustered
+            2,  # internal compression: gzip
+            1,  # tile compression: none
+            4 if self.tile_job_info.tile_driver == "WEBP" else 2,
+            metadata["tminz"],
+            metadata["tmaxz"],
+            int(round(west * 1e7)),
+            int(round(south * 1e7)),
+            int(round(east * 1e7)),
+            int(round(north * 1e7)),
+            metadata["tminz"],
+            int(round((west + east) / 2 * 1e7)),
+            int(round((south + north) / 2 * 1e7)),
+        )
+
+        with open(self.archive_filename, "wb") as f:
+            f.write(header)
+            f.write(root)
+            f.write(json_metadata)
+            f.write(leaves)
+            written_content_ids = set()
+            for _, content_id, data in self.conn.execute(tiles_sql % "tile_data"):
+                if content_id not in written_content_ids:
+                    written_content_ids.add(content_id)
+                    f.write(data)
+
+        self.conn.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.filename + suffix):
+                os.unlink(self.filename + suffix)
+
+
+def create_tile_sink(tile_job_info: "TileJobInfo"):
+    """Instantiate the tile sink matching the output path"""
+
+    output_format = get_output_format(tile_job_info.output_file_path)
+    if output_format == "MBTiles":
+        return MBTilesTileSink(tile_job_info)
+    if output_format == "GPKG":
+        return GPKGTileSink(tile_job_info)
+    if output_format == "PMTiles":
+        return PMTilesTileSink(tile_job_info)
+    return DirectoryTileSink(tile_job_info)
+
+
+def get_tile_sink(tile_job_info: "TileJobInfo"):
+    """Return the tile sink of the current thread, opening it if needed"""
+
+    sink = getattr(threadLocal, "tile_sink", None)
+    if (
+        sink is None
+        or sink.tile_job_info.output_file_path != tile_job_info.output_file_path
+        or getattr(threadLocal, "tile_sink_pid", None) != os.getpid()
+    ):
+        # Never reuse a connection inherited from the parent process
+        sink = create_tile_sink(tile_job_info)
+        threadLocal.tile_sink = sink
+        threadLocal.tile_sink_pid = os.getpid()
+    return sink
+
+
+def release_tile_sink() -> None:
+    """Commit pending tiles and close the tile sink of the current thread"""
+
+    sink = getattr(threadLocal, "tile_sink", None)
+    if sink is not None and getattr(threadLocal, "tile_sink_pid", None) == os.getpid():
+        sink.close()
+    threadLocal.tile_sink = None
+
+
+def finalize_tile_sink(tile_job_info: "TileJobInfo") -> None:
+    """Complete the output once all tiles have been generated"""
+
+    get_tile_sink(tile_job_info).finalize()
+    threadLocal.tile_sink = None
+
+
+def get_source_dataset(tile_job_info: "TileJobInfo") -> gdal.Dataset:
+    """Return the source dataset, opened once per thread"""
+
+    cached_ds = getattr(threadLocal, "cached_ds", None)
+    if cached_ds and cached_ds.GetDescription() == tile_job_info.src_file:
+        return cached_ds
+    ds = gdal.Open(tile_job_info.src_file, gdal.GA_ReadOnly)
+    threadLocal.cached_ds = ds
+    return ds
+
+
+class MetaTile(object):
+    """
+    Pixels of the source dataset covering a block of adjacent base tiles, read
+    with a single ReadRaster() call (and a single warping of the source when it
+    is a warped VRT).
+
+    The windows of the individual tiles are then read from the in-memory copy,
+    exactly as they would have been from the source dataset.
+    """
+
+    def __init__(self, ds: gdal.Dataset, tile_details: List["TileDetail"]) -> None:
+        self.data_ds = None
+        self.alpha_ds = None
+        self.xoff = self.yoff = 0
+
+        windows = [
+            (t.rx, t.ry, t.rx + t.rxsize, t.ry + t.rysize)
+            for t in tile_details
+            if t.rxsize != 0 and t.rysize != 0 and t.wxsize != 0 and t.wysize != 0
+        ]
+        if not windows:
+            return
+
+        self.xoff = min(w[0] for w in windows)
+        self.yoff = min(w[1] for w in windows)
+        xsize = max(w[2] for w in windows) - self.xoff
+        ysize = max(w[3] for w in windows) - self.yoff
+        nb_data_bands = ds.RasterCount
+
+        mem_drv = gdal.GetDriverByName("MEM")
+        self.data_ds = mem_drv.Create(
+            "",
+            xsize,
+            ysize,
+            nb_data_bands,
+            ds.GetRasterBand(1).DataType,
+        )
+        self.data_ds.WriteRaster(
+            0,
+            0,
+            xsize,
+            ysize,
+            ds.ReadRaster(self.xoff, self.yoff, xsize, ysize),
+        )
+        self.alpha_ds = mem_drv.Create("", xsize, ysize, 1)
+        self.alpha_ds.WriteRaster(
+            0,
+            0,
+            xsize,
+            ysize,
+            ds.GetRasterBand(1)
+            .GetMaskBand()
+            .ReadRaster(self.xoff, self.yoff, xsize, ysize),
+        )
+
+
+def create_base_tile(
+    tile_job_info: "TileJobInfo",
+    tile_detail: "TileDetail",
+    keep_in_memory=False,
+    metatile: Optional[MetaTile] = None,
+) -> Optional[gdal.Dataset]:
+    """
+    Generate a tile of the base zoom level from the input raster.
+
+    If keep_in_memory is set, the in-memory tile dataset is returned (or None if
+    the tile was skipped), so that it can be reused to build overview tiles.
+    If metatile is set, the pixels of the tile are read from it instead of the
+    source dataset.
+    """
 
     dataBandsCount = tile_job_info.nb_data_bands
     output = tile_job_info.output_file_path
-    tileext = tile_job_info.tile_extension
     tile_size = tile_job_info.tile_size
     options = tile_job_info.options
 
     tilebands = dataBandsCount + 1
 
-    cached_ds = getattr(threadLocal, "cached_ds", None)
-    if cached_ds and cached_ds.GetDescription() == tile_job_info.src_file:
-        ds = cached_ds
-    else:
-        ds = gdal.Open(tile_job_info.src_file, gdal.GA_ReadOnly)
-        threadLocal.cached_ds = ds
-
     mem_drv = gdal.GetDriverByName("MEM")
-    out_drv = gdal.GetDriverByName(tile_job_info.tile_driver)
-    alphaband = ds.GetRasterBand(1).GetMaskBand()
+    sink = get_tile_sink(tile_job_info)
 
     tx = tile_detail.tx
     ty = tile_detail.ty
@@ -1330,7 +2699,8 @@ def create_base_tile(tile_job_info: "TileJobInfo", tile_detail: "TileDetail") ->
     querysize = tile_detail.querysize
 
     # Tile dataset in memory
-    tilefilename = os.path.join(output, str(tz), str(tx), "%s.%s" % (ty, tileext))
+    tms_ty = GDAL2Tiles.getYTile(ty, tz, options)
+    tilefilename = sink.tile_filename(tz, tx, tms_ty)
     dstile = mem_drv.Create("", tile_size, tile_size, tilebands)
 
     data = alpha = None
@@ -1344,23 +2714,36 @@ def create_base_tile(tile_job_info: "TileJobInfo", tile_detail: "TileDetail") ->
     # We scale down the query to the tile_size by supplied algorithm.
 
     if rxsize != 0 and rysize != 0 and wxsize != 0 and wysize != 0:
-        alpha = alphaband.ReadRaster(rx, ry, rxsize, rysize, wxsize, wysize)
+        if metatile is not None:
+            ds = metatile.data_ds
+            alphaband = metatile.alpha_ds.GetRasterBand(1)
+            rx -= metatile.xoff
+            ry -= metatile.yoff
+        else:
+            ds = get_source_dataset(tile_job_info)
+            alphaband = ds.GetRasterBand(1).GetMaskBand()
 
-        # Detect totally transparent tile and skip its creation
-        if tile_job_info.exclude_transparent and len(alpha) == alpha.count(
-            "\x00".encode("ascii")
-        ):
-            return
+        with profile_stage(options, "read"):
+            alpha = alphaband.ReadRaster(rx, ry, rxsize, rysize, wxsize, wysize)
 
-        data = ds.ReadRaster(
-            rx,
-            ry,
-            rxsize,
-            rysize,
-            wxsize,
-            wysize,
-            band_list=list(range(1, dataBandsCount + 1)),
-        )
+        # Detect totally transparent tile and skip its creation
+        if tile_job_info.exclude_transparent and is_transparent(alpha):
+            if is_incremental_update(options):
+                # Do not leave the content of the tile before the update
+                sink.delete_tile(tz, tx, tms_ty)
+            profile_count(options, "skipped_transparent")
+            return None
+
+        with profile_stage(options, "read"):
+            data = ds.ReadRaster(
+                rx,
+                ry,
+                rxsize,
+                rysize,
+                wxsize,
+                wysize,
+                band_list=list(range(1, dataBandsCount + 1)),
+            )
 
     # The tile in memory is a transparent file by default. Write pixel values into it if
     # any
@@ -1397,18 +2780,15 @@ def create_base_tile(tile_job_info: "TileJobInfo", tile_detail: "TileDetail") ->
             )
             dsquery.WriteRaster(wx, wy, wxsize, wysize, alpha, band_list=[tilebands])
 
-            scale_query_to_tile(dsquery, dstile, options, tilefilename=tilefilename)
+            with profile_stage(options, "resample"):
+                scale_query_to_tile(dsquery, dstile, options, tilefilename=tilefilename)
             del dsquery
 
     del data
 
-    if options.resampling != "antialias":
-        # Write a copy of tile to png/jpg
-        out_drv.CreateCopy(
-            tilefilename, dstile, strict=0, options=_get_creation_options(options)
-        )
-
-    del dstile
+    # Write a copy of tile to png/jpg
+    with profile_stage(options, "write"):
+        sink.write_tile(tz, tx, tms_ty, dstile)
 
     # Create a KML file for this tile.
     if tile_job_info.kml:
@@ -1434,6 +2814,41 @@ def create_base_tile(tile_job_info: "TileJobInfo", tile_detail: "TileDetail") ->
                         ).encode("utf-8")
                     )
 
+    if keep_in_memory:
+        return dstile
+    return None
+
+
+def read_tile_from_disk(
+    tilefilename: str, tile_job_info: "TileJobInfo"
+) -> Optional[gdal.Dataset]:
+    """Open an already generated tile, adding an opaque alpha band if it is missing"""
+
+    if not isfile(tilefilename):
+        return None
+
+    tilebands = tile_job_info.nb_data_bands + 1
+    dsquerytile = gdal.Open(tilefilename, gdal.GA_ReadOnly)
+
+    if dsquerytile.RasterCount == tilebands - 1:
+        # assume that the alpha band is missing and add it
+        tmp_ds = gdal.GetDriverByName("MEM").CreateCopy("", dsquerytile, 0)
+        tmp_ds.AddBand()
+        mask = bytearray([255] * (tile_job_info.tile_size * tile_job_info.tile_size))
+        tmp_ds.WriteRaster(
+            0,
+            0,
+            tile_job_info.tile_size,
+            tile_job_info.tile_size,
+            mask,
+            band_list=[tilebands],
+        )
+        dsquerytile = tmp_ds
+    elif dsquerytile.RasterCount != tilebands:
+        raise Exception("Unexpected number of bands in base tile")
+
+    return dsquerytile
+
 
 def create_overview_tile(
     base_tz: int,
@@ -1447,24 +2862,60 @@ def create_overview_tile(
     overview_tz = base_tz - 1
     overview_tx = base_tiles[0][0] >> 1
     overview_ty = base_tiles[0][1] >> 1
-    overview_ty_real = GDAL2Tiles.getYTile(overview_ty, overview_tz, options)
+    sink = get_tile_sink(tile_job_info)
 
-    tilefilename = os.path.join(
-        output_folder,
-        str(overview_tz),
-        str(overview_tx),
-        "%s.%s" % (overview_ty_real, tile_job_info.tile_extension),
-    )
     if options.verbose:
-        print(tilefilename)
-    if options.resume and isfile(tilefilename):
+        print(sink.tile_filename(overview_tz, overview_tx, overview_ty))
+    if options.resume and sink.tile_exists(overview_tz, overview_tx, overview_ty):
         if options.verbose:
             print("Tile generation skipped because of --resume")
+        profile_count(options, "skipped_resume")
         return
 
+    base_tile_datasets = []
+    with profile_stage(options, "overview"):
+        for base_tile in base_tiles:
+            dsquerytile = sink.read_tile(base_tz, base_tile[0], base_tile[1])
+            if dsquerytile is not None:
+                base_tile_datasets.append((base_tile, dsquerytile))
+
+    compose_overview_tile(
+        base_tz, base_tiles, base_tile_datasets, output_folder, tile_job_info, options
+    )
+
+
+def compose_overview_tile(
+    base_tz: int,
+    base_tiles: List[Tuple[int, int]],
+    base_tile_datasets: List[Tuple[Tuple[int, int], gdal.Dataset]],
+    output_folder: str,
+    tile_job_info: "TileJobInfo",
+    options: Options,
+) -> Optional[gdal.Dataset]:
+    """
+    Scale down the available underlying tiles into their overview tile and write it.
+
+    base_tiles lists all the underlying tiles (used for the KML links), and
+    base_tile_datasets the ones that actually exist, with their pixel content.
+    Returns the in-memory overview tile, or None if there was nothing to build
+    it from.
+    """
+
+    overview_tz = base_tz - 1
+    overview_tx = base_tiles[0][0] >> 1
+    overview_ty = base_tiles[0][1] >> 1
+    overview_ty_real = GDAL2Tiles.getYTile(overview_ty, overview_tz, options)
+
+    sink = get_tile_sink(tile_job_info)
+    tilefilename = sink.tile_filename(overview_tz, overview_tx, overview_ty)
+
+    if not base_tile_datasets:
+        if is_incremental_update(options):
+            # All the underlying tiles became transparent with the update
+            sink.delete_tile(overview_tz, overview_tx, overview_ty)
+        return None
+
     mem_driver = gdal.GetDriverByName("MEM")
-    tile_driver = tile_job_info.tile_driver
-    out_driver = gdal.GetDriverByName(tile_driver)
 
     tilebands = tile_job_info.nb_data_bands + 1
 
@@ -1476,88 +2927,45 @@ def create_overview_tile(
         "", tile_job_info.tile_size, tile_job_info.tile_size, tilebands
     )
 
-    usable_base_tiles = []
-
-    for base_tile in base_tiles:
-        base_tx = base_tile[0]
-        base_ty = base_tile[1]
-        base_ty_real = GDAL2Tiles.getYTile(base_ty, base_tz, options)
-
-        base_tile_path = os.path.join(
-            output_folder,
-            str(base_tz),
-            str(base_tx),
-            "%s.%s" % (base_ty_real, tile_job_info.tile_extension),
-        )
-        if not isfile(base_tile_path):
-            continue
+    with profile_stage(options, "overview"):
+        for base_tile, dsquerytile in base_tile_datasets:
+            base_tx = base_tile[0]
+            base_ty = base_tile[1]
 
-        dsquerytile = gdal.Open(base_tile_path, gdal.GA_ReadOnly)
-
-        if base_tx % 2 == 0:
-            tileposx = 0
-        else:
-            tileposx = tile_job_info.tile_size
-
-        if options.xyz and options.profile == "raster":
-            if base_ty % 2 == 0:
-                tileposy = 0
+            if base_tx % 2 == 0:
+                tileposx = 0
             else:
-                tileposy = tile_job_info.tile_size
-        else:
-            if base_ty % 2 == 0:
-                tileposy = tile_job_info.tile_size
+                tileposx = tile_job_info.tile_size
+
+            if options.xyz and options.profile == "raster":
+                if base_ty % 2 == 0:
+                    tileposy = 0
+                else:
+                    tileposy = tile_job_info.tile_size
             else:
-                tileposy = 0
-
-        if dsquerytile.RasterCount == tilebands - 1:
-            # assume that the alpha band is missing and add it
-            tmp_ds = mem_driver.CreateCopy("", dsquerytile, 0)
-            tmp_ds.AddBand()
-            mask = bytearray(
-                [255] * (tile_job_info.tile_size * tile_job_info.tile_size)
+                if base_ty % 2 == 0:
+                    tileposy = tile_job_info.tile_size
+                else:
+                    tileposy = 0
+
+            base_data = dsquerytile.ReadRaster(
+                0, 0, tile_job_info.tile_size, tile_job_info.tile_size
             )
-            tmp_ds.WriteRaster(
-                0,
-                0,
+
+            dsquery.WriteRaster(
+                tileposx,
+                tileposy,
                 tile_job_info.tile_size,
                 tile_job_info.tile_size,
-                mask,
-                band_list=[tilebands],
+                base_data,
+                band_list=list(range(1, tilebands + 1)),
             )
-            dsquerytile = tmp_ds
-        elif dsquerytile.RasterCount != tilebands:
-            raise Exception("Unexpected number of bands in base tile")
-
-        base_data = dsquerytile.ReadRaster(
-            0, 0, tile_job_info.tile_size, tile_job_info.tile_size
-        )
 
-        dsquery.WriteRaster(
-            tileposx,
-            tileposy,
-            tile_job_info.tile_size,
-            tile_job_info.tile_size,
-            base_data,
-            band_list=list(range(1, tilebands + 1)),
-        )
-
-        usable_base_tiles.append(base_tile)
-
-    if not usable_base_tiles:
-        return
-
-    scale_query_to_tile(dsquery, dstile, options, tilefilename=tilefilename)
+    with profile_stage(options, "resample"):
+        scale_query_to_tile(dsquery, dstile, options, tilefilename=tilefilename)
     # Write a copy of tile to png/jpg
-    if options.resampling != "antialias":
-        # Write a copy of tile to png/jpg
-        out_driver.CreateCopy(
-            tilefilename, dstile, strict=0, options=_get_creation_options(options)
-        )
-        # Remove useless side car file
-        aux_xml = tilefilename + ".aux.xml"
-        if gdal.VSIStatL(aux_xml) is not None:
-            gdal.Unlink(aux_xml)
+    with profile_stage(options, "write"):
+        sink.write_tile(overview_tz, overview_tx, overview_ty, dstile)
 
     if options.verbose:
         print("\tbuild from zoom", base_tz, " tiles:", *base_tiles)
@@ -1586,6 +2994,319 @@ def create_overview_tile(
                     ).encode("utf-8")
                 )
 
+    return dstile
+
+
+def create_pyramid_tile(
+    tz: int,
+    tx: int,
+    ty: int,
+    leaf_tz: int,
+    get_leaf_tile: Callable[[int, int], Optional[gdal.Dataset]],
+    output_folder: str,
+    tile_job_info: "TileJobInfo",
+    options: Options,
+    in_memory: bool = True,
+    dirty_tiles: Optional[Set[Tuple[int, int, int]]] = None,
+    log_progress: Optional[Callable[[], None]] = None,
+) -> Optional[gdal.Dataset]:
+    """
+    Generate the (tx, ty, tz) tile and, recursively, all the tiles under it down
+    to the leaf_tz zoom level, whose tiles are provided by get_leaf_tile().
+
+    The tiles are visited depth-first, that is in Z-order, so that neighbouring
+    tiles are generated together. If in_memory is set, overview tiles are
+    composed from the in-memory children instead of re-opening the encoded
+    tiles from disk, so that each pixel is only encoded once and lossy formats
+    do not accumulate artifacts along the pyramid.
+    At most 4 tiles per zoom level are kept alive at any given time.
+    If dirty_tiles is set (incremental update), the tiles that are not in it are
+    left untouched and read from the existing output.
+    log_progress, if set, is called after each overview tile is composed.
+    Returns the tile, or None if it could not be generated.
+    """
+
+    sink = get_tile_sink(tile_job_info)
+    if dirty_tiles is not None and (tz, tx, ty) not in dirty_tiles:
+        profile_count(options, "skipped_unchanged")
+        return sink.read_tile(tz, tx, ty)
+
+    if tz == leaf_tz:
+        return get_leaf_tile(tx, ty)
+
+    if options.resume and sink.tile_exists(tz, tx, ty):
+        # The tiles under it have been generated before this one
+        if options.verbose:
+            print("Tile generation skipped because of --resume")
+        profile_count(options, "skipped_resume")
+        return sink.read_tile(tz, tx, ty)
+
+    base_tz = tz + 1
+    tminx, tminy, tmaxx, tmaxy = tile_job_info.tminmax[base_tz]
+    base_tiles = [
+        (base_tx, base_ty)
+        for base_ty in (2 * ty + 1, 2 * ty)
+        for base_tx in (2 * tx, 2 * tx + 1)
+        if tminx <= base_tx <= tmaxx and tminy <= base_ty <= tmaxy
+    ]
+    if not base_tiles:
+        return None
+
+    base_tile_datasets = []
+    for base_tile in base_tiles:
+        dsquerytile = create_pyramid_tile(
+            base_tz,
+            base_tile[0],
+            base_tile[1],
+            leaf_tz,
+            get_leaf_tile,
+            output_folder,
+            tile_job_info,
+            options,
+            in_memory,
+            dirty_tiles,
+            log_progress,
+        )
+        if dsquerytile is not None:
+            base_tile_datasets.append((base_tile, dsquerytile))
+
+    if options.verbose:
+        print(sink.tile_filename(tz, tx, ty) or (tz, tx, ty))
+    dstile = compose_overview_tile(
+        base_tz, base_tiles, base_tile_datasets, output_folder, tile_job_info, options
+    )
+    if log_progress is not None:
+        log_progress()
+    if dstile is None or in_memory:
+        return dstile
+    return sink.read_tile(tz, tx, ty)
+
+
+def create_sub_pyramid(
+    tile_job_info: "TileJobInfo",
+    sub_pyramid: Tuple[int, int, int, "TileDetails"],
+    log_progress: Optional[Callable[[], None]] = None,
+) -> Tuple[int, int, Optional[bytes], int, Dict[str, Dict[str, Any]]]:
+    """
+    Generate the base tiles of a sub-pyramid and all its overview tiles up to its
+    root tile.
+
+    sub_pyramid is a (tz, tx, ty, tile_details) tuple, where tile_details are the
+    base tiles under the (tx, ty, tz) root tile. Base tiles for which there is no
+    tile detail (skipped by --resume, or not affected by an incremental update)
+    are read back from disk.
+    log_progress, if set, is called after each base tile is generated (when the
+    sub-pyramid is processed in the process which displays the progress).
+    Returns the root tile coordinates, in --in-memory-pyramid mode its pixel
+    content (so that the upper zoom levels can be built from it) or None, the
+    number of base tiles generated, and the statistics of the sub-pyramid (tile
+    encoders and --profile-report).
+    """
+
+    tz, tx, ty, tile_details = sub_pyramid
+    options = tile_job_info.options
+    output_folder = tile_job_info.output_file_path
+    in_memory = options.in_memory_pyramid
+
+    tile_details_index = TileDetailsIndex(tile_details, options)
+
+    dirty_tiles = None
+    if is_incremental_update(options):
+        dirty_tiles = get_dirty_tiles(tile_job_info.tmaxz, list(tile_details_index), tz)
+
+    # Base tiles are visited in Z-order, so all the tiles of a metatile are
+    # generated one after the other
+    metatile_shift = (options.metatile or 1).bit_length() - 1
+    current_metatile = [None, None]
+    nb_base_tiles = [0]
+
+    def get_metatile(base_tx, base_ty):
+        key = (base_tx >> metatile_shift, base_ty >> metatile_shift)
+        if current_metatile[0] != key:
+            metatile_details = [
+                tile_details_index.get(x, y)
+                for x in range(key[0] << metatile_shift, (key[0] + 1) << metatile_shift)
+                for y in range(key[1] << metatile_shift, (key[1] + 1) << metatile_shift)
+                if (x, y) in tile_details_index
+            ]
+            current_metatile[0] = key
+            with profile_stage(options, "read"):
+                current_metatile[1] = MetaTile(
+                    get_source_dataset(tile_job_info), metatile_details
+                )
+        return current_metatile[1]
+
+    def get_base_tile(base_tx, base_ty):
+        tile_detail = tile_details_index.get(base_tx, base_ty)
+        if tile_detail is not None:
+            dstile = create_base_tile(
+                tile_job_info,
+                tile_detail,
+                keep_in_memory=in_memory,
+                metatile=get_metatile(base_tx, base_ty) if metatile_shift else None,
+            )
+            nb_base_tiles[0] += 1
+            if log_progress is not None:
+                log_progress()
+            if in_memory:
+                return dstile
+        return get_tile_sink(tile_job_info).read_tile(
+            tile_job_info.tmaxz, base_tx, base_ty
+        )
+
+    dstile = create_pyramid_tile(
+        tz,
+        tx,
+        ty,
+        tile_job_info.tmaxz,
+        get_base_tile,
+        output_folder,
+        tile_job_info,
+        options,
+        in_memory,
+        dirty_tiles,
+    )
+    # Commit the tiles, and do not keep the output open between sub-pyramids
+    release_tile_sink()
+
+    data = None
+    if dstile is not None and in_memory:
+        data = dstile.ReadRaster(0, 0, tile_job_info.tile_size, tile_job_info.tile_size)
+    return tx, ty, data, nb_base_tiles[0], pop_worker_stats(options)
+
+
+def get_sub_pyramid_zoom(tile_job_info: "TileJobInfo", nb_processes: int) -> int:
+    """
+    Zoom level of the root tiles of the sub-pyramids processed independently:
+    the lowest zoom level with enough tiles to keep all processes busy.
+    """
+
+    for tz in range(tile_job_info.tminz, tile_job_info.tmaxz + 1):
+        tminx, tminy, tmaxx, tmaxy = tile_job_info.tminmax[tz]
+        if (1 + tmaxx - tminx) * (1 + tmaxy - tminy) >= 4 * nb_processes:
+            return tz
+    return tile_job_info.tmaxz
+
+
+def morton_code(tx: int, ty: int) -> int:
+    """Position of the (tx, ty) tile along the Z-order curve"""
+
+    code = 0
+    bit = 0
+    while (tx >> bit) or (ty >> bit):
+        code |= ((tx >> bit) & 1) << (2 * bit)
+        code |= ((ty >> bit) & 1) << (2 * bit + 1)
+        bit += 1
+    return code
+
+
+def group_sub_pyramids(
+    tile_job_info: "TileJobInfo",
+    tile_rows: Iterable["TileDetails"],
+    sub_pyramid_tz: int,
+) -> List[Tuple[int, int, int, "TileDetails"]]:
+    """
+    Group base tiles that belong to the same sub-pyramid rooted at sub_pyramid_tz.
+
+    tile_rows yields the details of the base tiles one row at a time (see
+    GDAL2Tiles.iter_base_tile_details()), each row being dispatched to the
+    sub-pyramids as soon as it is computed.
+    Sub-pyramids are returned in Z-order, so that the ones processed at the same
+    time read neighbouring windows of the source dataset.
+    """
+
+    options = tile_job_info.options
+    shift = tile_job_info.tmaxz - sub_pyramid_tz
+
+    root_to_bases = {}
+    tminx, tminy, tmaxx, tmaxy = tile_job_info.tminmax[sub_pyramid_tz]
+    for ty in range(tmaxy, tminy - 1, -1):
+        for tx in range(tminx, tmaxx + 1):
+            root_to_bases[(tx, ty)] = TileDetails()
+
+    for row_tile_details in tile_rows:
+        for i, (tx, ty, tz) in enumerate(row_tile_details.iter_coordinates()):
+            ty = GDAL2Tiles.getYTile(ty, tz, options)
+            root_to_bases[(tx >> shift, ty >> shift)].append_from(row_tile_details, i)
+
+    # Create directories for the overview tiles
+    sink = get_tile_sink(tile_job_info)
+    for tz in range(tile_job_info.tminz, tile_job_info.tmaxz):
+        tminx, _, tmaxx, _ = tile_job_info.tminmax[tz]
+        sink.make_tile_dirs(tz, tminx, tmaxx)
+
+    return [
+        (sub_pyramid_tz, tx, ty, root_to_bases[(tx, ty)])
+        for tx, ty in sorted(root_to_bases, key=lambda t: morton_code(*t))
+    ]
+
+
+def create_top_pyramid(
+    tile_job_info: "TileJobInfo",
+    sub_pyramid_tz: int,
+    root_tiles: Dict[Tuple[int, int], Optional[bytes]],
+) -> None:
+    """
+    Generate the overview tiles above the roots of the sub-pyramids.
+
+    In --in-memory-pyramid mode, the root tiles are taken from root_tiles,
+    otherwise they are read back from disk. In an incremental update, only the
+    ancestors of the regenerated root tiles (the keys of root_tiles) are updated.
+    """
+
+    if sub_pyramid_tz == tile_job_info.tminz:
+        return
+
+    options = tile_job_info.options
+    output_folder = tile_job_info.output_file_path
+    tile_size = tile_job_info.tile_size
+    tilebands = tile_job_info.nb_data_bands + 1
+    mem_driver = gdal.GetDriverByName("MEM")
+
+    def get_root_tile(tx, ty):
+        if not options.in_memory_pyramid:
+            return get_tile_sink(tile_job_info).read_tile(sub_pyramid_tz, tx, ty)
+        data = root_tiles.get((tx, ty))
+        if data is None:
+            return None
+        ds = mem_driver.Create("", tile_size, tile_size, tilebands)
+        ds.WriteRaster(0, 0, tile_size, tile_size, data)
+        return ds
+
+    dirty_tiles = None
+    if is_incremental_update(options):
+        dirty_tiles = get_dirty_tiles(
+            sub_pyramid_tz, list(root_tiles), tile_job_info.tminz
+        )
+        tile_number = sum(1 for tile in dirty_tiles if tile[0] < sub_pyramid_tz)
+    else:
+        tile_number = count_overview_tiles(tile_job_info, sub_pyramid_tz)
+
+    log_progress = None
+    if not options.quiet and tile_number:
+        print("Generating Overview Tiles:")
+        if not options.verbose:
+            progress_bar = ProgressBar(tile_number)
+            progress_bar.start()
+            log_progress = progress_bar.log_progress
+
+    tminx, tminy, tmaxx, tmaxy = tile_job_info.tminmax[tile_job_info.tminz]
+    for ty in range(tmaxy, tminy - 1, -1):
+        for tx in range(tminx, tmaxx + 1):
+            create_pyramid_tile(
+                tile_job_info.tminz,
+                tx,
+                ty,
+                sub_pyramid_tz,
+                get_root_tile,
+                output_folder,
+                tile_job_info,
+                options,
+                options.in_memory_pyramid,
+                dirty_tiles,
+                log_progress,
+            )
+
 
 def group_overview_base_tiles(
     base_tz: int, output_folder: str, tile_job_info: "TileJobInfo"
@@ -1607,18 +3328,40 @@ def group_overview_base_tiles(
             overview_to_bases[overview_tile].append(base_tile)
 
     # Create directories for the tiles
-    overview_tz = base_tz - 1
-    for tx in range(tminx, tmaxx + 1):
-        overview_tx = tx >> 1
-        tiledirname = os.path.join(output_folder, str(overview_tz), str(overview_tx))
-        makedirs(tiledirname)
+    get_tile_sink(tile_job_info).make_tile_dirs(base_tz - 1, tminx >> 1, tmaxx >> 1)
+
+    return list(overview_to_bases.values())
+
+
+def is_incremental_update(options: Options) -> bool:
+    """Whether only the tiles affected by --update-extent/--changed-files are generated"""
+    return bool(options.update_extent or options.changed_files)
+
+
+def get_dirty_tiles(
+    tz: int, tiles: List[Tuple[int, int]], top_tz: int
+) -> Set[Tuple[int, int, int]]:
+    """
+    Return the (tz, tx, ty) tiles to regenerate in an incremental update: the
+    tiles of the tz zoom level, and all their ancestors down to top_tz
+    """
 
-    return list(overview_to_bases.values())
+    dirty_tiles = set()
+    while tz >= top_tz and tiles:
+        dirty_tiles.update((tz, tx, ty) for tx, ty in tiles)
+        tiles = {(tx >> 1, ty >> 1) for tx, ty in tiles}
+        tz -= 1
+    return dirty_tiles
 
 
-def count_overview_tiles(tile_job_info: "TileJobInfo") -> int:
+def count_overview_tiles(
+    tile_job_info: "TileJobInfo", base_tz: Optional[int] = None
+) -> int:
+    """Number of tiles of the zoom levels above base_tz (by default, tmaxz)"""
+    if base_tz is None:
+        base_tz = tile_job_info.tmaxz
     tile_number = 0
-    for tz in range(tile_job_info.tmaxz - 1, tile_job_info.tminz - 1, -1):
+    for tz in range(base_tz - 1, tile_job_info.tminz - 1, -1):
         tminx, tminy, tmaxx, tmaxy = tile_job_info.tminmax[tz]
         tile_number += (1 + abs(tmaxx - tminx)) * (1 + abs(tmaxy - tminy))
 
@@ -1669,6 +3412,20 @@ def optparse_init() -> optparse.OptionParser:
         action="store_true",
         help="Resume mode. Generate only missing files.",
     )
+    p.add_option(
+        "--update-extent",
+        dest="update_extent",
+        metavar="MINX,MINY,MAXX,MAXY",
+        help="Update an existing tileset: regenerate only the tiles intersecting "
+        "this extent, expressed in the SRS of the input file",
+    )
+    p.add_option(
+        "--changed-files",
+        dest="changed_files",
+        metavar="FILE",
+        help="Update an existing tileset: regenerate only the tiles intersecting "
+        "the footprint of the rasters listed in FILE (one per line)",
+    )
     p.add_option(
         "-a",
         "--srcnodata",
@@ -1719,6 +3476,12 @@ def optparse_init() -> optparse.OptionParser:
         type="int",
         help="Number of processes to use for tiling",
     )
+    p.add_option(
+        "--threads",
+        dest="nb_threads",
+        type="int",
+        help="Number of threads to use for tiling, in a single process",
+    )
     p.add_option(
         "--mpi",
         action="store_true",
@@ -1726,6 +3489,44 @@ def optparse_init() -> optparse.OptionParser:
         help="Assume launched by mpiexec and ignore --processes. "
         "User should set GDAL_CACHEMAX to size per process.",
     )
+    p.add_option(
+        "--in-memory-pyramid",
+        action="store_true",
+        dest="in_memory_pyramid",
+        help="Build overview tiles from the in-memory base tiles, instead of "
+        "decoding them back from disk",
+    )
+    p.add_option(
+        "--deduplicate-tiles",
+        action="store_true",
+        dest="deduplicate_tiles",
+        help="Store tiles with identical content once: as hard links in "
+        "directory output, as shared images in MBTiles output",
+    )
+    p.add_option(
+        "--metatile",
+        dest="metatile",
+        metavar="N",
+        type="int",
+        help="Read the source pixels of blocks of NxN base tiles at once "
+        "(N being a power of 2)",
+    )
+    p.add_option(
+        "--encoder",
+        dest="encoder",
+        type="choice",
+        choices=tuple(tile_encoders),
+        help="Library used to encode the tiles (%s) - default 'gdal'"
+        % ",".join(tile_encoders),
+    )
+    p.add_option(
+        "--profile-report",
+        dest="profile_report",
+        metavar="FILE",
+        help="Write the time spent in each stage of the tile generation, the "
+        "bytes written and the skipped tiles, summed over all workers, into a "
+        "JSON file",
+    )
     p.add_option(
         "--tilesize",
         dest="tilesize",
@@ -1844,6 +3645,9 @@ def optparse_init() -> optparse.OptionParser:
         copyright="",
         resampling="average",
         resume=False,
+        in_memory_pyramid=False,
+        deduplicate_tiles=False,
+        encoder="gdal",
         googlekey="INSERT_YOUR_KEY_HERE",
         bingkey="INSERT_YOUR_KEY_HERE",
         processes=1,
@@ -1919,6 +3723,21 @@ def options_post_processing(
             tmaxz = tminz
     options.zoom = [tminz, tmaxz]
 
+    if options.update_extent:
+        try:
+            options.update_extent = [float(v) for v in options.update_extent.split(",")]
+        except ValueError:
+            options.update_extent = []
+        if len(options.update_extent) != 4:
+            exit_with_error("--update-extent must be MINX,MINY,MAXX,MAXY")
+    if is_incremental_update(options):
+        if not os.path.exists(output_folder) or output_folder.startswith("/vsi"):
+            exit_with_error(
+                "--update-extent and --changed-files require an existing output"
+            )
+        if options.changed_files and not os.path.isfile(options.changed_files):
+            exit_with_error("Cannot find %s" % options.changed_files)
+
     if options.url and not options.url.endswith("/"):
         options.url += "/"
     if options.url:
@@ -1934,6 +3753,12 @@ def options_post_processing(
             "Install PIL (Python Imaging Library) and numpy.",
         )
 
+    if options.encoder == "pillow" and not numpy_available:
+        exit_with_error(
+            "'pillow' tile encoder is not available.",
+            "Install PIL (Python Imaging Library) and numpy.",
+        )
+
     try:
         os.path.basename(input_file).encode("ascii")
     except UnicodeEncodeError:
@@ -1952,6 +3777,32 @@ def options_post_processing(
                 "leaflet files might contain some invalid characters as a result\n"
             )
 
+    if options.metatile is not None and (
+        options.metatile < 1 or options.metatile & (options.metatile - 1)
+    ):
+        exit_with_error("--metatile must be a power of 2")
+
+    if options.nb_threads is not None:
+        if options.nb_threads < 1:
+            exit_with_error("--threads must be at least 1")
+        if options.mpi or (options.nb_processes or 1) > 1:
+            exit_with_error("--threads cannot be combined with --processes or --mpi")
+
+    output_format = get_output_format(output_folder)
+    if output_format != "directory":
+        if output_folder.startswith("/vsi"):
+            exit_with_error(
+                "%s output is not supported on /vsi file systems" % output_format
+            )
+        if output_format in ("MBTiles", "PMTiles") and options.profile != "mercator":
+            exit_with_error("%s output requires the 'mercator' profile" % output_format)
+        if output_format == "GPKG" and options.profile not in ("mercator", "geodetic"):
+            exit_with_error("GPKG output requires the 'mercator' or 'geodetic' profile")
+        if options.kml:
+            exit_with_error(
+                "KML generation is not supported with %s output" % output_format
+            )
+
     if options.tiledriver == "WEBP":
         if gdal.GetDriverByName(options.tiledriver) is None:
             exit_with_error("WEBP driver is not available")
@@ -1972,24 +3823,37 @@ def options_post_processing(
     return options
 
 
+def clip_query_array(r, rsize, wsize, raster_size):
+    """
+    Clip ReadRaster() windows along one axis (numpy arrays of offsets and sizes)
+    to the raster, adjusting the windows in the tile accordingly. Vectorized
+    version of the clipping done by GDAL2Tiles.geo_query()
+    """
+    outside = r < 0
+    shift_ratio = numpy.where(outside, -r / rsize, 0.0)
+    w = numpy.where(outside, numpy.trunc(wsize * shift_ratio), 0).astype(numpy.int64)
+    wsize = wsize - w
+    rsize = numpy.where(
+        outside, rsize - numpy.trunc(rsize * shift_ratio).astype(numpy.int64), rsize
+    )
+    r = numpy.where(outside, 0, r)
+
+    beyond = r + rsize > raster_size
+    # rsize can be 0 outside of "beyond", where the division result is not used
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        wsize = numpy.where(
+            beyond, numpy.trunc(wsize * ((raster_size - r) / rsize)), wsize
+        ).astype(numpy.int64)
+    rsize = numpy.where(beyond, raster_size - r, rsize)
+    return r, rsize, w, wsize
+
+
 class TileDetail(object):
-    tx = 0
-    ty = 0
-    tz = 0
-    rx = 0
-    ry = 0
-    rxsize = 0
-    rysize = 0
-    wx = 0
-    wy = 0
-    wxsize = 0
-    wysize = 0
-    querysize = 0
+    __slots__ = tile_detail_fields
 
     def __init__(self, **kwargs):
-        for key in kwargs:
-            if hasattr(self, key):
-                setattr(self, key, kwargs[key])
+        for key in self.__slots__:
+            setattr(self, key, kwargs.get(key, 0))
 
     def __unicode__(self):
         return "TileDetail %s\n%s\n%s\n" % (self.tx, self.ty, self.tz)
@@ -2001,6 +3865,146 @@ class TileDetail(object):
         return "TileDetail %s\n%s\n%s\n" % (self.tx, self.ty, self.tz)
 
 
+class TileDetails(object):
+    """
+    Compact list of TileDetail: the fields of the tiles are stored as consecutive
+    integers in an array, and TileDetail objects are only created on iteration
+    """
+
+    nb_fields = len(tile_detail_fields)
+
+    def __init__(self) -> None:
+        self.values = array.array("q")
+
+    @staticmethod
+    def from_columns(**columns) -> "TileDetails":
+        """
+        Create from numpy arrays (or scalars, broadcast) of the fields of
+        TileDetail, one item per tile
+        """
+        nb_tiles = len(columns["tx"])
+        table = numpy.empty((nb_tiles, TileDetails.nb_fields), dtype=numpy.int64)
+        for i, field in enumerate(tile_detail_fields):
+            table[:, i] = columns[field]
+        tile_details = TileDetails()
+        tile_details.values.frombytes(table.tobytes())
+        return tile_details
+
+    def __len__(self) -> int:
+        return len(self.values) // self.nb_fields
+
+    def __getitem__(self, i: int) -> TileDetail:
+        nb_fields = self.nb_fields
+        return TileDetail(
+            **dict(
+                zip(
+                    tile_detail_fields,
+                    self.values[i * nb_fields : (i + 1) * nb_fields],
+                )
+            )
+        )
+
+    def __iter__(self) -> Iterator[TileDetail]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def iter_coordinates(self) -> Iterator[Tuple[int, int, int]]:
+        """Iterate over the (tx, ty, tz) coordinates of the tiles"""
+        nb_fields = self.nb_fields
+        return zip(
+            self.values[0::nb_fields],
+            self.values[1::nb_fields],
+            self.values[2::nb_fields],
+        )
+
+    def append(self, tile_detail: TileDetail) -> None:
+        self.values.extend(getattr(tile_detail, field) for field in tile_detail_fields)
+
+    def append_from(self, tile_details: "TileDetails", i: int) -> None:
+        """Append the i-th tile of tile_details"""
+        nb_fields = self.nb_fields
+        self.values.extend(tile_details.values[i * nb_fields : (i + 1) * nb_fields])
+
+    def extend(self, tile_details: "TileDetails") -> None:
+        self.values.extend(tile_details.values)
+
+
+class TileDetailsIndex(object):
+    """
+    Lookup of the TileDetails of base tiles by their (tx, ty) coordinates in the
+    output numbering.
+
+    Tiles are grouped by row and sorted by column, and searched by bisection
+    within the range of their row, so that TileDetail objects are only created
+    for the tiles being generated.
+    """
+
+    def __init__(self, tile_details: TileDetails, options: Options) -> None:
+        self.tile_details = tile_details
+        self.tx = array.array("q", tile_details.values[0 :: TileDetails.nb_fields])
+        ty = array.array(
+            "q",
+            (
+                GDAL2Tiles.getYTile(tile_ty, tile_tz, options)
+                for _, tile_ty, tile_tz in tile_details.iter_coordinates()
+            ),
+        )
+        # (start, end) range of the tiles of each row in self.tile_details
+        self.rows = self.get_rows(self.tx, ty)
+        if self.rows is None:
+            # Tiles are generated row by row, so this only happens if they
+            # were not added in that order
+            order = sorted(range(len(ty)), key=lambda i: (ty[i], self.tx[i]))
+            self.tile_details = TileDetails()
+            for i in order:
+                self.tile_details.append_from(tile_details, i)
+            self.tx = array.array("q", (self.tx[i] for i in order))
+            self.rows = self.get_rows(self.tx, array.array("q", (ty[i] for i in order)))
+
+    @staticmethod
+    def get_rows(tx: array.array, ty: array.array) -> Optional[Dict[int, List[int]]]:
+        """
+        Range of the tiles of each row, or None if the tiles of a row are not
+        consecutive and sorted by column
+        """
+        rows = {}
+        for i, row_ty in enumerate(ty):
+            row = rows.get(row_ty)
+            if row is None:
+                rows[row_ty] = [i, i + 1]
+            elif row[1] == i and tx[i - 1] < tx[i]:
+                row[1] = i + 1
+            else:
+                return None
+        return rows
+
+    def __len__(self) -> int:
+        return len(self.tx)
+
+    def find(self, tx: int, ty: int) -> int:
+        """Position of the (tx, ty) tile in self.tile_details, or -1"""
+        start, end = self.rows.get(ty, (0, 0))
+        i = bisect.bisect_left(self.tx, tx, start, end)
+        if i < end and self.tx[i] == tx:
+            return i
+        return -1
+
+    def __contains__(self, tile: Tuple[int, int]) -> bool:
+        return self.find(*tile) >= 0
+
+    def get(self, tx: int, ty: int) -> Optional[TileDetail]:
+        i = self.find(tx, ty)
+        if i < 0:
+            return None
+        return self.tile_details[i]
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        """Iterate over the (tx, ty) coordinates of the tiles"""
+        for ty, (start, end) in self.rows.items():
+            for i in range(start, end):
+                yield self.tx[i], ty
+
+
 class TileJobInfo(object):
     """
     Plain object to hold tile job configuration for a dataset
@@ -2080,9 +4084,14 @@ class GDAL2Tiles(object):
             self.tileext = "png"
         else:
             self.tileext = "webp"
+        self.output_format = get_output_format(output_folder)
         if options.mpi:
-            makedirs(output_folder)
-            self.tmp_dir = tempfile.mkdtemp(dir=output_folder)
+            if self.output_format == "directory":
+                tmp_parent_dir = output_folder
+            else:
+                tmp_parent_dir = os.path.dirname(os.path.abspath(output_folder))
+            makedirs(tmp_parent_dir)
+            self.tmp_dir = tempfile.mkdtemp(dir=tmp_parent_dir)
         else:
             self.tmp_dir = tempfile.mkdtemp()
         self.tmp_vrt_filename = os.path.join(self.tmp_dir, str(uuid4()) + ".vrt")
@@ -2268,7 +4277,7 @@ class GDAL2Tiles(object):
             if self.kml and self.options.verbose:
                 print("KML autotest OK!")
 
-        if self.kml is None:
+        if self.kml is None or self.output_format != "directory":
             self.kml = False
 
         # Read the georeference
@@ -2566,6 +4575,10 @@ class GDAL2Tiles(object):
         tiles are generated during the tile processing).
         """
 
+        if self.output_format != "directory":
+            self.generate_tile_sink_metadata()
+            return
+
         makedirs(self.output_folder)
 
         if self.options.profile == "mercator":
@@ -2684,9 +4697,59 @@ class GDAL2Tiles(object):
                             ).encode("utf-8")
                         )
 
-    def generate_base_tiles(self) -> Tuple[TileJobInfo, List[TileDetail]]:
+    def generate_tile_sink_metadata(self) -> None:
+        """
+        Create the single-file output (MBTiles, GeoPackage, PMTiles) and store the
+        metadata of the tileset in it, instead of generating HTML viewers.
+        """
+
+        if self.options.profile == "mercator":
+            south, west = self.mercator.MetersToLatLon(self.ominx, self.ominy)
+            north, east = self.mercator.MetersToLatLon(self.omaxx, self.omaxy)
+            south, west = max(-85.05112878, south), max(-180.0, west)
+            north, east = min(85.05112878, north), min(180.0, east)
+        else:
+            south, west = max(-90.0, self.ominy), max(-180.0, self.ominx)
+            north, east = min(90.0, self.omaxy), min(180.0, self.omaxx)
+        self.swne = (south, west, north, east)
+
+        metadata = {
+            "title": self.options.title,
+            "copyright": self.options.copyright,
+            "swne": self.swne,
+            "extent": (self.ominx, self.ominy, self.omaxx, self.omaxy),
+            "tminz": self.tminz,
+            "tmaxz": self.tmaxz,
+        }
+        get_tile_sink(self.get_tile_job_info()).create(metadata)
+
+    def get_tile_job_info(self) -> TileJobInfo:
+        """Configuration of the tiling job, as passed to the workers"""
+
+        return TileJobInfo(
+            src_file=self.tmp_vrt_filename,
+            nb_data_bands=self.dataBandsCount,
+            output_file_path=self.output_folder,
+            tile_extension=self.tileext,
+            tile_driver=self.tiledriver,
+            tile_size=self.tile_size,
+            kml=self.kml,
+            tminmax=self.tminmax,
+            tminz=self.tminz,
+            tmaxz=self.tmaxz,
+            in_srs_wkt=self.in_srs_wkt,
+            out_geo_trans=self.out_gt,
+            ominy=self.ominy,
+            is_epsg_4326=self.isepsg4326,
+            options=self.options,
+            exclude_transparent=self.options.exclude_transparent,
+        )
+
+    def generate_base_tiles(self) -> Tuple[TileJobInfo, Iterator["TileDetails"]]:
         """
         Generation of the base tiles (the lowest in the pyramid) directly from the input raster
+
+        The details of the base tiles are computed lazily, one row at a time.
         """
 
         if not self.options.quiet:
@@ -2701,147 +4764,293 @@ class GDAL2Tiles(object):
         # Set the bounds
         tminx, tminy, tmaxx, tmaxy = self.tminmax[self.tmaxz]
 
-        ds = self.warped_input_dataset
         tilebands = self.dataBandsCount + 1
-        querysize = self.querysize
 
         if self.options.verbose:
             print("dataBandsCount: ", self.dataBandsCount)
             print("tilebands: ", tilebands)
+            print("Tile bounds: ", (tminx, tminy, tmaxx, tmaxy))
 
-        tcount = (1 + abs(tmaxx - tminx)) * (1 + abs(tmaxy - tminy))
-        ti = 0
+        conf = self.get_tile_job_info()
+        return conf, self.iter_base_tile_details(conf)
 
-        tile_details = []
+    def iter_base_tile_details(
+        self, tile_job_info: TileJobInfo
+    ) -> Iterator["TileDetails"]:
+        """
+        Yield the details of the base tiles to generate, one row of tiles at a time.
+
+        When numpy is available, the bounds and ReadRaster() windows of all the
+        tiles of a row are computed at once.
+        """
 
+        tminx, tminy, tmaxx, tmaxy = self.tminmax[self.tmaxz]
         tz = self.tmaxz
+        options = self.options
+
+        tcount = (1 + abs(tmaxx - tminx)) * (1 + abs(tmaxy - tminy))
+        ti = 0
+
+        update_windows = self.get_update_windows()
+        sink = get_tile_sink(tile_job_info)
 
         # Create directories for the tiles
-        for tx in range(tminx, tmaxx + 1):
-            tiledirname = os.path.join(self.output_folder, str(tz), str(tx))
-            makedirs(tiledirname)
+        sink.make_tile_dirs(tz, tminx, tmaxx)
 
         for ty in range(tmaxy, tminy - 1, -1):
-            for tx in range(tminx, tmaxx + 1):
+            if numpy_available:
+                row_tile_details = self.get_base_tile_row_array(ty)
+            else:
+                row_tile_details = self.get_base_tile_row(ty)
 
+            if not options.verbose and not options.resume and update_windows is None:
+                ti += len(row_tile_details)
+                yield row_tile_details
+                continue
+
+            selected_tile_details = TileDetails()
+            for tile_detail in row_tile_details:
                 ti += 1
-                ytile = GDAL2Tiles.getYTile(ty, tz, self.options)
-                tilefilename = os.path.join(
-                    self.output_folder,
-                    str(tz),
-                    str(tx),
-                    "%s.%s" % (ytile, self.tileext),
-                )
-                if self.options.verbose:
-                    print(ti, "/", tcount, tilefilename)
+                tx = tile_detail.tx
+                if options.verbose:
+                    print(
+                        ti,
+                        "/",
+                        tcount,
+                        sink.tile_filename(tz, tx, ty) or (tz, tx, tile_detail.ty),
+                    )
 
-                if self.options.resume and isfile(tilefilename):
-                    if self.options.verbose:
+                if options.resume and sink.tile_exists(tz, tx, ty):
+                    if options.verbose:
                         print("Tile generation skipped because of --resume")
+                    profile_count(options, "skipped_resume")
                     continue
 
-                if self.options.profile == "mercator":
-                    # Tile bounds in EPSG:3857
-                    b = self.mercator.TileBounds(tx, ty, tz)
-                elif self.options.profile == "geodetic":
-                    b = self.geodetic.TileBounds(tx, ty, tz)
-                elif self.options.profile != "raster":
-                    b = tmsMap[self.options.profile].TileBounds(
-                        tx, ty, tz, self.tile_size
-                    )
-
-                # Don't scale up by nearest neighbour, better change the querysize
-                # to the native resolution (and return smaller query tile) for scaling
+                rx, ry = tile_detail.rx, tile_detail.ry
+                rxsize, rysize = tile_detail.rxsize, tile_detail.rysize
+                if update_windows is not None and not any(
+                    xoff < rx + rxsize
+                    and xend > rx
+                    and yoff < ry + rysize
+                    and yend > ry
+                    for xoff, yoff, xend, yend in update_windows
+                ):
+                    if options.verbose:
+                        print("Tile generation skipped because not updated")
+                    profile_count(options, "skipped_unchanged")
+                    continue
 
-                if self.options.profile != "raster":
-                    rb, wb = self.geo_query(ds, b[0], b[3], b[2], b[1])
+                selected_tile_details.append(tile_detail)
+            yield selected_tile_details
 
-                    # Pixel size in the raster covering query geo extent
-                    nativesize = wb[0] + wb[2]
-                    if self.options.verbose:
-                        print("\tNative Extent (querysize", nativesize, "): ", rb, wb)
+    def get_base_tile_row(self, ty: int) -> "TileDetails":
+        """Details of the base tiles of the ty row, computed tile by tile"""
 
-                    # Tile bounds in raster coordinates for ReadRaster query
-                    rb, wb = self.geo_query(
-                        ds, b[0], b[3], b[2], b[1], querysize=querysize
-                    )
+        tminx, tminy, tmaxx, tmaxy = self.tminmax[self.tmaxz]
+        tz = self.tmaxz
+        ds = self.warped_input_dataset
+        querysize = self.querysize
 
-                    rx, ry, rxsize, rysize = rb
-                    wx, wy, wxsize, wysize = wb
-
-                else:  # 'raster' profile:
-
-                    tsize = int(
-                        self.tsize[tz]
-                    )  # tile_size in raster coordinates for actual zoom
-                    xsize = (
-                        self.warped_input_dataset.RasterXSize
-                    )  # size of the raster in pixels
-                    ysize = self.warped_input_dataset.RasterYSize
-                    querysize = self.tile_size
-
-                    rx = tx * tsize
-                    rxsize = 0
-                    if tx == tmaxx:
-                        rxsize = xsize % tsize
-                    if rxsize == 0:
-                        rxsize = tsize
-
-                    ry = ty * tsize
-                    rysize = 0
-                    if ty == tmaxy:
-                        rysize = ysize % tsize
-                    if rysize == 0:
-                        rysize = tsize
-
-                    wx, wy = 0, 0
-                    wxsize = int(rxsize / float(tsize) * self.tile_size)
-                    wysize = int(rysize / float(tsize) * self.tile_size)
-
-                    if not self.options.xyz:
-                        ry = ysize - (ty * tsize) - rysize
-                        if wysize != self.tile_size:
-                            wy = self.tile_size - wysize
-
-                # Read the source raster if anything is going inside the tile as per the computed
-                # geo_query
-                tile_details.append(
-                    TileDetail(
-                        tx=tx,
-                        ty=ytile,
-                        tz=tz,
-                        rx=rx,
-                        ry=ry,
-                        rxsize=rxsize,
-                        rysize=rysize,
-                        wx=wx,
-                        wy=wy,
-                        wxsize=wxsize,
-                        wysize=wysize,
-                        querysize=querysize,
-                    )
+        row_tile_details = TileDetails()
+        for tx in range(tminx, tmaxx + 1):
+            if self.options.profile == "mercator":
+                # Tile bounds in EPSG:3857
+                b = self.mercator.TileBounds(tx, ty, tz)
+            elif self.options.profile == "geodetic":
+                b = self.geodetic.TileBounds(tx, ty, tz)
+            elif self.options.profile != "raster":
+                b = tmsMap[self.options.profile].TileBounds(tx, ty, tz, self.tile_size)
+
+            # Don't scale up by nearest neighbour, better change the querysize
+            # to the native resolution (and return smaller query tile) for scaling
+
+            if self.options.profile != "raster":
+                # Tile bounds in raster coordinates for ReadRaster query
+                rb, wb = self.geo_query(ds, b[0], b[3], b[2], b[1], querysize=querysize)
+
+                rx, ry, rxsize, rysize = rb
+                wx, wy, wxsize, wysize = wb
+
+            else:  # 'raster' profile:
+
+                tsize = int(
+                    self.tsize[tz]
+                )  # tile_size in raster coordinates for actual zoom
+                xsize = (
+                    self.warped_input_dataset.RasterXSize
+                )  # size of the raster in pixels
+                ysize = self.warped_input_dataset.RasterYSize
+                querysize = self.tile_size
+
+                rx = tx * tsize
+                rxsize = 0
+                if tx == tmaxx:
+                    rxsize = xsize % tsize
+                if rxsize == 0:
+                    rxsize = tsize
+
+                ry = ty * tsize
+                rysize = 0
+                if ty == tmaxy:
+                    rysize = ysize % tsize
+                if rysize == 0:
+                    rysize = tsize
+
+                wx, wy = 0, 0
+                wxsize = int(rxsize / float(tsize) * self.tile_size)
+                wysize = int(rysize / float(tsize) * self.tile_size)
+
+                if not self.options.xyz:
+                    ry = ysize - (ty * tsize) - rysize
+                    if wysize != self.tile_size:
+                        wy = self.tile_size - wysize
+
+            # Read the source raster if anything is going inside the tile as per the computed
+            # geo_query
+            row_tile_details.append(
+                TileDetail(
+                    tx=tx,
+                    ty=GDAL2Tiles.getYTile(ty, tz, self.options),
+                    tz=tz,
+                    rx=rx,
+                    ry=ry,
+                    rxsize=rxsize,
+                    rysize=rysize,
+                    wx=wx,
+                    wy=wy,
+                    wxsize=wxsize,
+                    wysize=wysize,
+                    querysize=querysize,
                 )
+            )
 
-        conf = TileJobInfo(
-            src_file=self.tmp_vrt_filename,
-            nb_data_bands=self.dataBandsCount,
-            output_file_path=self.output_folder,
-            tile_extension=self.tileext,
-            tile_driver=self.tiledriver,
-            tile_size=self.tile_size,
-            kml=self.kml,
-            tminmax=self.tminmax,
-            tminz=self.tminz,
-            tmaxz=self.tmaxz,
-            in_srs_wkt=self.in_srs_wkt,
-            out_geo_trans=self.out_gt,
-            ominy=self.ominy,
-            is_epsg_4326=self.isepsg4326,
-            options=self.options,
-            exclude_transparent=self.options.exclude_transparent,
+        return row_tile_details
+
+    def get_base_tile_row_array(self, ty: int) -> "TileDetails":
+        """
+        Details of the base tiles of the ty row, computed for all the tiles at once
+        with numpy. Same result as get_base_tile_row().
+        """
+
+        tminx, tminy, tmaxx, tmaxy = self.tminmax[self.tmaxz]
+        tz = self.tmaxz
+        ds = self.warped_input_dataset
+        querysize = self.querysize
+
+        tx = numpy.arange(tminx, tmaxx + 1, dtype=numpy.int64)
+        if self.options.profile == "mercator":
+            b = self.mercator.TileBounds(tx, ty, tz)
+        elif self.options.profile == "geodetic":
+            b = self.geodetic.TileBounds(tx, ty, tz)
+        elif self.options.profile != "raster":
+            b = tmsMap[self.options.profile].TileBounds(tx, ty, tz, self.tile_size)
+
+        if self.options.profile != "raster":
+            rb, wb = self.geo_query_array(
+                ds, b[0], b[3], b[2], b[1], querysize=querysize
+            )
+            rx, ry, rxsize, rysize = rb
+            wx, wy, wxsize, wysize = wb
+
+        else:  # 'raster' profile:
+
+            tsize = int(self.tsize[tz])
+            xsize = self.warped_input_dataset.RasterXSize
+            ysize = self.warped_input_dataset.RasterYSize
+            querysize = self.tile_size
+
+            rx = tx * tsize
+            rxsize = numpy.where(tx == tmaxx, xsize % tsize, 0)
+            rxsize = numpy.where(rxsize == 0, tsize, rxsize)
+
+            ry = ty * tsize
+            rysize = (ysize % tsize if ty == tmaxy else 0) or tsize
+
+            wx, wy = 0, 0
+            wxsize = (rxsize / float(tsize) * self.tile_size).astype(numpy.int64)
+            wysize = int(rysize / float(tsize) * self.tile_size)
+
+            if not self.options.xyz:
+                ry = ysize - (ty * tsize) - rysize
+                if wysize != self.tile_size:
+                    wy = self.tile_size - wysize
+
+        return TileDetails.from_columns(
+            tx=tx,
+            ty=GDAL2Tiles.getYTile(ty, tz, self.options),
+            tz=tz,
+            rx=rx,
+            ry=ry,
+            rxsize=rxsize,
+            rysize=rysize,
+            wx=wx,
+            wy=wy,
+            wxsize=wxsize,
+            wysize=wysize,
+            querysize=querysize,
         )
 
-        return conf, tile_details
+    def get_update_windows(
+        self,
+    ) -> Optional[List[Tuple[float, float, float, float]]]:
+        """
+        Return the areas to re-tile in an incremental update, as (xoff, yoff, xend,
+        yend) windows in pixels of the warped input dataset, or None if the whole
+        tileset is generated.
+
+        The areas are the --update-extent (in the SRS of the input file) and the
+        footprints of the --changed-files rasters.
+        """
+
+        if not is_incremental_update(self.options):
+            return None
+
+        extents = []
+        if self.options.update_extent:
+            extents.append((self.options.update_extent, self.in_srs))
+        if self.options.changed_files:
+            with open(self.options.changed_files, "rt") as f:
+                filenames = [line.strip() for line in f if line.strip()]
+            for filename in filenames:
+                ds = gdal.Open(filename)
+                if ds is None:
+                    exit_with_error("Cannot open %s" % filename)
+                gt = ds.GetGeoTransform()
+                xs = [
+                    gt[0] + x * gt[1] + y * gt[2]
+                    for x in (0, ds.RasterXSize)
+                    for y in (0, ds.RasterYSize)
+                ]
+                ys = [
+                    gt[3] + x * gt[4] + y * gt[5]
+                    for x in (0, ds.RasterXSize)
+                    for y in (0, ds.RasterYSize)
+                ]
+                srs = ds.GetSpatialRef()
+                if srs is not None:
+                    srs = srs.Clone()
+                    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+                extents.append(
+                    ((min(xs), min(ys), max(xs), max(ys)), srs or self.in_srs)
+                )
+
+        windows = []
+        gt = self.out_gt
+        for (minx, miny, maxx, maxy), srs in extents:
+            if (
+                srs is not None
+                and self.out_srs is not None
+                and not srs.IsSame(self.out_srs)
+            ):
+                ct = osr.CoordinateTransformation(srs, self.out_srs)
+                minx, miny, maxx, maxy = ct.TransformBounds(minx, miny, maxx, maxy, 21)
+            xoff, xend = sorted(((minx - gt[0]) / gt[1], (maxx - gt[0]) / gt[1]))
+            yoff, yend = sorted(((maxy - gt[3]) / gt[5], (miny - gt[3]) / gt[5]))
+            windows.append((xoff, yoff, xend, yend))
+
+        if self.options.verbose:
+            print("Update windows (pixels of the input dataset):", windows)
+        return windows
 
     def geo_query(self, ds, ulx, uly, lrx, lry, querysize=0):
         """
@@ -2887,6 +5096,36 @@ class GDAL2Tiles(object):
 
         return (rx, ry, rxsize, rysize), (wx, wy, wxsize, wysize)
 
+    def geo_query_array(self, ds, ulx, uly, lrx, lry, querysize=0):
+        """
+        Same as geo_query(), for numpy arrays of queries: returns the windows as
+        arrays of integers
+        """
+        geotran = ds.GetGeoTransform()
+        ulx, uly, lrx, lry = numpy.broadcast_arrays(
+            *[numpy.asarray(v, dtype=numpy.float64) for v in (ulx, uly, lrx, lry)]
+        )
+        rx = numpy.trunc((ulx - geotran[0]) / geotran[1] + 0.001).astype(numpy.int64)
+        ry = numpy.trunc((uly - geotran[3]) / geotran[5] + 0.001).astype(numpy.int64)
+        rxsize = numpy.maximum(
+            1, numpy.trunc((lrx - ulx) / geotran[1] + 0.5).astype(numpy.int64)
+        )
+        rysize = numpy.maximum(
+            1, numpy.trunc((lry - uly) / geotran[5] + 0.5).astype(numpy.int64)
+        )
+
+        if not querysize:
+            wxsize, wysize = rxsize, rysize
+        else:
+            wxsize = numpy.full_like(rxsize, querysize)
+            wysize = numpy.full_like(rysize, querysize)
+
+        # Coordinates should not go out of the bounds of the raster
+        rx, rxsize, wx, wxsize = clip_query_array(rx, rxsize, wxsize, ds.RasterXSize)
+        ry, rysize, wy, wysize = clip_query_array(ry, rysize, wysize, ds.RasterYSize)
+
+        return (rx, ry, rxsize, rysize), (wx, wy, wxsize, wysize)
+
     def generate_tilemapresource(self) -> str:
         """
         Template for tilemapresource.xml. Returns filled string. Expected variables:
@@ -3818,12 +6057,12 @@ class GDAL2Tiles(object):
 
 def worker_tile_details(
     input_file: str, output_folder: str, options: Options
-) -> Tuple[TileJobInfo, List[TileDetail]]:
+) -> Tuple[TileJobInfo, Iterator[TileDetails]]:
     gdal2tiles = GDAL2Tiles(input_file, output_folder, options)
     gdal2tiles.open_input()
     gdal2tiles.generate_metadata()
-    tile_job_info, tile_details = gdal2tiles.generate_base_tiles()
-    return tile_job_info, tile_details
+    tile_job_info, tile_rows = gdal2tiles.generate_base_tiles()
+    return tile_job_info, tile_rows
 
 
 class ProgressBar(object):
@@ -3907,6 +6146,68 @@ def get_tile_swne(tile_job_info, options):
     return tile_swne
 
 
+def sub_pyramid_tiling(
+    tile_job_info: TileJobInfo,
+    tile_rows: Iterable[TileDetails],
+    nb_processes: int = 1,
+    pool=None,
+) -> Dict[str, Any]:
+    """
+    Generate base and overview tiles sub-pyramid by sub-pyramid.
+
+    tile_rows yields the details of the base tiles, one row at a time.
+    Each sub-pyramid is processed from its base tiles up to its root tile by a
+    single worker, without any synchronization between workers at each zoom level.
+    A final pass builds the few tiles above the roots of the sub-pyramids.
+    Returns the statistics of all the workers and of the current thread.
+    """
+    options = tile_job_info.options
+
+    sub_pyramid_tz = get_sub_pyramid_zoom(tile_job_info, nb_processes)
+    with profile_stage(options, "details"):
+        sub_pyramids = group_sub_pyramids(tile_job_info, tile_rows, sub_pyramid_tz)
+    if options.verbose:
+        print("Tiles details calc complete.")
+    if is_incremental_update(options):
+        # Sub-pyramids without any base tile to regenerate are left untouched
+        sub_pyramids = [sub_pyramid for sub_pyramid in sub_pyramids if sub_pyramid[3]]
+
+    # Progress is reported by base tile: workers running in this process report
+    # each tile, the other ones the number of tiles of their sub-pyramid.
+    progress_bar = None
+    log_progress = None
+    if not options.verbose and not options.quiet:
+        progress_bar = ProgressBar(
+            sum(len(sub_pyramid[3]) for sub_pyramid in sub_pyramids)
+        )
+        progress_bar.start()
+        if pool is None or options.nb_threads:
+            progress_lock = threading.Lock()
+
+            def log_progress():
+                with progress_lock:
+                    progress_bar.log_progress()
+
+    worker = partial(create_sub_pyramid, tile_job_info, log_progress=log_progress)
+    if pool is None:
+        results = map(worker, sub_pyramids)
+    else:
+        results = pool.imap_unordered(worker, sub_pyramids, chunksize=1)
+
+    root_tiles = {}
+    total_stats = {}
+    for tx, ty, data, nb_base_tiles, stats in results:
+        root_tiles[(tx, ty)] = data
+        merge_stats(total_stats, stats)
+        if progress_bar is not None and log_progress is None and nb_base_tiles:
+            progress_bar.log_progress(nb_base_tiles)
+
+    create_top_pyramid(tile_job_info, sub_pyramid_tz, root_tiles)
+
+    merge_stats(total_stats, pop_worker_stats(options))
+    return total_stats
+
+
 def single_threaded_tiling(
     input_file: str, output_folder: str, options: Options
 ) -> None:
@@ -3914,9 +6215,35 @@ def single_threaded_tiling(
     Keep a single threaded version that stays clear of multiprocessing, for platforms that would not
     support it
     """
+    start_time = time.perf_counter()
+
     if options.verbose:
         print("Begin tiles details calc")
-    conf, tile_details = worker_tile_details(input_file, output_folder, options)
+    with profile_stage(options, "details"):
+        conf, tile_rows = worker_tile_details(input_file, output_folder, options)
+
+    if (
+        options.in_memory_pyramid
+        or is_incremental_update(options)
+        or (options.metatile or 1) > 1
+    ):
+        stats = sub_pyramid_tiling(conf, tile_rows)
+
+        if getattr(threadLocal, "cached_ds", None):
+            del threadLocal.cached_ds
+
+        with profile_stage(options, "finalize"):
+            finalize_tile_sink(conf)
+        shutil.rmtree(os.path.dirname(conf.src_file))
+
+        merge_stats(stats, pop_worker_stats(options))
+        report_tiling_stats(options, stats, time.perf_counter() - start_time, 1)
+        return
+
+    tile_details = TileDetails()
+    with profile_stage(options, "details"):
+        for row_tile_details in tile_rows:
+            tile_details.extend(row_tile_details)
 
     if options.verbose:
         print("Tiles details calc complete.")
@@ -3950,62 +6277,45 @@ def single_threaded_tiling(
             if not options.verbose and not options.quiet:
                 overview_progress_bar.log_progress()
 
+    with profile_stage(options, "finalize"):
+        finalize_tile_sink(conf)
     shutil.rmtree(os.path.dirname(conf.src_file))
 
+    report_tiling_stats(
+        options, pop_worker_stats(options), time.perf_counter() - start_time, 1
+    )
+
 
 def multi_threaded_tiling(
     input_file: str, output_folder: str, options: Options, pool
 ) -> None:
-    nb_processes = options.nb_processes or 1
+    nb_processes = options.nb_threads or options.nb_processes or 1
+    start_time = time.perf_counter()
 
     if options.verbose:
         print("Begin tiles details calc")
 
-    conf, tile_details = worker_tile_details(input_file, output_folder, options)
-
-    if options.verbose:
-        print("Tiles details calc complete.")
-
-    if not options.verbose and not options.quiet:
-        base_progress_bar = ProgressBar(len(tile_details))
-        base_progress_bar.start()
+    with profile_stage(options, "details"):
+        conf, tile_rows = worker_tile_details(input_file, output_folder, options)
 
-    # TODO: gbataille - check the confs for which each element is an array... one useless level?
-    # TODO: gbataille - assign an ID to each job for print in verbose mode "ReadRaster Extent ..."
-    chunksize = max(1, min(128, len(tile_details) // nb_processes))
-    for _ in pool.imap_unordered(
-        partial(create_base_tile, conf), tile_details, chunksize=chunksize
-    ):
-        if not options.verbose and not options.quiet:
-            base_progress_bar.log_progress()
+    # Each worker is handed whole sub-pyramids, so that it reads a compact area of
+    # the source dataset and generates its overview tiles without waiting for the
+    # other workers to complete a zoom level.
+    stats = sub_pyramid_tiling(conf, tile_rows, nb_processes, pool)
 
-    if not options.quiet:
-        count = count_overview_tiles(conf)
-        if count:
-            print("Generating Overview Tiles:")
+    with profile_stage(options, "finalize"):
+        finalize_tile_sink(conf)
+    shutil.rmtree(os.path.dirname(conf.src_file))
 
-            if not options.verbose:
-                overview_progress_bar = ProgressBar(count)
-                overview_progress_bar.start()
+    merge_stats(stats, pop_worker_stats(options))
+    report_tiling_stats(options, stats, time.perf_counter() - start_time, nb_processes)
 
-    for base_tz in range(conf.tmaxz, conf.tminz, -1):
-        base_tile_groups = group_overview_base_tiles(base_tz, output_folder, conf)
-        chunksize = max(1, min(128, len(base_tile_groups) // nb_processes))
-        for _ in pool.imap_unordered(
-            partial(
-                create_overview_tile,
-                base_tz,
-                output_folder=output_folder,
-                tile_job_info=conf,
-                options=options,
-            ),
-            base_tile_groups,
-            chunksize=chunksize,
-        ):
-            if not options.verbose and not options.quiet:
-                overview_progress_bar.log_progress()
 
-    shutil.rmtree(os.path.dirname(conf.src_file))
+def executor_imap_unordered(executor, func, iterable, chunksize=1):
+    """multiprocessing.Pool.imap_unordered() interface for a concurrent.futures executor"""
+    futures = [executor.submit(func, item) for item in iterable]
+    for future in concurrent.futures.as_completed(futures):
+        yield future.result()
 
 
 class UseExceptions(object):
@@ -4074,6 +6384,15 @@ def submain(argv: List[str], pool=None, pool_size=0) -> int:
     with UseExceptions():
         if pool is not None:  # MPI
             multi_threaded_tiling(input_file, output_folder, options, pool)
+        elif options.nb_threads and options.nb_threads > 1:
+            # Threads share the GDAL block cache, and each opens its own handle on
+            # the source dataset (see create_base_tile())
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=options.nb_threads
+            ) as pool:
+                # add interface of multiprocessing.Pool to ThreadPoolExecutor
+                pool.imap_unordered = partial(executor_imap_unordered, pool)
+                multi_threaded_tiling(input_file, output_folder, options, pool)
         elif nb_processes == 1:
             single_threaded_tiling(input_file, output_folder, options)
         else:
@@ -31,6 +31,7 @@
 ###############################################################################
 import sys
 import textwrap
+from itertools import chain
 from numbers import Number, Real
 from typing import Optional, Sequence, Tuple, Union
 
@@ -46,6 +47,45 @@ from osgeo_utils.auxiliary.progress import (
 )
 from osgeo_utils.auxiliary.util import PathOrDS, get_bands, open_ds
 
+# Number of pixels read and emitted at once
+XYZ_BLOCK_PIXELS = 1024 * 1024
+
+
+class NpyRecordWriter:
+    """
+    Streams records of a structured dtype to a .npy file whose length is only
+    known once all records have been written.
+    """
+
+    def __init__(self, filename: PathLikeOrStr, dtype: np.dtype, max_count: int):
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.fh = open(filename, "wb")
+        # Reserve room for the header of the largest possible array
+        self.header_len = len(self._header(max_count))
+        self.fh.write(self._header(max_count))
+
+    def _header(self, count: int, header_len: Optional[int] = None) -> bytes:
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (
+            np.lib.format.dtype_to_descr(self.dtype),
+            count,
+        )
+        magic = np.lib.format.magic(1, 0)
+        if header_len is None:
+            # magic + uint16 length + header + newline, aligned on 64 bytes
+            header_len = -(-(len(magic) + 2 + len(header) + 1) // 64) * 64
+        header = header.ljust(header_len - len(magic) - 2 - 1) + "\n"
+        return magic + np.uint16(len(header)).astype("<u2").tobytes() + header.encode()
+
+    def write(self, records: np.ndarray):
+        self.fh.write(records.astype(self.dtype, copy=False).tobytes())
+        self.count += len(records)
+
+    def close(self):
+        self.fh.seek(0)
+        self.fh.write(self._header(self.count, self.header_len))
+        self.fh.close()
+
 
 def gdal2xyz(
     srcfile: PathOrDS,
@@ -77,6 +117,8 @@ def gdal2xyz(
         `Sequence`/`Number` - replace the `srcnodata` with the given nodata value (per band or per dataset).
     srcfile - The source dataset filename or dataset object
     dstfile - The output dataset filename; for dstfile=None - if return_np_arrays=False then output will be printed to stdout
+        A dstfile ending with `.npy` is written as a binary NumPy array of records with an `x` and `y` field and
+        a `band_1`...`band_n` field per output band, instead of a text file.
     return_np_arrays - return numpy arrays of the result, otherwise returns None
     pre_allocate_np_arrays - pre-allocated result arrays.
         Should be faster unless skip_nodata and the input is very sparse thus most data points will be skipped.
@@ -103,31 +145,6 @@ def gdal2xyz(
 
     dt, np_dt = GDALTypeCodeAndNumericTypeCodeFromDataSet(ds)
 
-    # Open the output file.
-    if dstfile is not None:
-        dst_fh = open(dstfile, "wt")
-    elif return_np_arrays:
-        dst_fh = None
-    else:
-        dst_fh = sys.stdout
-
-    if dst_fh:
-        if dt == gdal.GDT_Int32 or dt == gdal.GDT_UInt32:
-            band_format = (("%d" + delim) * len(bands)).rstrip(delim) + "\n"
-        else:
-            band_format = (("%g" + delim) * len(bands)).rstrip(delim) + "\n"
-
-        # Setup an appropriate print format.
-        if (
-            abs(gt[0]) < 180
-            and abs(gt[3]) < 180
-            and abs(ds.RasterXSize * gt[1]) < 180
-            and abs(ds.RasterYSize * gt[5]) < 180
-        ):
-            frmt = "%.10g" + delim + "%.10g" + delim + "%s"
-        else:
-            frmt = "%.3f" + delim + "%.3f" + delim + "%s"
-
     if isinstance(src_nodata, Number):
         src_nodata = [src_nodata] * band_count
     elif src_nodata is None:
@@ -153,75 +170,134 @@ def gdal2xyz(
     else:
         x_skip = y_skip = skip
 
-    x_off, y_off, x_size, y_size = srcwin
-    bands_count = len(bands)
+    x_off, y_off, x_size, y_size = (int(v) for v in srcwin)
 
-    nXBlocks = (x_size - x_off) // x_skip
-    nYBlocks = (y_size - y_off) // y_skip
-    progress_end = nXBlocks * nYBlocks
-    progress_curr = 0
-    progress_prev = -1
-    progress_parts = 100
+    # Pixel centers of the emitted columns and rows.
+    cols = np.arange(0, x_size, x_skip)
+    rows = np.arange(y_off, y_off + y_size, y_skip)
+    pixel_x = (cols + x_off + 0.5)[np.newaxis, :]
+    progress_end = len(cols) * len(rows)
+    # Rows are read at their full width, whatever the column skip.
+    rows_per_block = max(1, XYZ_BLOCK_PIXELS // max(1, x_size))
+
+    # Open the output file.
+    npy_writer = None
+    dst_fh = None
+    if dstfile is not None and str(dstfile).lower().endswith(".npy"):
+        fields = [("x", np.float64), ("y", np.float64)]
+        fields += [(f"band_{i + 1}", np_dt) for i in range(band_count)]
+        npy_writer = NpyRecordWriter(dstfile, np.dtype(fields), progress_end)
+    elif dstfile is not None:
+        dst_fh = open(dstfile, "wt")
+    elif not return_np_arrays:
+        dst_fh = sys.stdout
+
+    if dst_fh:
+        if dt == gdal.GDT_Int32 or dt == gdal.GDT_UInt32:
+            band_format = delim.join(["%d"] * band_count) + "\n"
+        else:
+            band_format = delim.join(["%g"] * band_count) + "\n"
+
+        # Setup an appropriate print format.
+        if (
+            abs(gt[0]) < 180
+            and abs(gt[3]) < 180
+            and abs(ds.RasterXSize * gt[1]) < 180
+            and abs(ds.RasterYSize * gt[5]) < 180
+        ):
+            frmt = "%.10g" + delim + "%.10g" + delim
+        else:
+            frmt = "%.3f" + delim + "%.3f" + delim
+        line_format = frmt + band_format
 
     if return_np_arrays:
         size = progress_end if pre_allocate_np_arrays else 0
         all_geo_x = np.empty(size)
         all_geo_y = np.empty(size)
         all_data = np.empty((size, band_count), dtype=np_dt)
+        geo_x_blocks = []
+        geo_y_blocks = []
+        data_blocks = []
 
-    # Loop emitting data.
+    # Loop emitting data, a block of rows at a time.
     idx = 0
-    for y in range(y_off, y_off + y_size, y_skip):
+    progress_curr = 0
+    for block_start in range(0, len(rows), rows_per_block):
+        block_rows = rows[block_start : block_start + rows_per_block]
+        y0 = int(block_rows[0])
+        y1 = int(block_rows[-1]) + 1
 
-        size = bands_count if pre_allocate_np_arrays else 0
-        data = np.empty((size, x_size), dtype=np_dt)  # dims: (bands_count, x_size)
+        # dims: (rows, cols, bands)
+        data = np.empty((len(block_rows), len(cols), band_count), dtype=np_dt)
         for i_bnd, band in enumerate(bands):
-            band_data = band.ReadAsArray(x_off, y, x_size, 1)  # read one band line
+            if y_skip == 1:
+                band_data = band.ReadAsArray(x_off, y0, x_size, y1 - y0)[:, ::x_skip]
+            else:
+                band_data = np.concatenate(
+                    [
+                        band.ReadAsArray(x_off, int(y), x_size, 1)[:, ::x_skip]
+                        for y in block_rows
+                    ]
+                )
+            data[:, :, i_bnd] = band_data
+
+        pixel_y = (block_rows + 0.5)[:, np.newaxis]
+        geo_x = gt[0] + pixel_x * gt[1] + pixel_y * gt[2]
+        geo_y = gt[3] + pixel_x * gt[4] + pixel_y * gt[5]
+
+        geo_x = geo_x.ravel()
+        geo_y = geo_y.ravel()
+        data = data.reshape(-1, band_count)
+        progress_curr += len(data)
+
+        if process_nodata:
+            is_nodata = np.all(data == src_nodata, axis=1)
+            if skip_nodata:
+                valid = ~is_nodata
+                geo_x = geo_x[valid]
+                geo_y = geo_y[valid]
+                data = data[valid]
+            else:
+                data[is_nodata] = dst_nodata
+
+        count = len(data)
+        if dst_fh and count:
+            # Format the whole block with a single formatting operation.
+            values = zip(geo_x.tolist(), geo_y.tolist(), *data.T.tolist())
+            dst_fh.write((line_format * count) % tuple(chain.from_iterable(values)))
+        if npy_writer is not None:
+            records = np.empty(count, dtype=npy_writer.dtype)
+            records["x"] = geo_x
+            records["y"] = geo_y
+            for i_bnd in range(band_count):
+                records[f"band_{i_bnd + 1}"] = data[:, i_bnd]
+            npy_writer.write(records)
+        if return_np_arrays:
             if pre_allocate_np_arrays:
-                data[i_bnd] = band_data[0]
+                all_geo_x[idx : idx + count] = geo_x
+                all_geo_y[idx : idx + count] = geo_y
+                all_data[idx : idx + count] = data
             else:
-                data = np.append(data, band_data, axis=0)
-
-        for x_i in range(0, x_size, x_skip):
-
-            progress_curr += 1
-            if progress_callback:
-                progress_frac = progress_curr / progress_end
-                progress = int(progress_frac * progress_parts)
-                if progress > progress_prev:
-                    progress_prev = progress
-                    progress_callback(progress_frac)
-
-            x_i_data = data[:, x_i]  # single pixel, dims: (bands)
-            if process_nodata and np.array_equal(src_nodata, x_i_data):
-                if skip_nodata:
-                    continue
-                elif replace_nodata:
-                    x_i_data = dst_nodata
-
-            x = x_i + x_off
-
-            geo_x = gt[0] + (x + 0.5) * gt[1] + (y + 0.5) * gt[2]
-            geo_y = gt[3] + (x + 0.5) * gt[4] + (y + 0.5) * gt[5]
-
-            if dst_fh:
-                band_str = band_format % tuple(x_i_data)
-                line = frmt % (float(geo_x), float(geo_y), band_str)
-                dst_fh.write(line)
-            if return_np_arrays:
-                if pre_allocate_np_arrays:
-                    all_geo_x[idx] = geo_x
-                    all_geo_y[idx] = geo_y
-                    all_data[idx] = x_i_data
-                else:
-                    all_geo_x = np.append(all_geo_x, geo_x)
-                    all_geo_y = np.append(all_geo_y, geo_y)
-                    all_data = np.append(all_data, [x_i_data], axis=0)
-            idx += 1
+                geo_x_blocks.append(geo_x)
+                geo_y_blocks.append(geo_y)
+                data_blocks.append(data)
+        idx += count
+
+        if progress_callback:
+            progress_callback(progress_curr / progress_end)
+
+    if npy_writer is not None:
+        npy_writer.close()
+    elif dstfile is not None and dst_fh:
+        dst_fh.close()
 
     if return_np_arrays:
         nodata = None if skip_nodata else dst_nodata if replace_nodata else src_nodata
-        if idx != progress_curr:
+        if not pre_allocate_np_arrays:
+            all_geo_x = np.concatenate([all_geo_x] + geo_x_blocks)
+            all_geo_y = np.concatenate([all_geo_y] + geo_y_blocks)
+            all_data = np.concatenate([all_data] + data_blocks)
+        elif idx != progress_end:
             all_geo_x = all_geo_x[:idx]
             all_geo_y = all_geo_y[:idx]
             all_data = all_data[:idx, :]
@@ -32,14 +32,30 @@
 # ******************************************************************************
 
 import argparse
+import ast
+import collections
+import concurrent.futures
 import glob
+import math
 import os
 import os.path
 import string
 import sys
 import textwrap
+import threading
 from numbers import Number
-from typing import Dict, Optional, Sequence, Tuple, Union
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from xml.sax.saxutils import escape as xml_escape
 
 import numpy
 
@@ -52,6 +68,11 @@ from osgeo_utils.auxiliary.gdal_argparse import GDALArgumentParser, GDALScript
 from osgeo_utils.auxiliary.rectangle import GeoRectangle
 from osgeo_utils.auxiliary.util import GetOutputDriverFor, open_ds
 
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
 GDALDataType = int
 
 # create alphabetic list (lowercase + uppercase) for storing input layers
@@ -92,11 +113,605 @@ set values of zero and below to null:
 work with two bands:
     Calc(["(A+B)/2", "A*(A>0)"], A="input.tif", A_band=1, B="input.tif", B_band=2, outfile="result.tif", NoDataValue=0)
 
+evaluate the calculation in 4 threads, while the next blocks are read and the previous ones written:
+    Calc(calc="(A-B)/(A+B)", A="nir.tif", B="red.tif", outfile="ndvi.tif", type="Float32", threads=4)
+
 sum all files with hidden noDataValue
     Calc(calc="sum(a,axis=0)", a=['0.tif','1.tif','2.tif'], outfile="sum.tif", hideNoData=True)
+
+use the mask band (e.g. alpha band) of inputs without noDataValue as nodata
+    Calc(calc="A*2", A="input_rgba.tif", outfile="result.tif", use_mask_band=True)
 """
 
 
+# syntax allowed in calculations: numpy style expressions on the inputs, function
+# calls and attribute access, but no lambdas, comprehensions or private names
+AllowedCalcNodes = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.BoolOp,
+    ast.Compare,
+    ast.IfExp,
+    ast.Call,
+    ast.keyword,
+    ast.Name,
+    ast.Attribute,
+    ast.Subscript,
+    ast.Slice,
+    ast.Tuple,
+    ast.List,
+    ast.Constant,
+    ast.expr_context,
+    ast.operator,
+    ast.unaryop,
+    ast.cmpop,
+    ast.boolop,
+)
+if sys.version_info < (3, 9):
+    AllowedCalcNodes += (ast.Index, ast.ExtSlice)
+if sys.version_info < (3, 8):
+    AllowedCalcNodes += (ast.Num, ast.Str, ast.NameConstant)
+
+# ufuncs used to evaluate operators on numpy arrays into preallocated buffers.
+# Pow is left out as ndarray.__pow__ special cases some exponents
+BinOpUfuncs = {
+    ast.Add: numpy.add,
+    ast.Sub: numpy.subtract,
+    ast.Mult: numpy.multiply,
+    ast.Div: numpy.true_divide,
+    ast.FloorDiv: numpy.floor_divide,
+    ast.Mod: numpy.remainder,
+    ast.BitAnd: numpy.bitwise_and,
+    ast.BitOr: numpy.bitwise_or,
+    ast.BitXor: numpy.bitwise_xor,
+    ast.LShift: numpy.left_shift,
+    ast.RShift: numpy.right_shift,
+    ast.Eq: numpy.equal,
+    ast.NotEq: numpy.not_equal,
+    ast.Lt: numpy.less,
+    ast.LtE: numpy.less_equal,
+    ast.Gt: numpy.greater,
+    ast.GtE: numpy.greater_equal,
+}
+UnaryOpUfuncs = {
+    ast.USub: numpy.negative,
+    ast.UAdd: numpy.positive,
+    ast.Invert: numpy.invert,
+}
+
+# functions evaluated by numexpr the same way as by numpy
+NumexprFunctions = (
+    "where",
+    "sin",
+    "cos",
+    "tan",
+    "arcsin",
+    "arccos",
+    "arctan",
+    "arctan2",
+    "sinh",
+    "cosh",
+    "tanh",
+    "arcsinh",
+    "arccosh",
+    "arctanh",
+    "log",
+    "log10",
+    "log1p",
+    "exp",
+    "expm1",
+    "sqrt",
+    "abs",
+)
+NumexprOps = (
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.USub,
+    ast.Invert,
+    ast.BitAnd,
+    ast.BitOr,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+)
+
+CalcEvaluators = ("auto", "numexpr", "numpy")
+
+
+def check_calc_syntax(calc: str) -> ast.Expression:
+    """Parse a calculation, and check that it only uses the allowed syntax"""
+    try:
+        tree = ast.parse(calc.strip(), mode="eval")
+    except SyntaxError as e:
+        raise Exception(f"Error! Invalid calculation {calc}: {e}")
+    for node in ast.walk(tree):
+        if not isinstance(node, AllowedCalcNodes):
+            raise Exception(
+                f"Error! {node.__class__.__name__} is not allowed in calculation {calc}"
+            )
+        name = getattr(node, "id", None) or getattr(node, "attr", None)
+        if name is not None and name.startswith("_"):
+            raise Exception(f"Error! {name} is not allowed in calculation {calc}")
+    return tree
+
+
+def is_plain_operand(value) -> bool:
+    return type(value) is numpy.ndarray or isinstance(
+        value, (int, float, bool, numpy.generic)
+    )
+
+
+class CalcExpression:
+    """
+    A calculation parsed and checked once, then evaluated on each block.
+
+    It is evaluated by numexpr when it is installed and the calculation is
+    supported by numexpr. Otherwise, operators are evaluated with numpy into
+    buffers reused between operations and blocks, instead of allocating a new
+    temporary array for each operator.
+    """
+
+    def __init__(
+        self,
+        calc: str,
+        global_namespace: Dict,
+        evaluator: str = "auto",
+        debug: bool = False,
+    ):
+        if evaluator not in CalcEvaluators:
+            raise Exception(f"Error! Unknown evaluator {evaluator}")
+        if evaluator == "numexpr" and numexpr is None:
+            raise Exception("Error! numexpr is not available")
+        self.calc = calc
+        self.global_namespace = global_namespace
+        self.evaluator = evaluator
+        self.debug = debug
+        self.tree = check_calc_syntax(calc)
+        self.code = compile(self.tree, "<calc>", "eval")
+        # code of the sub-expressions evaluated by Python, by node
+        self.node_code = {}
+        self.numexpr_names = self.get_numexpr_names()
+        # whether numexpr is used, decided on the first block
+        self.use_numexpr = None
+        self.local = threading.local()
+
+    def get_numexpr_names(self) -> Optional[Sequence[str]]:
+        """Names of the variables of the calculation if numexpr supports it, or None"""
+        if numexpr is None or self.evaluator == "numpy":
+            return None
+        names = set()
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.Call):
+                if (
+                    not isinstance(node.func, ast.Name)
+                    or node.func.id not in NumexprFunctions
+                    or self.global_namespace.get(node.func.id)
+                    is not getattr(numpy, node.func.id)
+                    or node.keywords
+                ):
+                    return None
+            elif isinstance(node, ast.Name):
+                if node.id not in NumexprFunctions:
+                    names.add(node.id)
+            elif isinstance(node, ast.Compare):
+                if len(node.ops) != 1:
+                    return None
+            elif isinstance(node, ast.Constant):
+                if not isinstance(node.value, (int, float)):
+                    return None
+            elif not isinstance(
+                node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Load) + NumexprOps
+            ):
+                return None
+        return sorted(names)
+
+    def can_use_numexpr(self, local_namespace: Dict) -> bool:
+        if self.numexpr_names is None:
+            return False
+        arrays = [local_namespace.get(name) for name in self.numexpr_names]
+        if not all(isinstance(a, numpy.ndarray) and a.ndim == 2 for a in arrays):
+            return False
+        # numexpr upcasts small integer types, so that it does not overflow like
+        # numpy does: only use it by default when the results are the same
+        return self.evaluator == "numexpr" or all(a.dtype.kind == "f" for a in arrays)
+
+    def evaluate(self, local_namespace: Dict):
+        if self.use_numexpr is None:
+            self.use_numexpr = self.can_use_numexpr(local_namespace)
+            if self.debug:
+                evaluator = "numexpr" if self.use_numexpr else "numpy"
+                print(f"evaluating {self.calc} with {evaluator}")
+
+        if self.use_numexpr:
+            try:
+                return numexpr.evaluate(
+                    self.calc.strip(),
+                    local_dict={
+                        name: local_namespace[name] for name in self.numexpr_names
+                    },
+                    global_dict={},
+                )
+            except Exception:
+                # e.g. where() with a condition that is not boolean
+                if self.evaluator == "numexpr":
+                    raise
+                if self.debug:
+                    print(f"numexpr failed on {self.calc}, evaluating with numpy")
+                self.use_numexpr = False
+
+        return self.eval_node(self.tree.body, local_namespace)[0]
+
+    def get_buffer_pool(self) -> Dict:
+        """Free buffers of the current thread, by shape and dtype"""
+        pool = getattr(self.local, "pool", None)
+        if pool is None:
+            pool = self.local.pool = collections.defaultdict(list)
+        return pool
+
+    def eval_node(self, node, local_namespace: Dict) -> Tuple[object, bool]:
+        """
+        Evaluate a node of the calculation, and return its value and whether it
+        is a buffer owned by the evaluator, that can be overwritten or reused
+        once consumed
+        """
+        if isinstance(node, ast.BinOp) and type(node.op) in BinOpUfuncs:
+            return self.eval_ufunc(
+                BinOpUfuncs[type(node.op)],
+                node,
+                (node.left, node.right),
+                local_namespace,
+            )
+        if isinstance(node, ast.Compare) and len(node.ops) == 1:
+            return self.eval_ufunc(
+                BinOpUfuncs[type(node.ops[0])],
+                node,
+                (node.left, node.comparators[0]),
+                local_namespace,
+            )
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UnaryOpUfuncs:
+            return self.eval_ufunc(
+                UnaryOpUfuncs[type(node.op)], node, (node.operand,), local_namespace
+            )
+        if isinstance(node, ast.Call):
+            # the result may be a view of the arguments: they are not reused
+            func = self.eval_node(node.func, local_namespace)[0]
+            args = [self.eval_node(arg, local_namespace)[0] for arg in node.args]
+            kwargs = {
+                kw.arg: self.eval_node(kw.value, local_namespace)[0]
+                for kw in node.keywords
+            }
+            return func(*args, **kwargs), False
+
+        code = self.node_code.get(node)
+        if code is None:
+            code = self.node_code[node] = compile(
+                ast.Expression(body=node), "<calc>", "eval"
+            )
+        return eval(code, self.global_namespace, local_namespace), False
+
+    def eval_ufunc(self, ufunc, node, operands, local_namespace: Dict):
+        values = [self.eval_node(operand, local_namespace) for operand in operands]
+        args = [value for value, is_buffer in values]
+        if not all(is_plain_operand(arg) for arg in args) or not any(
+            type(arg) is numpy.ndarray for arg in args
+        ):
+            # not only numpy arrays and numbers: let Python apply the operator
+            code = self.node_code.get(node)
+            if code is None:
+                expression = ast.Expression(
+                    body=ast.copy_location(
+                        type(node)(
+                            **{
+                                **{f: getattr(node, f) for f in node._fields},
+                                **self.operand_fields(node),
+                            }
+                        ),
+                        node,
+                    )
+                )
+                code = self.node_code[node] = compile(
+                    ast.fix_missing_locations(expression), "<calc>", "eval"
+                )
+            return (
+                eval(code, {}, {f"_operand{i}": arg for i, arg in enumerate(args)}),
+                False,
+            )
+
+        # find the type and shape of the result, without computing it
+        with numpy.errstate(all="ignore"):
+            dtype = ufunc(
+                *(
+                    arg.reshape(-1)[:1]
+                    if type(arg) is numpy.ndarray and arg.ndim
+                    else arg
+                    for arg in args
+                )
+            ).dtype
+        shape = numpy.broadcast(*args).shape
+
+        pool = self.get_buffer_pool()
+        out = None
+        for value, is_buffer in values:
+            if is_buffer and value.dtype == dtype and value.shape == shape:
+                out = value
+                break
+        if out is None:
+            free_buffers = pool[(shape, dtype)]
+            out = free_buffers.pop() if free_buffers else numpy.empty(shape, dtype)
+        ufunc(*args, out=out)
+
+        # the operands are consumed, so their buffers can be reused
+        for value, is_buffer in values:
+            if is_buffer and value is not out:
+                pool[(value.shape, value.dtype)].append(value)
+        return out, True
+
+    @staticmethod
+    def operand_fields(node) -> Dict:
+        """Fields of node with its operands replaced by _operand0, _operand1..."""
+        if isinstance(node, ast.BinOp):
+            return {
+                "left": ast.Name(id="_operand0", ctx=ast.Load()),
+                "right": ast.Name(id="_operand1", ctx=ast.Load()),
+            }
+        if isinstance(node, ast.Compare):
+            return {
+                "left": ast.Name(id="_operand0", ctx=ast.Load()),
+                "comparators": [ast.Name(id="_operand1", ctx=ast.Load())],
+            }
+        return {"operand": ast.Name(id="_operand0", ctx=ast.Load())}
+
+
+CalcPixelFunctionName = "gdal_calc"
+
+
+class CalcVRTSource(NamedTuple):
+    """An input of a calculation written as a VRT pixel function"""
+
+    alpha: str
+    filename: str
+    band: int
+    dtype: str  # numpy dtype of the input values
+    nodata: Optional[Number]
+    use_mask_band: bool
+
+
+def make_calc_pixel_function(
+    calc: str,
+    sources: Sequence[CalcVRTSource],
+    alpha_lists: Sequence[str],
+    out_nodata: Optional[Number],
+    constants: Optional[Dict[str, Number]] = None,
+) -> str:
+    """
+    Return the code of a VRT Python pixel function evaluating a calculation.
+
+    The inputs of the pixel function are the bands of the sources, in order,
+    followed by the mask bands of the sources using them.
+    """
+    check_calc_syntax(calc)
+    lines = [
+        "import numpy",
+        "from numpy import *",
+        "",
+        f"def {CalcPixelFunctionName}(in_ar, out_ar, xoff, yoff, xsize, ysize, "
+        "raster_xsize, raster_ysize, buf_radius, gt, **kwargs):",
+    ]
+    for name, value in (constants or {}).items():
+        lines.append(f"    {name} = {value!r}")
+
+    # names starting with an underscore can not be used by the calculation
+    arrays = collections.defaultdict(list)
+    for i, source in enumerate(sources):
+        lines.append(f'    _in{i} = in_ar[{i}].astype("{source.dtype}", copy=False)')
+        arrays[source.alpha].append(f"_in{i}")
+    for alpha, alpha_arrays in arrays.items():
+        if alpha in alpha_lists:
+            lines.append(f"    {alpha} = numpy.stack([{', '.join(alpha_arrays)}])")
+        else:
+            lines.append(f"    {alpha} = {alpha_arrays[0]}")
+
+    nodata_tests = []
+    mask_index = len(sources)
+    for i, source in enumerate(sources):
+        if source.nodata is not None:
+            if math.isnan(source.nodata):
+                nodata_tests.append(f"numpy.isnan(_in{i})")
+            else:
+                nodata_tests.append(f"_in{i} == {source.nodata!r}")
+        elif source.use_mask_band:
+            nodata_tests.append(f"in_ar[{mask_index}] == 0")
+            mask_index += 1
+
+    lines.append(f"    _out = {calc.strip()}")
+    # convert to integer types as GDAL does: rounding half away from zero, and clamping
+    lines += [
+        "    if numpy.issubdtype(out_ar.dtype, numpy.integer):",
+        "        _info = numpy.iinfo(out_ar.dtype)",
+        "        _out = numpy.trunc(_out + numpy.copysign(0.5, _out))",
+        "        _out = numpy.clip(_out, _info.min, _info.max)",
+        "    out_ar[:] = _out",
+    ]
+    if nodata_tests and out_nodata is not None:
+        lines.append(f"    nodata = {' | '.join(f'({t})' for t in nodata_tests)}")
+        lines.append(f"    out_ar[nodata] = {out_nodata!r}")
+    return "\n".join(lines) + "\n"
+
+
+def write_calc_vrt(
+    filename: PathLikeOrStr,
+    xsize: int,
+    ysize: int,
+    data_type: GDALDataType,
+    transfer_type: GDALDataType,
+    bands: Sequence[Tuple[str, Sequence[CalcVRTSource]]],
+):
+    """
+    Write a VRT made of VRTDerivedRasterBand whose Python pixel functions
+    evaluate calculations on the fly, given a (code, sources) pair per band.
+    """
+    data_type_name = gdal.GetDataTypeName(data_type)
+    lines = [f'<VRTDataset rasterXSize="{xsize}" rasterYSize="{ysize}">']
+    for band_number, (code, sources) in enumerate(bands, start=1):
+        lines += [
+            f'  <VRTRasterBand dataType="{data_type_name}" band="{band_number}" '
+            'subClass="VRTDerivedRasterBand">',
+            f"    <PixelFunctionType>{CalcPixelFunctionName}</PixelFunctionType>",
+            "    <PixelFunctionLanguage>Python</PixelFunctionLanguage>",
+            f"    <PixelFunctionCode>{xml_escape(code)}</PixelFunctionCode>",
+            "    <SourceTransferType>"
+            f"{gdal.GetDataTypeName(transfer_type)}</SourceTransferType>",
+        ]
+        source_bands = [(source, str(source.band)) for source in sources]
+        source_bands += [
+            (source, f"mask,{source.band}")
+            for source in sources
+            if source.nodata is None and source.use_mask_band
+        ]
+        for source, source_band in source_bands:
+            lines += [
+                "    <SimpleSource>",
+                '      <SourceFilename relativeToVRT="0">'
+                f"{xml_escape(source.filename)}</SourceFilename>",
+                f"      <SourceBand>{source_band}</SourceBand>",
+                "    </SimpleSource>",
+            ]
+        lines.append("  </VRTRasterBand>")
+    lines.append("</VRTDataset>")
+
+    content = ("\n".join(lines) + "\n").encode("utf-8")
+    f = gdal.VSIFOpenL(os.fspath(filename), "wb")
+    if f is None:
+        raise Exception(f"Error! Could not create output file {filename}")
+    try:
+        if gdal.VSIFWriteL(content, 1, len(content), f) != len(content):
+            raise Exception(f"Error! Could not write output file {filename}")
+    finally:
+        gdal.VSIFCloseL(f)
+
+
+# upper bound of the memory used by the arrays of a block, in bytes
+MaxCalcBlockBytes = 64 * 1024 * 1024
+
+
+class CalcBlockPlan(NamedTuple):
+    """Size of the blocks in which a calculation is processed"""
+
+    xsize: int
+    ysize: int
+    # smallest window aligned on the blocks of all the inputs and of the output
+    aligned_xsize: int
+    aligned_ysize: int
+    # largest number of pixels of a block allowed by the memory and cache budget
+    max_pixels: int
+
+
+def plan_calc_block_size(
+    input_bands: Sequence[gdal.Band],
+    output_band: gdal.Band,
+    xsize: int,
+    ysize: int,
+    threads: Optional[int] = None,
+) -> CalcBlockPlan:
+    """
+    Choose the size of the blocks in which a calculation is processed.
+
+    Blocks are aligned on the blocks of all the inputs and of the output, so
+    that none of their blocks is read or written piecewise by several blocks.
+    They are made of as many rows of aligned windows as the memory budget (and
+    GDAL_CACHEMAX) allows, so that striped inputs are not processed one row at
+    a time. With threads, the raster is split in enough blocks to keep them busy.
+    """
+    bands = list(input_bands) + [output_band]
+    aligned_xsize = aligned_ysize = 1
+    for band in bands:
+        block_xsize, block_ysize = band.GetBlockSize()
+        aligned_xsize = min(
+            aligned_xsize * block_xsize // math.gcd(aligned_xsize, block_xsize), xsize
+        )
+        aligned_ysize = min(
+            aligned_ysize * block_ysize // math.gcd(aligned_ysize, block_ysize), ysize
+        )
+
+    # input and output arrays, and an allowance for the temporary arrays of the
+    # evaluation
+    pixel_bytes = sum(gdal.GetDataTypeSize(band.DataType) // 8 for band in bands) + 16
+    max_pixels = min(
+        MaxCalcBlockBytes // pixel_bytes,
+        # the source blocks of a block should stay in the block cache
+        gdal.GetCacheMax() // (2 * pixel_bytes),
+    )
+    if threads:
+        # at least 4 blocks per thread when possible
+        max_pixels = min(max_pixels, xsize * ysize // (4 * threads))
+    max_pixels = max(max_pixels, aligned_xsize * aligned_ysize)
+
+    if aligned_xsize == xsize or xsize * aligned_ysize <= max_pixels:
+        # whole rows of aligned windows
+        rows = max(1, max_pixels // (xsize * aligned_ysize))
+        block_xsize = xsize
+        block_ysize = min(ysize, rows * aligned_ysize)
+    else:
+        columns = max(1, max_pixels // (aligned_xsize * aligned_ysize))
+        block_xsize = min(xsize, columns * aligned_xsize)
+        block_ysize = aligned_ysize
+
+    return CalcBlockPlan(
+        block_xsize, block_ysize, aligned_xsize, aligned_ysize, max_pixels
+    )
+
+
+Block = Tuple[int, int, int, int, int]
+
+
+def calc_blocks_pipeline(
+    blocks: Iterable[Block],
+    read_block: Callable,
+    calc_block: Callable,
+    threads: int,
+) -> Iterator[Tuple[Block, numpy.ndarray]]:
+    """
+    Yield the (block, result) of each block, in order, while the next blocks are
+    read by a reader thread and evaluated by a pool of threads, so that reading,
+    evaluation and the writing done by the caller overlap.
+
+    The inputs are only read from the reader thread, as a GDAL dataset must not
+    be used from several threads at once. At most 2 * threads blocks are in
+    flight, to bound the memory use.
+    """
+    max_pending = 2 * threads
+    pending = collections.deque()
+
+    def evaluate(block, inputs_future):
+        return calc_block(block, *inputs_future.result())
+
+    with concurrent.futures.ThreadPoolExecutor(1) as reader:
+        with concurrent.futures.ThreadPoolExecutor(threads) as evaluator:
+            try:
+                for block in blocks:
+                    inputs_future = reader.submit(read_block, block)
+                    result_future = evaluator.submit(evaluate, block, inputs_future)
+                    pending.append((block, inputs_future, result_future))
+                    if len(pending) >= max_pending:
+                        block, _, result_future = pending.popleft()
+                        yield block, result_future.result()
+                while pending:
+                    block, _, result_future = pending.popleft()
+                    yield block, result_future.result()
+            finally:
+                # on error, do not read nor evaluate the blocks that are not needed
+                for _, inputs_future, result_future in pending:
+                    inputs_future.cancel()
+                    result_future.cancel()
+
+
 def Calc(
     calc: MaybeSequence[str],
     outfile: Optional[PathLikeOrStr] = None,
@@ -107,6 +722,7 @@ def Calc(
     allBands: str = "",
     overwrite: bool = False,
     hideNoData: bool = False,
+    use_mask_band: bool = False,
     projectionCheck: bool = False,
     color_table: Optional[ColorTableLike] = None,
     extent: Optional[Extent] = None,
@@ -114,6 +730,9 @@ def Calc(
     user_namespace: Optional[Dict] = None,
     debug: bool = False,
     quiet: bool = False,
+    threads: Optional[int] = None,
+    evaluator: str = "auto",
+    lazy: bool = False,
     **input_files,
 ):
 
@@ -135,6 +754,9 @@ def Calc(
 
     creation_options = creation_options or []
 
+    if threads is not None and threads < 0:
+        raise Exception("Error! The number of threads must be positive")
+
     # set up global namespace for eval with all functions of gdal_array, numpy
     global_namespace = {
         key: getattr(module, key)
@@ -154,6 +776,16 @@ def Calc(
     if format is None:
         format = GetOutputDriverFor(outfile)
 
+    if lazy:
+        if format.upper() != "VRT":
+            raise Exception("Error! --lazy requires the VRT output format")
+        if outfile and os.path.isfile(outfile) and not overwrite:
+            raise Exception(
+                "Error! --lazy was given but Output file exists, must use --overwrite option!"
+            )
+        if user_namespace:
+            raise Exception("Error! --lazy does not support a user namespace")
+
     if isinstance(extent, GeoRectangle):
         pass
     elif projwin:
@@ -192,6 +824,7 @@ def Calc(
     myDataType = []  # string representation of the datatype of each input file
     myDataTypeNum = []  # datatype of each input file
     myNDV = []  # nodatavalue for each input file
+    myUseMaskBand = []  # whether the mask band of each input file is used
     DimensionsCheck = None  # dimensions of the output
     Dimensions = []  # Dimensions of input files
     ProjectionCheck = None  # projection of the output
@@ -245,6 +878,9 @@ def Calc(
                     if hideNoData
                     else myFile.GetRasterBand(myBand).GetNoDataValue()
                 )
+                myUseMaskBand.append(
+                    use_mask_band and not hideNoData and myNDV[-1] is None
+                )
 
                 # check that the dimensions of each layer are the same
                 myFileDimensions = [myFile.RasterXSize, myFile.RasterYSize]
@@ -301,6 +937,11 @@ def Calc(
                         f"{DimensionsCheck[0]}, {DimensionsCheck[1]}, type: {myDataType[-1]}"
                     )
 
+    # parse and check the calculations once, before creating the output
+    calc_expressions = [
+        CalcExpression(c, global_namespace, evaluator, debug) for c in calc
+    ]
+
     # process allBands option
     allBandsIndex = None
     allBandsCount = 1
@@ -332,6 +973,10 @@ def Calc(
         )
         if GeoTransformCheck is None:
             raise Exception("Error! The requested extent is empty. Cannot proceed")
+        if lazy:
+            raise Exception(
+                "Error! --lazy does not support inputs of different extents nor --projwin"
+            )
         for i in range(len(myFileNames)):
             temp_vrt_filename, temp_vrt_ds = extent_util.make_temp_vrt(
                 myFiles[i], ExtentCheck
@@ -345,6 +990,76 @@ def Calc(
             DimensionsCheck = [temp_vrt_ds.RasterXSize, temp_vrt_ds.RasterYSize]
         temp_vrt_ds = None
 
+    def write_lazy_vrt():
+        """Write the output as a VRT with a Python pixel function per band"""
+        filenames = []
+        for filename, myFile in zip(myFileNames, myFiles):
+            if filename is None:
+                filename = myFile.GetDescription()
+                if not filename or myFile.GetDriver().ShortName == "MEM":
+                    raise Exception(
+                        "Error! --lazy requires inputs that are files, not in-memory datasets"
+                    )
+            elif os.path.exists(filename):
+                filename = os.path.abspath(filename)
+            filenames.append(os.fspath(filename))
+
+        constants = {}
+        for name, value in input_files.items():
+            if (
+                name in myAlphaList
+                or name in myAlphaFileLists
+                or name.endswith("_band")
+            ):
+                continue
+            if not isinstance(value, (Number, numpy.number)):
+                raise Exception(
+                    f"Error! --lazy does not support the non numeric value of {name}"
+                )
+            constants[name] = value.item() if isinstance(value, numpy.number) else value
+
+        transfer_type = myDataTypeNum[0]
+        for dt in myDataTypeNum:
+            if hasattr(gdal, "DataTypeUnion"):
+                transfer_type = gdal.DataTypeUnion(transfer_type, dt)
+            else:
+                transfer_type = max(transfer_type, dt)
+
+        bands = []
+        for bandNo in range(1, allBandsCount + 1):
+            sources = [
+                CalcVRTSource(
+                    alpha=myAlphaList[i],
+                    filename=filenames[i],
+                    band=bandNo if allBandsIndex == i else myBands[i],
+                    dtype=numpy.dtype(
+                        gdal_array.GDALTypeCodeToNumericTypeCode(myDataTypeNum[i])
+                    ).name,
+                    nodata=myNDV[i],
+                    use_mask_band=myUseMaskBand[i],
+                )
+                for i in range(len(myFiles))
+            ]
+            code = make_calc_pixel_function(
+                calc[bandNo - 1 if len(calc) > 1 else 0],
+                sources,
+                myAlphaFileLists,
+                None if hideNoData else myOutNDV,
+                constants,
+            )
+            if debug:
+                print(f"pixel function of band {bandNo}:\n{code}")
+            bands.append((code, sources))
+
+        write_calc_vrt(
+            outfile,
+            DimensionsCheck[0],
+            DimensionsCheck[1],
+            myOutType,
+            transfer_type,
+            bands,
+        )
+
     ################################################################
     # set up output file
     ################################################################
@@ -411,16 +1126,30 @@ def Calc(
             if isinstance(myOutType, str):
                 myOutType = gdal.GetDataTypeByName(myOutType)
 
-        # create file
-        myOutDrv = gdal.GetDriverByName(format)
-        myOut = myOutDrv.Create(
-            os.fspath(outfile),
-            DimensionsCheck[0],
-            DimensionsCheck[1],
-            allBandsCount,
-            myOutType,
-            creation_options,
-        )
+        if NoDataValue is None:
+            myOutNDV = DefaultNDVLookup[
+                myOutType
+            ]  # use the default noDataValue for this datatype
+        elif isinstance(NoDataValue, str) and NoDataValue.lower() == "none":
+            myOutNDV = None  # not to set any noDataValue
+        else:
+            myOutNDV = NoDataValue  # use the given noDataValue
+
+        if lazy:
+            # write a VRT evaluating the calculations when it is read
+            write_lazy_vrt()
+            myOut = gdal.Open(os.fspath(outfile), gdal.GA_Update)
+        else:
+            # create file
+            myOutDrv = gdal.GetDriverByName(format)
+            myOut = myOutDrv.Create(
+                os.fspath(outfile),
+                DimensionsCheck[0],
+                DimensionsCheck[1],
+                allBandsCount,
+                myOutType,
+                creation_options,
+            )
         if myOut is None:
             raise Exception(f"Error! Could not create output file {outfile}")
 
@@ -435,15 +1164,6 @@ def Calc(
         if ProjectionCheck:
             myOut.SetProjection(ProjectionCheck)
 
-        if NoDataValue is None:
-            myOutNDV = DefaultNDVLookup[
-                myOutType
-            ]  # use the default noDataValue for this datatype
-        elif isinstance(NoDataValue, str) and NoDataValue.lower() == "none":
-            myOutNDV = None  # not to set any noDataValue
-        else:
-            myOutNDV = NoDataValue  # use the given noDataValue
-
         for i in range(1, allBandsCount + 1):
             myOutB = myOut.GetRasterBand(i)
             if myOutNDV is not None:
@@ -466,19 +1186,50 @@ def Calc(
             f"output file: {outfile}, dimensions: {myOut.RasterXSize}, {myOut.RasterYSize}, type: {myOutTypeName}"
         )
 
+    if lazy:
+        myOut.FlushCache()
+        if not quiet:
+            print("100 - Done")
+        return myOut
+
     ################################################################
     # find block size to chop grids into bite-sized chunks
     ################################################################
 
-    # use the block size of the first layer to read efficiently
-    myBlockSize = myFiles[0].GetRasterBand(myBands[0]).GetBlockSize()
+    # align the blocks on the blocks of all the layers to read and write
+    # efficiently, and make them as large as the memory and cache budget allows
+    myInputBands = [
+        myFile.GetRasterBand(myBand) for myFile, myBand in zip(myFiles, myBands)
+    ]
+    myBlockPlan = plan_calc_block_size(
+        myInputBands,
+        myOut.GetRasterBand(1),
+        DimensionsCheck[0],
+        DimensionsCheck[1],
+        threads,
+    )
+    myBlockSize = (myBlockPlan.xsize, myBlockPlan.ysize)
     # find total x and y blocks to be read
     nXBlocks = (int)((DimensionsCheck[0] + myBlockSize[0] - 1) / myBlockSize[0])
     nYBlocks = (int)((DimensionsCheck[1] + myBlockSize[1] - 1) / myBlockSize[1])
-    myBufSize = myBlockSize[0] * myBlockSize[1]
 
     if debug:
-        print(f"using blocksize {myBlockSize[0]} x {myBlockSize[1]}")
+        input_block_sizes = ", ".join(
+            "{} x {}".format(*band.GetBlockSize()) for band in myInputBands
+        )
+        output_block_size = "{} x {}".format(*myOut.GetRasterBand(1).GetBlockSize())
+        print(
+            f"input block sizes: {input_block_sizes}, output block size: {output_block_size}, "
+            f"GDAL_CACHEMAX: {gdal.GetCacheMax() // (1024 * 1024)} MB"
+        )
+        print(
+            f"blocks aligned on {myBlockPlan.aligned_xsize} x {myBlockPlan.aligned_ysize}, "
+            f"of at most {myBlockPlan.max_pixels} pixels"
+        )
+        print(
+            f"using blocksize {myBlockSize[0]} x {myBlockSize[1]} "
+            f"({nXBlocks} x {nYBlocks} blocks)"
+        )
 
     # variables for displaying progress
     ProgressCt = -1
@@ -486,19 +1237,29 @@ def Calc(
     ProgressEnd = nXBlocks * nYBlocks * allBandsCount
 
     ################################################################
-    # start looping through each band in allBandsCount
+    # list the blocks of data of each band in allBandsCount
     ################################################################
 
+    blocks = []
     for bandNo in range(1, allBandsCount + 1):
+        # loop through X-lines
+        for X in range(0, nXBlocks):
+            # find X offset, in case the blocks don't fit perfectly
+            # change the block size of the final piece
+            myX = X * myBlockSize[0]
+            nXValid = min(myBlockSize[0], DimensionsCheck[0] - myX)
 
-        ################################################################
-        # start looping through blocks of data
-        ################################################################
-
-        # store these numbers in variables that may change later
-        nXValid = myBlockSize[0]
-        nYValid = myBlockSize[1]
+            # loop through Y lines
+            for Y in range(0, nYBlocks):
+                myY = Y * myBlockSize[1]
+                nYValid = min(myBlockSize[1], DimensionsCheck[1] - myY)
+                blocks.append((bandNo, myX, myY, nXValid, nYValid))
 
+    # number and largest datatype of the files of each alpha given as a list of
+    # files, for each band
+    count_file_per_alpha_per_band = {}
+    largest_datatype_per_alpha_per_band = {}
+    for bandNo in range(1, allBandsCount + 1):
         count_file_per_alpha = {}
         largest_datatype_per_alpha = {}
         for i, Alpha in enumerate(myAlphaList):
@@ -518,135 +1279,212 @@ def Calc(
                         largest_datatype_per_alpha[Alpha] = gdal.DataTypeUnion(
                             largest_datatype_per_alpha[Alpha], band.DataType
                         )
+        count_file_per_alpha_per_band[bandNo] = count_file_per_alpha
+        largest_datatype_per_alpha_per_band[bandNo] = largest_datatype_per_alpha
+
+    # scratch buffers of read_block(), which is never called concurrently
+    read_buffers = {}
+
+    def get_read_buffer(name, shape, dtype):
+        buf = read_buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = read_buffers[name] = numpy.empty(shape, dtype)
+        return buf
+
+    # numpy type of the output, which can hold the output nodata value
+    myOutNumpyType = gdal_array.GDALTypeCodeToNumericTypeCode(myOutType)
+    # arrays of the namespace, that must not be modified if returned by a calc
+    namespace_array_ids = {
+        id(value)
+        for value in global_namespace.values()
+        if isinstance(value, numpy.ndarray)
+    }
 
-        # loop through X-lines
-        for X in range(0, nXBlocks):
-
-            # in case the blocks don't fit perfectly
-            # change the block size of the final piece
-            if X == nXBlocks - 1:
-                nXValid = DimensionsCheck[0] - X * myBlockSize[0]
-
-            # find X offset
-            myX = X * myBlockSize[0]
+    def read_block(block):
+        """Read the input arrays of a block, and the mask of its nodata cells"""
+        bandNo, myX, myY, nXValid, nYValid = block
+        count_file_per_alpha = count_file_per_alpha_per_band[bandNo]
+        largest_datatype_per_alpha = largest_datatype_per_alpha_per_band[bandNo]
+
+        # boolean buffer marking where nodata occurs, created by the first input
+        # with nodata
+        myNDVs = None
+
+        # make local namespace for calculation
+        local_namespace = {}
+
+        # Create destination numpy arrays for each alpha
+        numpy_arrays = {}
+        counter_per_alpha = {}
+        for Alpha in count_file_per_alpha:
+            dtype = gdal_array.GDALTypeCodeToNumericTypeCode(
+                largest_datatype_per_alpha[Alpha]
+            )
+            if count_file_per_alpha[Alpha] == 1:
+                numpy_arrays[Alpha] = numpy.empty((nYValid, nXValid), dtype=dtype)
+            else:
+                numpy_arrays[Alpha] = numpy.empty(
+                    (count_file_per_alpha[Alpha], nYValid, nXValid), dtype=dtype
+                )
+            counter_per_alpha[Alpha] = 0
 
-            # reset buffer size for start of Y loop
-            nYValid = myBlockSize[1]
-            myBufSize = nXValid * nYValid
+        # fetch data for each input layer
+        for i, Alpha in enumerate(myAlphaList):
 
-            # loop through Y lines
-            for Y in range(0, nYBlocks):
-                ProgressCt += 1
-                if 10 * ProgressCt / ProgressEnd % 10 != ProgressMk and not quiet:
-                    ProgressMk = 10 * ProgressCt / ProgressEnd % 10
-                    print("%d.." % (10 * ProgressMk), end=" ")
+            # populate lettered arrays with values
+            if allBandsIndex is not None and allBandsIndex == i:
+                myBandNo = bandNo
+            else:
+                myBandNo = myBands[i]
 
-                # change the block size of the final piece
-                if Y == nYBlocks - 1:
-                    nYValid = DimensionsCheck[1] - Y * myBlockSize[1]
-                    myBufSize = nXValid * nYValid
+            if Alpha in myAlphaFileLists:
+                if count_file_per_alpha[Alpha] == 1:
+                    buf_obj = numpy_arrays[Alpha]
+                else:
+                    buf_obj = numpy_arrays[Alpha][counter_per_alpha[Alpha]]
+                myval = gdal_array.BandReadAsArray(
+                    myFiles[i].GetRasterBand(myBandNo),
+                    xoff=myX,
+                    yoff=myY,
+                    win_xsize=nXValid,
+                    win_ysize=nYValid,
+                    buf_obj=buf_obj,
+                )
+                counter_per_alpha[Alpha] += 1
+            else:
+                myval = gdal_array.BandReadAsArray(
+                    myFiles[i].GetRasterBand(myBandNo),
+                    xoff=myX,
+                    yoff=myY,
+                    win_xsize=nXValid,
+                    win_ysize=nYValid,
+                )
+            if myval is None:
+                raise Exception(
+                    f"Input block reading failed from filename {myFileNames[i]}"
+                )
 
-                # find Y offset
-                myY = Y * myBlockSize[1]
+            # fill in nodata values
+            # a cell of myNDVs is True if there is NDV in any of the corresponding
+            # cells in input raster bands, or if they are masked by their mask band
+            is_nodata = None
+            if myNDV[i] is not None:
+                is_nodata = get_read_buffer("is_nodata", (nYValid, nXValid), bool)
+                if numpy.isnan(myNDV[i]):
+                    numpy.isnan(myval, out=is_nodata)
+                else:
+                    numpy.equal(myval, myNDV[i], out=is_nodata)
+            elif myUseMaskBand[i]:
+                band = myFiles[i].GetRasterBand(myBandNo)
+                if not band.GetMaskFlags() & gdal.GMF_ALL_VALID:
+                    mask = gdal_array.BandReadAsArray(
+                        band.GetMaskBand(),
+                        xoff=myX,
+                        yoff=myY,
+                        win_xsize=nXValid,
+                        win_ysize=nYValid,
+                        buf_obj=get_read_buffer(
+                            "mask", (nYValid, nXValid), numpy.uint8
+                        ),
+                    )
+                    if mask is None:
+                        raise Exception(
+                            f"Mask block reading failed from filename {myFileNames[i]}"
+                        )
+                    is_nodata = get_read_buffer("is_nodata", (nYValid, nXValid), bool)
+                    numpy.equal(mask, 0, out=is_nodata)
+            if is_nodata is not None:
+                if myNDVs is None:
+                    myNDVs = is_nodata.copy()
+                else:
+                    numpy.logical_or(myNDVs, is_nodata, out=myNDVs)
 
-                # create empty buffer to mark where nodata occurs
-                myNDVs = None
+            # add an array of values for this block to the eval namespace
+            if Alpha not in myAlphaFileLists:
+                local_namespace[Alpha] = myval
+            myval = None
 
-                # make local namespace for calculation
-                local_namespace = {}
+        for lst in myAlphaFileLists:
+            local_namespace[lst] = numpy_arrays[lst]
 
-                # Create destination numpy arrays for each alpha
-                numpy_arrays = {}
-                counter_per_alpha = {}
-                for Alpha in count_file_per_alpha:
-                    dtype = gdal_array.GDALTypeCodeToNumericTypeCode(
-                        largest_datatype_per_alpha[Alpha]
-                    )
-                    if count_file_per_alpha[Alpha] == 1:
-                        numpy_arrays[Alpha] = numpy.empty(
-                            (nYValid, nXValid), dtype=dtype
-                        )
-                    else:
-                        numpy_arrays[Alpha] = numpy.empty(
-                            (count_file_per_alpha[Alpha], nYValid, nXValid), dtype=dtype
-                        )
-                    counter_per_alpha[Alpha] = 0
+        return local_namespace, myNDVs
 
-                # fetch data for each input layer
-                for i, Alpha in enumerate(myAlphaList):
+    def calc_block(block, local_namespace, myNDVs):
+        """Evaluate the calculation on the input arrays of a block"""
+        bandNo, myX, myY, nXValid, nYValid = block
 
-                    # populate lettered arrays with values
-                    if allBandsIndex is not None and allBandsIndex == i:
-                        myBandNo = bandNo
-                    else:
-                        myBandNo = myBands[i]
+        # try the calculation on the array blocks
+        this_calc = calc_expressions[bandNo - 1 if len(calc) > 1 else 0]
+        try:
+            myResult = this_calc.evaluate(local_namespace)
+        except Exception:
+            print(f"evaluation of calculation {this_calc.calc} failed")
+            raise
+
+        # Propagate nodata values (set the output nodata value in the nodata
+        # cells), in place when the result is an array owned by this block
+        if myNDVs is not None and myOutNDV is not None:
+            dtype = numpy.result_type(myResult, myOutNumpyType)
+            if not (
+                isinstance(myResult, numpy.ndarray)
+                and myResult.dtype == dtype
+                and myResult.shape == myNDVs.shape
+                and myResult.flags.writeable
+                and myResult.flags.owndata
+                and id(myResult) not in namespace_array_ids
+            ):
+                result = numpy.empty(myNDVs.shape, dtype)
+                numpy.copyto(result, myResult)
+                myResult = result
+            numpy.copyto(myResult, myOutNDV, casting="unsafe", where=myNDVs)
+        elif not isinstance(myResult, numpy.ndarray):
+            myResult = numpy.ones((nYValid, nXValid)) * myResult
+
+        return myResult
+
+    def read_and_calc_block(block):
+        return calc_block(block, *read_block(block))
+
+    def write_block(block, myResult):
+        """Write the result of a block to the output file"""
+        bandNo, myX, myY, nXValid, nYValid = block
+
+        # write data block to the output file
+        myOutB = myOut.GetRasterBand(bandNo)
+        if gdal_array.BandWriteArray(myOutB, myResult, xoff=myX, yoff=myY) != 0:
+            raise Exception("Block writing failed")
+        myOutB = None  # write to band
+
+    if (
+        threads
+        and outfile
+        and any(
+            filename is not None
+            and os.path.abspath(filename) == os.path.abspath(outfile)
+            for filename in myFileNames
+        )
+    ):
+        # The output file would be written while being read by another thread
+        if debug:
+            print("output file is also an input file: not using threads")
+        threads = None
 
-                    if Alpha in myAlphaFileLists:
-                        if count_file_per_alpha[Alpha] == 1:
-                            buf_obj = numpy_arrays[Alpha]
-                        else:
-                            buf_obj = numpy_arrays[Alpha][counter_per_alpha[Alpha]]
-                        myval = gdal_array.BandReadAsArray(
-                            myFiles[i].GetRasterBand(myBandNo),
-                            xoff=myX,
-                            yoff=myY,
-                            win_xsize=nXValid,
-                            win_ysize=nYValid,
-                            buf_obj=buf_obj,
-                        )
-                        counter_per_alpha[Alpha] += 1
-                    else:
-                        myval = gdal_array.BandReadAsArray(
-                            myFiles[i].GetRasterBand(myBandNo),
-                            xoff=myX,
-                            yoff=myY,
-                            win_xsize=nXValid,
-                            win_ysize=nYValid,
-                        )
-                    if myval is None:
-                        raise Exception(
-                            f"Input block reading failed from filename {filename[i]}"
-                        )
+    if threads:
+        results = calc_blocks_pipeline(blocks, read_block, calc_block, threads)
+    else:
+        results = ((block, read_and_calc_block(block)) for block in blocks)
 
-                    # fill in nodata values
-                    if myNDV[i] is not None:
-                        # myNDVs is a boolean buffer.
-                        # a cell equals to 1 if there is NDV in any of the corresponding cells in input raster bands.
-                        if myNDVs is None:
-                            # this is the first band that has NDV set. we initializes myNDVs to a zero buffer
-                            # as we didn't see any NDV value yet.
-                            myNDVs = numpy.zeros(myBufSize)
-                            myNDVs.shape = (nYValid, nXValid)
-                        myNDVs = 1 * numpy.logical_or(myNDVs == 1, myval == myNDV[i])
-
-                    # add an array of values for this block to the eval namespace
-                    if Alpha not in myAlphaFileLists:
-                        local_namespace[Alpha] = myval
-                    myval = None
-
-                for lst in myAlphaFileLists:
-                    local_namespace[lst] = numpy_arrays[lst]
-
-                # try the calculation on the array blocks
-                this_calc = calc[bandNo - 1 if len(calc) > 1 else 0]
-                try:
-                    myResult = eval(this_calc, global_namespace, local_namespace)
-                except Exception:
-                    print(f"evaluation of calculation {this_calc} failed")
-                    raise
+    ################################################################
+    # write the blocks in order
+    ################################################################
 
-                # Propagate nodata values (set nodata cells to zero
-                # then add nodata value to these cells).
-                if myNDVs is not None and myOutNDV is not None:
-                    myResult = ((1 * (myNDVs == 0)) * myResult) + (myOutNDV * myNDVs)
-                elif not isinstance(myResult, numpy.ndarray):
-                    myResult = numpy.ones((nYValid, nXValid)) * myResult
+    for block, myResult in results:
+        ProgressCt += 1
+        if 10 * ProgressCt / ProgressEnd % 10 != ProgressMk and not quiet:
+            ProgressMk = 10 * ProgressCt / ProgressEnd % 10
+            print("%d.." % (10 * ProgressMk), end=" ")
 
-                # write data block to the output file
-                myOutB = myOut.GetRasterBand(bandNo)
-                if gdal_array.BandWriteArray(myOutB, myResult, xoff=myX, yoff=myY) != 0:
-                    raise Exception("Block writing failed")
-                myOutB = None  # write to band
+        write_block(block, myResult)
 
     # remove temp files
     for idx, tempFile in enumerate(myTempFileNames):
@@ -785,6 +1623,13 @@ class GDALCalc(GDALScript):
             action="store_true",
             help="ignores the NoDataValues of the input rasters",
         )
+        parser.add_argument(
+            "--use-mask-band",
+            dest="use_mask_band",
+            action="store_true",
+            help="use the mask band (e.g. alpha band) of the input rasters that do "
+            "not have a NoDataValue to find their nodata cells",
+        )
         parser.add_argument(
             "--type",
             dest="type",
@@ -842,6 +1687,32 @@ class GDALCalc(GDALScript):
             "--color-table", type=str, dest="color_table", help="color table file name"
         )
 
+        parser.add_argument(
+            "--evaluator",
+            dest="evaluator",
+            choices=CalcEvaluators,
+            default="auto",
+            help="how to evaluate the calculation: with numexpr (when installed and "
+            "giving the same results as numpy), numexpr or numpy",
+        )
+
+        parser.add_argument(
+            "--threads",
+            dest="threads",
+            type=int,
+            metavar="n",
+            help="evaluate the calculation in n threads, while the next blocks are "
+            "read and the previous ones written",
+        )
+
+        parser.add_argument(
+            "--lazy",
+            dest="lazy",
+            action="store_true",
+            help="with the VRT format, write a VRT evaluating the calculation "
+            "with a Python pixel function when it is read, instead of computing it",
+        )
+
         group = parser.add_mutually_exclusive_group()
         group.add_argument(
             "--extent",
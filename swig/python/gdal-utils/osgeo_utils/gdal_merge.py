@@ -30,15 +30,31 @@
 # building the stack.
 # anssi.pekkarinen@fao.org
 
+import collections
+import concurrent.futures
+import json
 import math
 import sys
+import threading
 import time
 
 from osgeo import gdal
 from osgeo_utils.auxiliary.util import GetOutputDriverFor
 
+try:
+    import numpy as np
+
+    from osgeo import gdal_array
+
+    numpy_available = True
+except ImportError:
+    numpy_available = False
+
 progress = gdal.TermProgress_nocb
 
+# largest number of pixels of the windows in which the target file is processed
+MERGE_WINDOW_MAX_PIXELS = 4 * 1024 * 1024
+
 __version__ = "$id$"[5:-1]
 
 
@@ -139,24 +155,18 @@ def raster_copy_with_nodata(
     t_band_n,
     nodata,
 ):
-    import numpy as np
-
-    s_band = s_fh.GetRasterBand(s_band_n)
-    t_band = t_fh.GetRasterBand(t_band_n)
-
-    data_src = s_band.ReadAsArray(s_xoff, s_yoff, s_xsize, s_ysize, t_xsize, t_ysize)
-    data_dst = t_band.ReadAsArray(t_xoff, t_yoff, t_xsize, t_ysize)
-
-    if not np.isnan(nodata):
-        nodata_test = np.equal(data_src, nodata)
-    else:
-        nodata_test = np.isnan(data_src)
-
-    to_write = np.choose(nodata_test, (data_src, data_dst))
-
-    t_band.WriteArray(to_write, t_xoff, t_yoff)
-
-    return 0
+    def get_valid(data_src, s_window):
+        if not np.isnan(nodata):
+            return np.not_equal(data_src, nodata)
+        return np.logical_not(np.isnan(data_src))
+
+    return raster_copy_valid_chunks(
+        s_fh.GetRasterBand(s_band_n),
+        (s_xoff, s_yoff, s_xsize, s_ysize),
+        t_fh.GetRasterBand(t_band_n),
+        (t_xoff, t_yoff, t_xsize, t_ysize),
+        get_valid,
+    )
 
 
 # =============================================================================
@@ -177,19 +187,77 @@ def raster_copy_with_mask(
     t_band_n,
     m_band,
 ):
-    import numpy as np
-
     s_band = s_fh.GetRasterBand(s_band_n)
-    t_band = t_fh.GetRasterBand(t_band_n)
 
-    data_src = s_band.ReadAsArray(s_xoff, s_yoff, s_xsize, s_ysize, t_xsize, t_ysize)
-    data_mask = m_band.ReadAsArray(s_xoff, s_yoff, s_xsize, s_ysize, t_xsize, t_ysize)
-    data_dst = t_band.ReadAsArray(t_xoff, t_yoff, t_xsize, t_ysize)
+    def get_valid(data_src, s_window):
+        if m_band is s_band:
+            data_mask = data_src
+        else:
+            data_mask = m_band.ReadAsArray(*s_window, *data_src.shape[::-1])
+        return np.not_equal(data_mask, 0)
+
+    return raster_copy_valid_chunks(
+        s_band,
+        (s_xoff, s_yoff, s_xsize, s_ysize),
+        t_fh.GetRasterBand(t_band_n),
+        (t_xoff, t_yoff, t_xsize, t_ysize),
+        get_valid,
+    )
+
+
+# =============================================================================
+
+
+def raster_copy_valid_chunks(s_band, s_window, t_band, t_window, get_valid):
+    """
+    Copy the valid pixels of a source window into a target window, in chunks
+    of whole rows of target blocks.
 
-    mask_test = np.equal(data_mask, 0)
-    to_write = np.choose(mask_test, (data_src, data_dst))
+    get_valid -- function returning the mask of the valid pixels of data read
+    from a source window, given the data and the window.
 
-    t_band.WriteArray(to_write, t_xoff, t_yoff)
+    The target is only read for the chunks with invalid source pixels, into
+    a buffer reused by the next chunks.
+    """
+    s_xoff, s_yoff, s_xsize, s_ysize = s_window
+    t_xoff, t_yoff, t_xsize, t_ysize = t_window
+
+    block_ysize = t_band.GetBlockSize()[1]
+    chunk_ysize = block_ysize * max(
+        1, MERGE_WINDOW_MAX_PIXELS // (t_xsize * block_ysize)
+    )
+    t_dtype = gdal_array.GDALTypeCodeToNumericTypeCode(t_band.DataType)
+    data_dst_buffer = None
+
+    t_y0 = t_yoff
+    while t_y0 < t_yoff + t_ysize:
+        # chunks end on rows of target blocks
+        t_y1 = min(t_yoff + t_ysize, (t_y0 // chunk_ysize + 1) * chunk_ysize)
+        s_y0 = s_yoff + (t_y0 - t_yoff) * s_ysize / t_ysize
+        s_y1 = s_yoff + (t_y1 - t_yoff) * s_ysize / t_ysize
+        s_chunk = (s_xoff, s_y0, s_xsize, s_y1 - s_y0)
+
+        data_src = s_band.ReadAsArray(*s_chunk, t_xsize, t_y1 - t_y0)
+        valid = get_valid(data_src, s_chunk)
+        if valid.all():
+            t_band.WriteArray(data_src, t_xoff, t_y0)
+        else:
+            # composite in a type holding the values of the target and the
+            # source, converted to the target type by GDAL when writing
+            dtype = np.result_type(data_src, t_dtype)
+            if data_dst_buffer is None or data_dst_buffer.dtype != dtype:
+                data_dst_buffer = np.empty((chunk_ysize, t_xsize), dtype)
+            data_dst = t_band.ReadAsArray(
+                t_xoff,
+                t_y0,
+                t_xsize,
+                t_y1 - t_y0,
+                buf_obj=data_dst_buffer[: t_y1 - t_y0],
+            )
+            np.copyto(data_dst, data_src, where=valid)
+            t_band.WriteArray(data_dst, t_xoff, t_y0)
+
+        t_y0 = t_y1
 
     return 0
 
@@ -197,21 +265,506 @@ def raster_copy_with_mask(
 # =============================================================================
 
 
-def names_to_fileinfos(names):
+class footprint_index(object):
+    """
+    Spatial index of the footprints of the source files on the grid of the
+    windows in which the target file is processed.
+    """
+
+    def __init__(self, footprints, win_xsize, win_ysize):
+        """
+        footprints -- list of (xoff, yoff, xsize, ysize) target windows of the
+        source files, or None for the files not overlapping the target file.
+
+        win_xsize, win_ysize -- size of the windows of the grid.
+        """
+        self.cells = {}
+        self.last_rows = {}
+        for i, footprint in enumerate(footprints):
+            if footprint is None:
+                continue
+            xoff, yoff, xsize, ysize = footprint
+            first_col, last_col = xoff // win_xsize, (xoff + xsize - 1) // win_xsize
+            first_row, last_row = yoff // win_ysize, (yoff + ysize - 1) // win_ysize
+            for row in range(first_row, last_row + 1):
+                for col in range(first_col, last_col + 1):
+                    self.cells.setdefault((col, row), []).append(i)
+            self.last_rows.setdefault(last_row, []).append(i)
+
+    def query(self, col, row):
+        """Return the indices of the files overlapping a window, in order."""
+        return self.cells.get((col, row), [])
+
+    def ending_at(self, row):
+        """Return the indices of the files overlapping no window after a row."""
+        return self.last_rows.get(row, [])
+
+
+# =============================================================================
+
+
+def get_merge_window_size(t_fh, max_pixels=MERGE_WINDOW_MAX_PIXELS):
+    """
+    Return the size of the windows in which the target file is processed:
+    whole blocks, and whole rows of blocks when they fit in max_pixels.
+    """
+    xsize = t_fh.RasterXSize
+    ysize = t_fh.RasterYSize
+    block_xsize, block_ysize = t_fh.GetRasterBand(1).GetBlockSize()
+    block_xsize = min(block_xsize, xsize)
+    block_ysize = min(block_ysize, ysize)
+    if xsize * block_ysize <= max_pixels:
+        rows = max(1, max_pixels // (xsize * block_ysize))
+        return xsize, min(ysize, rows * block_ysize)
+    cols = max(1, max_pixels // (block_xsize * block_ysize))
+    return min(xsize, cols * block_xsize), block_ysize
+
+
+def get_alpha_band_number(s_fh):
+    """
+    Return the number of the alpha band GDAL uses as the mask of the other
+    bands of a dataset (the last of 2 or 4 bands, of Byte type), or None.
+    """
+    if s_fh.RasterCount not in (2, 4):
+        return None
+    alpha_band = s_fh.GetRasterBand(s_fh.RasterCount)
+    if (
+        alpha_band.GetColorInterpretation() != gdal.GCI_AlphaBand
+        or alpha_band.DataType != gdal.GDT_Byte
+    ):
+        return None
+    return s_fh.RasterCount
+
+
+def read_source_bands(s_fh, s_band_ns, s_window, buf_xsize, buf_ysize, nodata=None):
+    """
+    Read a window of bands of a source file, with the masks of their valid
+    pixels.
+
+    The bands, and the alpha band holding their mask if any, are read with a
+    single multi-band request. The masks of bands with a nodata value are
+    computed from their data, and the other mask bands are read separately.
+
+    Returns a list of (data, mask of the valid pixels or None if they are all
+    valid) for each band.
+    """
+    read_band_ns = list(s_band_ns)
+    masks = []
+    for s_band_n in s_band_ns:
+        s_band = s_fh.GetRasterBand(s_band_n)
+        if nodata is not None:
+            masks.append(("nodata", nodata))
+            continue
+        # Works only in binary mode and doesn't take into account
+        # intermediate transparency values for compositing.
+        flags = s_band.GetMaskFlags()
+        if flags == gdal.GMF_ALL_VALID:
+            if s_band.GetColorInterpretation() == gdal.GCI_AlphaBand:
+                masks.append(("band", s_band_n))
+            else:
+                masks.append(None)
+        elif (
+            flags == gdal.GMF_ALPHA | gdal.GMF_PER_DATASET
+            and get_alpha_band_number(s_fh) is not None
+        ):
+            alpha_band_n = get_alpha_band_number(s_fh)
+            if alpha_band_n not in read_band_ns:
+                read_band_ns.append(alpha_band_n)
+            masks.append(("band", alpha_band_n))
+        elif flags == gdal.GMF_NODATA and np.issubdtype(
+            gdal_array.GDALTypeCodeToNumericTypeCode(s_band.DataType), np.integer
+        ):
+            masks.append(("nodata", s_band.GetNoDataValue()))
+        else:
+            masks.append(("mask", s_band))
+
+    buf_type = s_fh.GetRasterBand(read_band_ns[0]).DataType
+    for s_band_n in read_band_ns[1:]:
+        data_type = s_fh.GetRasterBand(s_band_n).DataType
+        if hasattr(gdal, "DataTypeUnion"):
+            buf_type = gdal.DataTypeUnion(buf_type, data_type)
+        elif data_type != buf_type:
+            buf_type = gdal.GDT_Float64
+    data = s_fh.ReadAsArray(
+        *s_window,
+        buf_xsize=buf_xsize,
+        buf_ysize=buf_ysize,
+        buf_type=buf_type,
+        band_list=read_band_ns,
+    )
+    if data.ndim == 2:
+        data = data[np.newaxis]
+
+    result = []
+    per_dataset_mask = None
+    for k, mask in enumerate(masks):
+        if mask is None:
+            valid = None
+        elif mask[0] == "nodata":
+            if not np.isnan(mask[1]):
+                valid = np.not_equal(data[k], mask[1])
+            else:
+                valid = np.logical_not(np.isnan(data[k]))
+        elif mask[0] == "band":
+            valid = np.not_equal(data[read_band_ns.index(mask[1])], 0)
+        else:
+            s_band = mask[1]
+            is_per_dataset = s_band.GetMaskFlags() & gdal.GMF_PER_DATASET
+            if is_per_dataset and per_dataset_mask is not None:
+                valid = per_dataset_mask
+            else:
+                data_mask = s_band.GetMaskBand().ReadAsArray(
+                    *s_window, buf_xsize, buf_ysize
+                )
+                valid = np.not_equal(data_mask, 0)
+                if is_per_dataset:
+                    per_dataset_mask = valid
+        result.append((data[k], valid))
+    return result
+
+
+def composite_window(xsize, ysize, xoff, yoff, t_dtypes, sources, verbose=0):
+    """
+    Composite the sources overlapping a window of target bands.
+
+    The sources are read from the highest to the lowest priority, and only
+    where the window is not already filled by valid pixels of a source with
+    a higher priority, until it is filled.
+
+    t_dtypes -- dictionary of the numpy types of the target bands.
+
+    sources -- list of (function reading bands of a source, {target band
+    number: source band number}, (source window, target window)) from the
+    lowest to the highest priority. The function is called like
+    read_source_bands() without its first argument.
+
+    Returns a list of (target band number, composited array, mask of the
+    pixels not filled by any source or None), for the target bands where at
+    least one source pixel is valid.
+    """
+    results = {}
+    for read_bands, t_to_s_bands, (s_window, t_window) in reversed(sources):
+        sw_xoff, sw_yoff, sw_xsize, sw_ysize = s_window
+        tw_xoff, tw_yoff, tw_xsize, tw_ysize = t_window
+
+        # part of the window covered by the source, in target pixels
+        t_x0 = max(xoff, tw_xoff)
+        t_x1 = min(xoff + xsize, tw_xoff + tw_xsize)
+        t_y0 = max(yoff, tw_yoff)
+        t_y1 = min(yoff + ysize, tw_yoff + tw_ysize)
+        if t_x0 >= t_x1 or t_y0 >= t_y1:
+            continue
+
+        t_band_ns = [
+            t_band_n
+            for t_band_n in t_to_s_bands
+            if t_band_n not in results or results[t_band_n][2] < xsize * ysize
+        ]
+        if not t_band_ns:
+            continue
+
+        # and in source pixels, which are fractional when resampling
+        s_x0 = sw_xoff + (t_x0 - tw_xoff) * sw_xsize / tw_xsize
+        s_x1 = sw_xoff + (t_x1 - tw_xoff) * sw_xsize / tw_xsize
+        s_y0 = sw_yoff + (t_y0 - tw_yoff) * sw_ysize / tw_ysize
+        s_y1 = sw_yoff + (t_y1 - tw_yoff) * sw_ysize / tw_ysize
+        s_sub_window = (s_x0, s_y0, s_x1 - s_x0, s_y1 - s_y0)
+
+        if verbose != 0:
+            print(
+                "Copy %g,%g,%g,%g to %d,%d,%d,%d."
+                % (*s_sub_window, t_x0, t_y0, t_x1 - t_x0, t_y1 - t_y0)
+            )
+
+        bands_data = read_bands(
+            [t_to_s_bands[t_band_n] for t_band_n in t_band_ns],
+            s_sub_window,
+            t_x1 - t_x0,
+            t_y1 - t_y0,
+        )
+        region = (slice(t_y0 - yoff, t_y1 - yoff), slice(t_x0 - xoff, t_x1 - xoff))
+        for t_band_n, (data_src, valid) in zip(t_band_ns, bands_data):
+            if t_band_n not in results:
+                # composite in a type holding the values of the target and
+                # the sources, converted to the target type by GDAL when
+                # writing
+                data = np.empty(
+                    (ysize, xsize), np.result_type(data_src, t_dtypes[t_band_n])
+                )
+                filled = np.zeros((ysize, xsize), bool)
+                results[t_band_n] = [data, filled, 0]
+            data, filled, filled_count = results[t_band_n]
+            if not np.can_cast(data_src.dtype, data.dtype):
+                data = data.astype(np.result_type(data_src, data))
+                results[t_band_n][0] = data
+
+            to_fill = np.logical_not(filled[region])
+            if valid is not None:
+                np.logical_and(to_fill, valid, out=to_fill)
+            np.copyto(data[region], data_src, where=to_fill)
+            np.logical_or(filled[region], to_fill, out=filled[region])
+            results[t_band_n][2] = filled_count + np.count_nonzero(to_fill)
+
+    composited = []
+    for t_band_n in sorted(results):
+        data, filled, filled_count = results[t_band_n]
+        if filled_count == 0:
+            continue
+        unfilled = None
+        if filled_count < xsize * ysize:
+            unfilled = np.logical_not(filled, out=filled)
+        composited.append((t_band_n, data, unfilled))
+    return composited
+
+
+def merge_by_blocks(
+    t_fh,
+    file_infos,
+    band_sources,
+    nodata=None,
+    verbose=0,
+    progress_cb=None,
+    threads=None,
+):
+    """
+    Copy source files into a target file, walking the blocks of the target
+    file in order.
+
+    Each window of target blocks is written once, with the sources
+    overlapping it, found with a footprint_index, composited in priority
+    order, and is only read where no source pixel is valid. Unlike copying
+    the files one after another, this does not rewrite (and recompress)
+    blocks of the target file again and again.
+
+    t_fh -- gdal.Dataset object of the target file.
+
+    file_infos -- list of file_info objects of the source files.
+
+    band_sources -- list, for each target band, of the (index in file_infos,
+    source band number) to copy into it, from the lowest to the highest
+    priority.
+
+    progress_cb -- function called with the completed fraction.
+
+    threads -- number of threads compositing windows. The target file is
+    only read and written by the calling thread, in order, while the sources
+    are read by the threads with their own datasets.
+    """
+    xsize = t_fh.RasterXSize
+    ysize = t_fh.RasterYSize
+    win_xsize, win_ysize = get_merge_window_size(t_fh)
+    ncols = (xsize + win_xsize - 1) // win_xsize
+    nrows = (ysize + win_ysize - 1) // win_ysize
+
+    t_geotransform = t_fh.GetGeoTransform()
+    windows = [fi.get_copy_windows(t_geotransform, xsize, ysize) for fi in file_infos]
+    index = footprint_index(
+        [w[1] if w is not None else None for w in windows], win_xsize, win_ysize
+    )
+    if verbose != 0:
+        print(
+            "Processing %d x %d windows of %d x %d."
+            % (ncols, nrows, win_xsize, win_ysize)
+        )
+
+    # the source files are opened once per thread, and closed after their
+    # last window
+    s_fhs = {}
+
+    def get_source(i):
+        key = (threading.get_ident(), i)
+        s_fh = s_fhs.get(key)
+        if s_fh is None:
+            s_fh = gdal.Open(file_infos[i].filename)
+            s_fhs[key] = s_fh
+        return s_fh
+
+    # the target bands each source is copied into
+    source_bands = [{} for _ in file_infos]
+    for t_band_n, t_band_sources in enumerate(band_sources, start=1):
+        for i, s_band_n in t_band_sources:
+            source_bands[i][t_band_n] = s_band_n
+    t_dtypes = {
+        t_band_n: gdal_array.GDALTypeCodeToNumericTypeCode(
+            t_fh.GetRasterBand(t_band_n).DataType
+        )
+        for t_band_n in range(1, t_fh.RasterCount + 1)
+    }
+
+    def get_window(col, row):
+        xoff = col * win_xsize
+        yoff = row * win_ysize
+        return xoff, yoff, min(win_xsize, xsize - xoff), min(win_ysize, ysize - yoff)
+
+    def composite(col, row):
+        """Composite the sources of the target bands of a window"""
+        xoff, yoff, w_xsize, w_ysize = get_window(col, row)
+
+        def source_reader(i):
+            def read_bands(*args):
+                return read_source_bands(get_source(i), *args, nodata=nodata)
+
+            return read_bands
+
+        sources = [
+            (source_reader(i), source_bands[i], windows[i])
+            for i in index.query(col, row)
+            if source_bands[i]
+        ]
+        return composite_window(
+            w_xsize, w_ysize, xoff, yoff, t_dtypes, sources, verbose
+        )
+
+    def write_window(col, row, composited):
+        """
+        Write a window, reading the target bands only where no source pixel
+        is valid
+        """
+        xoff, yoff, w_xsize, w_ysize = get_window(col, row)
+        for t_band_n, data, unfilled in composited:
+            t_band = t_fh.GetRasterBand(t_band_n)
+            if unfilled is not None:
+                data_dst = t_band.ReadAsArray(xoff, yoff, w_xsize, w_ysize)
+                np.copyto(data, data_dst, where=unfilled)
+            t_band.WriteArray(data, xoff, yoff)
+
+    def close_sources(row):
+        for i in index.ending_at(row):
+            for key in list(s_fhs):
+                if key[1] == i:
+                    s_fhs.pop(key, None)
+
+    window_count = 0
+
+    def window_done():
+        nonlocal window_count
+        window_count += 1
+        if progress_cb is not None:
+            progress_cb(window_count / float(nrows * ncols))
+
+    if not threads:
+        for row in range(nrows):
+            for col in range(ncols):
+                if index.query(col, row):
+                    write_window(col, row, composite(col, row))
+                window_done()
+            close_sources(row)
+        return 1
+
+    # the windows are composited by the threads, and written in order by this
+    # thread, with a bounded number of windows in memory
+    with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+        pending = collections.deque()
+
+        def write_next():
+            col, row, future = pending.popleft()
+            if future is not None:
+                write_window(col, row, future.result())
+            window_done()
+            if col == ncols - 1:
+                close_sources(row)
+
+        try:
+            for row in range(nrows):
+                for col in range(ncols):
+                    future = None
+                    if index.query(col, row):
+                        future = executor.submit(composite, col, row)
+                    pending.append((col, row, future))
+                    if len(pending) >= 2 * threads:
+                        write_next()
+            while pending:
+                write_next()
+        finally:
+            for _, _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+    s_fhs.clear()
+    return 1
+
+
+# =============================================================================
+
+
+def get_file_stamp(filename):
+    """Return the [modification time, size] of a file, or None"""
+    stat = gdal.VSIStatL(filename)
+    if stat is None:
+        return None
+    return [stat.mtime, stat.size]
+
+
+def load_footprint_cache(cache_filename):
+    """
+    Load a footprint cache, a JSON file mapping file names to the
+    information of their file_info object and the stamp of the file it was
+    read from.
+    """
+    try:
+        with open(cache_filename) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != 1:
+        return {}
+    return cache.get("files", {})
+
+
+def save_footprint_cache(cache_filename, files):
+    with open(cache_filename, "w") as f:
+        json.dump({"version": 1, "files": files}, f)
+
+
+def names_to_fileinfos(names, threads=None, cache_filename=None):
     """
     Translate a list of GDAL filenames, into file_info objects.
 
     names -- list of valid GDAL dataset names.
 
+    threads -- number of threads opening the files.
+
+    cache_filename -- name of a JSON footprint cache, where the information
+    on the files is read from when they have not changed (same modification
+    time and size), and saved to.
+
     Returns a list of file_info objects.  There may be less file_info objects
     than names if some of the names could not be opened as GDAL files.
     """
 
-    file_infos = []
-    for name in names:
+    cache = load_footprint_cache(cache_filename) if cache_filename else None
+
+    def scan(name):
         fi = file_info()
-        if fi.init_from_name(name) == 1:
-            file_infos.append(fi)
+        stamp = None
+        if cache is not None:
+            stamp = get_file_stamp(name)
+            entry = cache.get(name)
+            if stamp is not None and entry is not None and entry["stamp"] == stamp:
+                fi.init_from_dict(name, entry["info"])
+                return fi, None
+        if fi.init_from_name(name) != 1:
+            return None, None
+        return fi, stamp
+
+    if threads:
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            results = list(executor.map(scan, names))
+    else:
+        results = [scan(name) for name in names]
+
+    file_infos = []
+    cache_changed = False
+    for fi, stamp in results:
+        if fi is None:
+            continue
+        file_infos.append(fi)
+        if stamp is not None:
+            cache[fi.filename] = {"stamp": stamp, "info": fi.to_dict()}
+            cache_changed = True
+
+    if cache_changed:
+        save_footprint_cache(cache_filename, cache)
 
     return file_infos
 
@@ -255,10 +808,7 @@ class file_info(object):
         self.band_type = fh.GetRasterBand(1).DataType
         self.projection = fh.GetProjection()
         self.geotransform = fh.GetGeoTransform()
-        self.ulx = self.geotransform[0]
-        self.uly = self.geotransform[3]
-        self.lrx = self.ulx + self.geotransform[1] * self.xsize
-        self.lry = self.uly + self.geotransform[5] * self.ysize
+        self.update_corners()
 
         ct = fh.GetRasterBand(1).GetRasterColorTable()
         if ct is not None:
@@ -268,35 +818,72 @@ class file_info(object):
 
         return 1
 
+    def init_from_dict(self, filename, info):
+        """
+        Initialize file_info from a dictionary returned by to_dict()
+
+        filename -- Name of the file the dictionary was computed from.
+        """
+        self.filename = filename
+        self.bands = info["bands"]
+        self.xsize = info["xsize"]
+        self.ysize = info["ysize"]
+        self.band_type = info["band_type"]
+        self.projection = info["projection"]
+        self.geotransform = tuple(info["geotransform"])
+        self.update_corners()
+
+        if info["ct"] is not None:
+            self.ct = gdal.ColorTable()
+            for i, entry in enumerate(info["ct"]):
+                self.ct.SetColorEntry(i, tuple(entry))
+        else:
+            self.ct = None
+
+    def to_dict(self):
+        """Return the information on the file as a JSON serializable dictionary"""
+        ct = None
+        if self.ct is not None:
+            ct = [list(self.ct.GetColorEntry(i)) for i in range(self.ct.GetCount())]
+        return {
+            "bands": self.bands,
+            "xsize": self.xsize,
+            "ysize": self.ysize,
+            "band_type": self.band_type,
+            "projection": self.projection,
+            "geotransform": list(self.geotransform),
+            "ct": ct,
+        }
+
+    def update_corners(self):
+        self.ulx = self.geotransform[0]
+        self.uly = self.geotransform[3]
+        self.lrx = self.ulx + self.geotransform[1] * self.xsize
+        self.lry = self.uly + self.geotransform[5] * self.ysize
+
     def report(self):
         print("Filename: " + self.filename)
         print("File Size: %dx%dx%d" % (self.xsize, self.ysize, self.bands))
         print("Pixel Size: %f x %f" % (self.geotransform[1], self.geotransform[5]))
         print("UL:(%f,%f)   LR:(%f,%f)" % (self.ulx, self.uly, self.lrx, self.lry))
 
-    def copy_into(self, t_fh, s_band=1, t_band=1, nodata_arg=None, verbose=0):
+    def get_copy_windows(self, t_geotransform, t_xsize, t_ysize):
         """
-        Copy this files image into target file.
+        Compute the windows of this file and of a target file covering their
+        common area.
 
-        This method will compute the overlap area of the file_info objects
-        file, and the target gdal.Dataset object, and copy the image data
-        for the common window area.  It is assumed that the files are in
-        a compatible projection ... no checking or warping is done.  However,
-        if the destination file is a different resolution, or different
-        image pixel type, the appropriate resampling and conversions will
-        be done (using normal GDAL promotion/demotion rules).
+        t_geotransform -- geotransform of the target file.
 
-        t_fh -- gdal.Dataset object for the file into which some or all
-        of this file may be copied.
+        t_xsize, t_ysize -- size of the target file in pixels.
 
-        Returns 1 on success (or if nothing needs to be copied), and zero one
-        failure.
+        Returns a ((xoff, yoff, xsize, ysize) source window,
+        (xoff, yoff, xsize, ysize) target window) tuple, or None if the files
+        do not intersect.
         """
-        t_geotransform = t_fh.GetGeoTransform()
         t_ulx = t_geotransform[0]
         t_uly = t_geotransform[3]
-        t_lrx = t_geotransform[0] + t_fh.RasterXSize * t_geotransform[1]
-        t_lry = t_geotransform[3] + t_fh.RasterYSize * t_geotransform[5]
+        t_lrx = t_geotransform[0] + t_xsize * t_geotransform[1]
+        t_lry = t_geotransform[3] + t_ysize * t_geotransform[5]
 
         # figure out intersection region
         tgw_ulx = max(t_ulx, self.ulx)
@@ -310,11 +897,11 @@ class file_info(object):
 
         # do they even intersect?
         if tgw_ulx >= tgw_lrx:
-            return 1
+            return None
         if t_geotransform[5] < 0 and tgw_uly <= tgw_lry:
-            return 1
+            return None
         if t_geotransform[5] > 0 and tgw_uly >= tgw_lry:
-            return 1
+            return None
 
         # compute target window in pixel coordinates.
         tw_xoff = int((tgw_ulx - t_geotransform[0]) / t_geotransform[1] + 0.1)
@@ -327,7 +914,7 @@ class file_info(object):
         )
 
         if tw_xsize < 1 or tw_ysize < 1:
-            return 1
+            return None
 
         # Compute source window in pixel coordinates.
         sw_xoff = int((tgw_ulx - self.geotransform[0]) / self.geotransform[1] + 0.1)
@@ -340,7 +927,38 @@ class file_info(object):
         )
 
         if sw_xsize < 1 or sw_ysize < 1:
+            return None
+
+        return (
+            (sw_xoff, sw_yoff, sw_xsize, sw_ysize),
+            (tw_xoff, tw_yoff, tw_xsize, tw_ysize),
+        )
+
+    def copy_into(self, t_fh, s_band=1, t_band=1, nodata_arg=None, verbose=0):
+        """
+        Copy this files image into target file.
+
+        This method will compute the overlap area of the file_info objects
+        file, and the target gdal.Dataset object, and copy the image data
+        for the common window area.  It is assumed that the files are in
+        a compatible projection ... no checking or warping is done.  However,
+        if the destination file is a different resolution, or different
+        image pixel type, the appropriate resampling and conversions will
+        be done (using normal GDAL promotion/demotion rules).
+
+        t_fh -- gdal.Dataset object for the file into which some or all
+        of this file may be copied.
+
+        Returns 1 on success (or if nothing needs to be copied), and zero one
+        failure.
+        """
+        windows = self.get_copy_windows(
+            t_fh.GetGeoTransform(), t_fh.RasterXSize, t_fh.RasterYSize
+        )
+        if windows is None:
             return 1
+        sw_xoff, sw_yoff, sw_xsize, sw_ysize = windows[0]
+        tw_xoff, tw_yoff, tw_xsize, tw_ysize = windows[1]
 
         # Open the source file, and copy the selected region.
         s_fh = gdal.Open(self.filename)
@@ -371,7 +989,8 @@ def Usage():
     )
     print('                     [-ul_lr ulx uly lrx lry] [-init "value [value...]"]')
     print("                     [-n nodata_value] [-a_nodata output_nodata_value]")
-    print("                     [-ot datatype] [-createonly] input_files")
+    print("                     [-ot datatype] [-createonly] [-threads n]")
+    print("                     [-footprint_cache filename] input_files")
     print("                     [--help-general]")
     print("")
     return 2
@@ -394,6 +1013,8 @@ def gdal_merge(argv=None):
     pre_init = []
     band_type = None
     createonly = 0
+    threads = None
+    footprint_cache = None
     bTargetAlignedPixels = False
     start_time = time.time()
 
@@ -421,6 +1042,17 @@ def gdal_merge(argv=None):
         elif arg == "-createonly":
             createonly = 1
 
+        elif arg == "-threads":
+            i = i + 1
+            threads = int(argv[i])
+            if threads < 1:
+                print("The number of threads must be positive.")
+                return 1
+
+        elif arg == "-footprint_cache":
+            i = i + 1
+            footprint_cache = argv[i]
+
         elif arg == "-separate":
             separate = 1
 
@@ -504,7 +1136,7 @@ def gdal_merge(argv=None):
         return 1
 
     # Collect information on all the source files.
-    file_infos = names_to_fileinfos(names)
+    file_infos = names_to_fileinfos(names, threads, footprint_cache)
 
     if ulx is None:
         ulx = file_infos[0].ulx
@@ -596,34 +1228,58 @@ def gdal_merge(argv=None):
         progress(0.0)
     fi_processed = 0
 
-    for fi in file_infos:
-        if createonly != 0:
-            continue
+    if createonly == 0 and numpy_available:
+        # Walk the output blocks in order, writing each of them once.
+        band_sources = [[] for _ in range(t_fh.RasterCount)]
+        for i, fi in enumerate(file_infos):
+            if verbose != 0:
+                fi.report()
+            if separate == 0:
+                for band in range(1, bands + 1):
+                    band_sources[band - 1].append((i, band))
+            else:
+                for band in range(1, fi.bands + 1):
+                    band_sources[t_band - 1].append((i, band))
+                    t_band = t_band + 1
+
+        merge_by_blocks(
+            t_fh,
+            file_infos,
+            band_sources,
+            nodata,
+            verbose,
+            progress if quiet == 0 and verbose == 0 else None,
+            threads,
+        )
+    else:
+        for fi in file_infos:
+            if createonly != 0:
+                continue
 
-        if verbose != 0:
-            print("")
-            print(
-                "Processing file %5d of %5d, %6.3f%% completed in %d minutes."
-                % (
-                    fi_processed + 1,
-                    len(file_infos),
-                    fi_processed * 100.0 / len(file_infos),
-                    int(round((time.time() - start_time) / 60.0)),
+            if verbose != 0:
+                print("")
+                print(
+                    "Processing file %5d of %5d, %6.3f%% completed in %d minutes."
+                    % (
+                        fi_processed + 1,
+                        len(file_infos),
+                        fi_processed * 100.0 / len(file_infos),
+                        int(round((time.time() - start_time) / 60.0)),
+                    )
                 )
-            )
-            fi.report()
-
-        if separate == 0:
-            for band in range(1, bands + 1):
-                fi.copy_into(t_fh, band, band, nodata, verbose)
-        else:
-            for band in range(1, fi.bands + 1):
-                fi.copy_into(t_fh, band, t_band, nodata, verbose)
-                t_band = t_band + 1
-
-        fi_processed = fi_processed + 1
-        if quiet == 0 and verbose == 0:
-            progress(fi_processed / float(len(file_infos)))
+                fi.report()
+
+            if separate == 0:
+                for band in range(1, bands + 1):
+                    fi.copy_into(t_fh, band, band, nodata, verbose)
+            else:
+                for band in range(1, fi.bands + 1):
+                    fi.copy_into(t_fh, band, t_band, nodata, verbose)
+                    t_band = t_band + 1
+
+            fi_processed = fi_processed + 1
+            if quiet == 0 and verbose == 0:
+                progress(fi_processed / float(len(file_infos)))
 
     # Force file to be closed.
     t_fh = None
@@ -30,6 +30,8 @@
 ###############################################################################
 from __future__ import print_function
 
+import collections
+import multiprocessing
 import os
 import shutil
 import sys
@@ -38,6 +40,9 @@ from osgeo import gdal, ogr, osr
 
 progress = gdal.TermProgress_nocb
 
+# Number of tile footprints added to the tile index per transaction
+TILE_INDEX_BATCH_SIZE = 1000
+
 
 class AffineTransformDecorator(object):
     """A class providing some useful methods for affine Transformations"""
@@ -70,34 +75,77 @@ class AffineTransformDecorator(object):
         return [xlist, ylist]
 
 
+def getDataSetCacheSize():
+    """
+    Return how many source datasets can be kept open, from the limit of
+    open files of the process
+    """
+    try:
+        import resource
+
+        maxFiles = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    except (ImportError, ValueError, OSError):
+        # No resource module on Windows, where the C runtime defaults to 512
+        maxFiles = 512
+    if maxFiles < 0:  # RLIM_INFINITY
+        maxFiles = 4096
+    # Leave room for the tiles being written and for GDAL sidecar files
+    return max(8, min(1024, maxFiles // 4))
+
+
 class DataSetCache(object):
-    """A class for caching source tiles"""
+    """A class for caching source tiles, evicting the least recently used"""
 
-    def __init__(self):
-        self.cacheSize = 8
-        self.queue = []
-        self.dict = {}
+    def __init__(self, cacheSize=None):
+        if cacheSize is None:
+            cacheSize = getDataSetCacheSize()
+        self.cacheSize = cacheSize
+        self.dict = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
     def get(self, name):
 
         if name in self.dict:
+            self.hits += 1
+            self.dict.move_to_end(name)
             return self.dict[name]
+        self.misses += 1
         result = gdal.Open(name)
         if result is None:
-            print("Error opening: %s" % NameError)
+            print("Error opening: %s" % name)
             return 1
-        if len(self.queue) == self.cacheSize:
-            toRemove = self.queue.pop(0)
-            del self.dict[toRemove]
-        self.queue.append(name)
+        if len(self.dict) == self.cacheSize:
+            self.dict.popitem(last=False)
         self.dict[name] = result
         return result
 
     def __del__(self):
-        for dataset in self.dict.values():
-            del dataset
-        del self.queue
-        del self.dict
+        self.dict.clear()
+
+
+class TileIndexWriter(object):
+    """A class adding tile footprints to a tile index in batched transactions"""
+
+    def __init__(self, fieldName, OGRDataSource, batchSize=TILE_INDEX_BATCH_SIZE):
+        self.fieldName = fieldName
+        self.OGRDataSource = OGRDataSource
+        self.batchSize = batchSize
+        self.pending = 0
+        self.transactions = OGRDataSource.TestCapability(ogr.ODsCTransactions)
+
+    def add(self, location, points):
+        if self.transactions and self.pending == 0:
+            self.OGRDataSource.StartTransaction()
+        addFeature(self.fieldName, self.OGRDataSource, location, points[0], points[1])
+        self.pending += 1
+        if self.pending >= self.batchSize:
+            self.commit()
+
+    def commit(self):
+        if self.transactions and self.pending > 0:
+            self.OGRDataSource.CommitTransaction()
+        self.pending = 0
 
 
 class tile_info(object):
@@ -318,6 +366,225 @@ class mosaic_info(object):
         print("UL:(%f,%f)   LR:(%f,%f)" % (self.ulx, self.uly, self.lrx, self.lry))
 
 
+LOSSY_DRIVERS = (
+    "JPEG",
+    "WEBP",
+    "JPEGXL",
+    "JP2OpenJPEG",
+    "JP2KAK",
+    "JP2ECW",
+    "JP2MrSID",
+)
+LOSSY_COMPRESSIONS = ("JPEG", "WEBP", "JXL", "LERC", "LERC_DEFLATE", "LERC_ZSTD")
+
+
+def isLossyOutput(g):
+    """
+    Tell whether the written tiles may differ from the pixels they are created from
+
+    Drivers and compressions that can be lossy are considered lossy whatever their
+    options, so that tiles are only kept in memory when this is safe.
+    """
+    if g.Format in LOSSY_DRIVERS:
+        return True
+    for option in g.CreateOptions:
+        key, _, value = option.partition("=")
+        if key.upper() == "COMPRESS" and value.upper() in LOSSY_COMPRESSIONS:
+            return True
+    return False
+
+
+class pyramid_level(object):
+    """
+
+    A row buffer holding the rows of a level needed by the next rows of tiles
+    of the level above it
+
+    It provides the parts of mosaic_info used by createPyramidTile(), but
+    serves getDataSet() from the tiles of the level below that were added to
+    it, instead of reading them back from disk.
+
+    """
+
+    def __init__(self, g, minfo, level, xsize, ysize, ti, jobs, nextLevel):
+        """
+        Initialize the buffer of pyramid level level
+
+        minfo -- mosaic_info of the input tiles.
+        xsize, ysize -- size of level - 1.
+        ti, jobs -- tile_info and tile jobs of level.
+        nextLevel -- pyramid_level of level + 1, or None.
+
+        """
+        self.TempDriver = gdal.GetDriverByName("MEM")
+        self.g = g
+        self.level = level
+        self.filename = minfo.filename
+        self.xsize = xsize
+        self.ysize = ysize
+        self.ti = ti
+        self.jobs = jobs
+        self.nextLevel = nextLevel
+        self.nextRow = 0
+
+        # The tiles of all levels share the data type, nodata value, color
+        # table and projection of the level 0 tiles.
+        self.bands = minfo.bands
+        if g.BandType is None:
+            self.band_type = minfo.band_type
+        else:
+            self.band_type = g.BandType
+        if g.Source_SRS is not None and not g.PyramidOnly:
+            self.projection = g.Source_SRS.ExportToWkt()
+        else:
+            self.projection = minfo.projection
+        self.nodata = minfo.nodata
+        self.ct = minfo.ct
+        # Taken from the first tile added, as mosaic_info does
+        self.ci = None
+
+        self.scaleX = minfo.scaleX * 2 ** (level - 1)
+        self.scaleY = minfo.scaleY * 2 ** (level - 1)
+        self.ulx = minfo.ulx
+        self.uly = minfo.uly
+
+        self.stripDS = None
+        self.stripY0 = 0
+        self.stripY1 = 0
+
+    def setStrip(self, y0, y1):
+        """
+        Make the buffer hold rows y0 to y1 of level - 1, keeping the rows it
+        already holds in that range
+        """
+        stripDS = None
+        if y1 > y0:
+            stripDS = self.TempDriver.Create(
+                "STRIP", self.xsize, y1 - y0, self.bands, self.band_type, []
+            )
+            if self.nodata is not None:
+                for bandNr in range(1, self.bands + 1):
+                    stripDS.GetRasterBand(bandNr).Fill(self.nodata)
+
+            top = max(y0, self.stripY0)
+            bottom = min(y1, self.stripY1)
+            if self.stripDS is not None and bottom > top:
+                for bandNr in range(1, self.bands + 1):
+                    data = self.stripDS.GetRasterBand(bandNr).ReadRaster(
+                        0, top - self.stripY0, self.xsize, bottom - top
+                    )
+                    stripDS.GetRasterBand(bandNr).WriteRaster(
+                        0, top - y0, self.xsize, bottom - top, data
+                    )
+
+        self.stripDS = stripDS
+        self.stripY0 = y0
+        self.stripY1 = y1
+
+    def addTile(self, tileDS, offsetX, offsetY):
+        """
+        Copy a tile of level - 1 at (offsetX, offsetY) into the buffer
+        """
+        if self.ci is None:
+            self.ci = [
+                tileDS.GetRasterBand(iband + 1).GetRasterColorInterpretation()
+                for iband in range(self.bands)
+            ]
+
+        width = min(tileDS.RasterXSize, self.xsize - offsetX)
+        height = min(tileDS.RasterYSize, self.ysize - offsetY)
+        if width <= 0 or height <= 0:
+            return
+
+        # Rows above stripY0 have all been used by the tiles created so far
+        assert offsetY >= self.stripY0
+        if offsetY + height > self.stripY1:
+            self.setStrip(self.stripY0, offsetY + height)
+
+        for bandNr in range(1, self.bands + 1):
+            data = tileDS.GetRasterBand(bandNr).ReadRaster(
+                0, 0, width, height, width, height, self.band_type
+            )
+            self.stripDS.GetRasterBand(bandNr).WriteRaster(
+                offsetX, offsetY - self.stripY0, width, height, data
+            )
+
+    def addTileFile(self, tilename, offsetX, offsetY):
+        tileDS = gdal.Open(tilename)
+        if tileDS is None:
+            print("Error opening: %s" % tilename)
+            return
+        self.addTile(tileDS, offsetX, offsetY)
+
+    def rowsDone(self, rows):
+        """
+
+        Tell that the first rows of level - 1 will not change anymore
+
+        Creates the rows of tiles of this level that only depend on them,
+        then drops the rows that no other row of tiles needs.
+
+        """
+        countX = self.ti.countTilesX
+        while self.nextRow < self.ti.countTilesY:
+            start = self.nextRow * countX
+            rowJobs = self.jobs[start : start + countX]
+            offsetY, height = rowJobs[0][1], rowJobs[0][3]
+            if 2 * (offsetY + height) > rows:
+                break
+
+            createTileRow(self.g, self, self.level, rowJobs, self.nextLevel)
+            self.nextRow += 1
+
+            if self.nextRow < self.ti.countTilesY:
+                # Rows shared with the next row of tiles are only final once
+                # that row has been created, as it overwrites them.
+                doneRows = self.jobs[start + countX][1]
+            else:
+                doneRows = self.ti.height
+            self.setStrip(2 * doneRows, max(2 * doneRows, self.stripY1))
+            if self.nextLevel is not None:
+                self.nextLevel.rowsDone(doneRows)
+
+    def getDataSet(self, minx, miny, maxx, maxy):
+
+        xoff = int((minx - self.ulx) / self.scaleX + 0.5)
+        yoff = int((maxy - self.uly) / self.scaleY + 0.5)
+        resultSizeX = int((maxx - minx) / self.scaleX + 0.5)
+        resultSizeY = int((miny - maxy) / self.scaleY + 0.5)
+
+        if yoff < self.stripY0 or yoff + resultSizeY > self.stripY1:
+            self.setStrip(
+                min(yoff, self.stripY0), max(yoff + resultSizeY, self.stripY1)
+            )
+
+        resultDS = self.TempDriver.Create(
+            "TEMP", resultSizeX, resultSizeY, self.bands, self.band_type, []
+        )
+        resultDS.SetGeoTransform([minx, self.scaleX, 0, maxy, 0, self.scaleY])
+
+        readX = min(resultSizeX, self.xsize - xoff)
+        for bandNr in range(1, self.bands + 1):
+            t_band = resultDS.GetRasterBand(bandNr)
+            if self.nodata is not None:
+                t_band.Fill(self.nodata)
+                t_band.SetNoDataValue(self.nodata)
+            if self.ct is not None:
+                t_band.SetRasterColorTable(self.ct)
+            if self.ci is not None:
+                t_band.SetRasterColorInterpretation(self.ci[bandNr - 1])
+
+            data = self.stripDS.GetRasterBand(bandNr).ReadRaster(
+                xoff, yoff - self.stripY0, readX, resultSizeY
+            )
+            t_band.WriteRaster(0, 0, readX, resultSizeY, data)
+
+        return resultDS
+
+    def closeDataSet(self, memDS):
+        del memDS
+
+
 def getTileIndexFromFiles(g):
     if g.Verbose:
         print("Building internal Index for %d tile(s) ..." % len(g.Names), end=" ")
@@ -360,7 +627,6 @@ def tileImage(g, minfo, ti):
 
     """
 
-    g.LastRowIndx = -1
     OGRDS = createTileIndex(
         g.Verbose,
         "TileResult_0",
@@ -369,24 +635,34 @@ def tileImage(g, minfo, ti):
         g.TileIndexDriverTyp,
     )
 
-    yRange = list(range(1, ti.countTilesY + 1))
-    xRange = list(range(1, ti.countTilesX + 1))
+    jobs = getTileJobs(g, minfo, ti, 0)
+    createTiles(g, minfo, 0, OGRDS, jobs)
+    saveTileIndex(g, OGRDS, 0)
 
-    if not g.Quiet and not g.Verbose:
-        progress(0.0)
-        processed = 0
-        total = len(xRange) * len(yRange)
+    return OGRDS
+
+
+def getTileJobs(g, minfo, ti, level):
+    """
+
+    Return the (offsetX, offsetY, width, height, tilename, feature_only) of
+    the tiles of a level, row by row
+
+    """
+    g.LastRowIndx = -1
+    if level == 0 and not g.UseDirForEachRow:
+        nameLevel = -1
+    else:
+        nameLevel = level
 
-    for yIndex in yRange:
-        for xIndex in xRange:
+    jobs = []
+    for yIndex in range(1, ti.countTilesY + 1):
+        for xIndex in range(1, ti.countTilesX + 1):
             offsetY = (yIndex - 1) * (ti.tileHeight - ti.overlap)
             offsetX = (xIndex - 1) * (ti.tileWidth - ti.overlap)
             height = ti.tileHeight
             width = ti.tileWidth
-            if g.UseDirForEachRow:
-                tilename = getTileName(g, minfo, ti, xIndex, yIndex, 0)
-            else:
-                tilename = getTileName(g, minfo, ti, xIndex, yIndex)
+            tilename = getTileName(g, minfo, ti, xIndex, yIndex, nameLevel)
 
             if offsetX + width > ti.width:
                 width = ti.width - offsetX
@@ -394,29 +670,24 @@ def tileImage(g, minfo, ti):
                 height = ti.height - offsetY
 
             feature_only = g.Resume and os.path.exists(tilename)
-            createTile(
-                g, minfo, offsetX, offsetY, width, height, tilename, OGRDS, feature_only
-            )
+            jobs.append((offsetX, offsetY, width, height, tilename, feature_only))
+    return jobs
 
-            if not g.Quiet and not g.Verbose:
-                processed += 1
-                progress(processed / float(total))
+
+def saveTileIndex(g, OGRDS, level):
+    """
+    Write the requested shapefile and csv tile indexes of a level
+    """
+    if level == 0 and not g.UseDirForEachRow:
+        targetDir = getTargetDir(g)
+    else:
+        targetDir = getTargetDir(g, level)
 
     if g.TileIndexName is not None:
-        if g.UseDirForEachRow and not g.PyramidOnly:
-            shapeName = getTargetDir(g, 0) + g.TileIndexName
-        else:
-            shapeName = getTargetDir(g) + g.TileIndexName
-        copyTileIndexToDisk(g, OGRDS, shapeName)
+        copyTileIndexToDisk(g, OGRDS, targetDir + g.TileIndexName)
 
     if g.CsvFileName is not None:
-        if g.UseDirForEachRow and not g.PyramidOnly:
-            csvName = getTargetDir(g, 0) + g.CsvFileName
-        else:
-            csvName = getTargetDir(g) + g.CsvFileName
-        copyTileIndexToCSV(g, OGRDS, csvName)
-
-    return OGRDS
+        copyTileIndexToCSV(g, OGRDS, targetDir + g.CsvFileName)
 
 
 def copyTileIndexToDisk(g, OGRDS, fileName):
@@ -465,8 +736,336 @@ def copyTileIndexToCSV(g, OGRDS, fileName):
     csvfile.close()
 
 
+def getTileFootprint(minfo, offsetX, offsetY, width, height, factor=1):
+    """
+    Return the corner coordinates of a tile of minfo downsampled by factor
+    """
+    sx = minfo.scaleX * factor
+    sy = minfo.scaleY * factor
+    dec = AffineTransformDecorator(
+        [minfo.ulx + offsetX * sx, sx, 0, minfo.uly + offsetY * sy, 0, sy]
+    )
+    return dec.pointsFor(width, height)
+
+
+def addTileFootprints(g, minfo, OGRDS, jobs, factor=1):
+    """
+    Add the footprints of tile jobs on minfo downsampled by factor to OGRDS
+    """
+    writer = TileIndexWriter(g.TileIndexFieldName, OGRDS)
+    for offsetX, offsetY, width, height, tilename, _ in jobs:
+        points = getTileFootprint(minfo, offsetX, offsetY, width, height, factor)
+        writer.add(tilename, points)
+    writer.commit()
+
+
+def getTileIndexFeatures(OGRDataSource):
+    """
+    Return the (location, xlist, ylist) footprints of a tile index
+    """
+    OGRLayer = OGRDataSource.GetLayer()
+    OGRLayer.SetSpatialFilter(None)
+    OGRLayer.ResetReading()
+    features = []
+    while True:
+        feature = OGRLayer.GetNextFeature()
+        if feature is None:
+            break
+        minx, maxx, miny, maxy = feature.GetGeometryRef().GetEnvelope()
+        features.append(
+            (feature.GetField(0), [minx, maxx, maxx, minx], [maxy, maxy, miny, miny])
+        )
+    return features
+
+
+def getWorkerState(g):
+    """
+    Return a picklable copy of the globals, for the tile workers
+    """
+    state = dict((name, getattr(g, name)) for name in RetileGlobals.__slots__)
+    state["Driver"] = g.Driver.ShortName
+    if g.MemDriver is not None:
+        state["MemDriver"] = g.MemDriver.ShortName
+    if g.Source_SRS is not None:
+        state["Source_SRS"] = g.Source_SRS.ExportToWkt()
+    return state
+
+
+# Globals and mosaic of a tile worker process, set by initTileWorker()
+worker_g = None
+worker_minfo = None
+
+
+def initTileWorker(state, level, filename, features):
+    global worker_g, worker_minfo
+
+    g = RetileGlobals()
+    for name, value in state.items():
+        setattr(g, name, value)
+    g.Driver = gdal.GetDriverByName(state["Driver"])
+    if state["MemDriver"] is not None:
+        g.MemDriver = gdal.GetDriverByName(state["MemDriver"])
+    if state["Source_SRS"] is not None:
+        g.Source_SRS = osr.SpatialReference()
+        g.Source_SRS.ImportFromWkt(state["Source_SRS"])
+
+    inputDS = createTileIndex(
+        False, "TileIndex", g.TileIndexFieldName, None, g.TileIndexDriverTyp
+    )
+    for location, xlist, ylist in features:
+        addFeature(g.TileIndexFieldName, inputDS, location, xlist, ylist)
+
+    worker_g = g
+    worker_minfo = (level, mosaic_info(filename, inputDS))
+
+
+def createTileOfLevel(g, minfo, level, job):
+    """
+    Create one tile of a level, returning the dataset cache hits and misses
+    """
+    hits = minfo.cache.hits
+    misses = minfo.cache.misses
+    offsetX, offsetY, width, height, tilename = job
+    if level == 0:
+        createTile(g, minfo, offsetX, offsetY, width, height, tilename, None, False)
+    else:
+        createPyramidTile(
+            g, minfo, offsetX, offsetY, width, height, tilename, None, False
+        )
+    return minfo.cache.hits - hits, minfo.cache.misses - misses
+
+
+def createTileInWorker(job):
+    level, minfo = worker_minfo
+    return createTileOfLevel(worker_g, minfo, level, job)
+
+
+def hilbertIndex(n, x, y):
+    """
+    Return the distance of cell (x, y) along the Hilbert curve filling a
+    n x n grid, n being a power of two
+    """
+    d = 0
+    s = n // 2
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s //= 2
+    return d
+
+
+def sortTilesByLocality(todo):
+    """
+    Sort tile jobs along a Hilbert curve over the tile grid
+
+    Consecutive tiles then stay close to each other in both directions,
+    which keeps the set of source datasets in use small, whatever the
+    width of the mosaic.
+    """
+    cols = dict((x, i) for i, x in enumerate(sorted(set(job[0] for job in todo))))
+    rows = dict((y, i) for i, y in enumerate(sorted(set(job[1] for job in todo))))
+    n = 1
+    while n < len(cols) or n < len(rows):
+        n *= 2
+    todo.sort(key=lambda job: hilbertIndex(n, cols[job[0]], rows[job[1]]))
+
+
+def createTiles(g, minfo, level, OGRDS, jobs):
+    """
+
+    Create the tiles of one level
+
+    The footprints are added to OGRDS in tile order, then the tiles are
+    created in an order following the spatial locality of the tiles, either
+    in this process or in g.Processes worker processes.
+
+    """
+    addTileFootprints(g, minfo, OGRDS, jobs, 1 if level == 0 else 2)
+    todo = [job[:5] for job in jobs if not job[5]]
+
+    sortTilesByLocality(todo)
+
+    # Only report progress for the base level
+    showProgress = level == 0 and not g.Quiet and not g.Verbose
+    if showProgress:
+        progress(0.0)
+        processed = len(jobs) - len(todo)
+        total = len(jobs)
+        if not todo:
+            progress(1.0)
+
+    hits = 0
+    misses = 0
+    if g.Processes > 1 and len(todo) > 1:
+        # Hand out runs of neighbouring tiles so that each worker keeps reading
+        # the same source tiles from its dataset cache.
+        processes = min(g.Processes, len(todo))
+        chunksize = max(1, min(16, len(todo) // (4 * processes)))
+        pool = multiprocessing.Pool(
+            processes,
+            initTileWorker,
+            (
+                getWorkerState(g),
+                level,
+                minfo.filename,
+                getTileIndexFeatures(minfo.ogrTileIndexDS),
+            ),
+        )
+        results = pool.imap_unordered(createTileInWorker, todo, chunksize)
+    else:
+        pool = None
+        results = (createTileOfLevel(g, minfo, level, job) for job in todo)
+
+    try:
+        for tileHits, tileMisses in results:
+            hits += tileHits
+            misses += tileMisses
+            if showProgress:
+                processed += 1
+                progress(processed / float(total))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if g.Verbose:
+        print(
+            "Level %d source dataset cache: %d hits, %d misses" % (level, hits, misses)
+        )
+
+
+def createTileRow(g, minfo, level, rowJobs, nextLevel):
+    """
+    Create a row of tiles of a level, adding them to nextLevel if not None
+    """
+    for offsetX, offsetY, width, height, tilename, feature_only in rowJobs:
+        if feature_only:
+            if nextLevel is not None:
+                nextLevel.addTileFile(tilename, offsetX, offsetY)
+        elif level == 0:
+            createTile(
+                g,
+                minfo,
+                offsetX,
+                offsetY,
+                width,
+                height,
+                tilename,
+                None,
+                False,
+                nextLevel,
+            )
+        else:
+            createPyramidTile(
+                g,
+                minfo,
+                offsetX,
+                offsetY,
+                width,
+                height,
+                tilename,
+                None,
+                False,
+                nextLevel,
+            )
+
+
+def buildTilesAndPyramid(g, minfo, ti):
+    """
+
+    Create the tiles of level 0, or of level 1 with -pyramidOnly, and of all
+    the pyramid levels above it in a single pass over the input tiles
+
+    Each pyramid level is a pyramid_level row buffer fed with the tiles of
+    the level below as they are created, which creates its own rows of tiles
+    as soon as the rows of the level below they need are complete.
+
+    """
+    baseLevel = 1 if g.PyramidOnly else 0
+    if baseLevel == 0:
+        levelTi = ti
+    else:
+        levelTi = tile_info(
+            int(minfo.xsize / 2),
+            int(minfo.ysize / 2),
+            g.TileWidth,
+            g.TileHeight,
+            g.Overlap,
+        )
+
+    levels = []
+    for level in range(baseLevel, g.Levels + 1):
+        if level > baseLevel:
+            levelTi = tile_info(
+                int(levelTi.width / 2),
+                int(levelTi.height / 2),
+                g.TileWidth,
+                g.TileHeight,
+                g.Overlap,
+            )
+        OGRDS = createTileIndex(
+            g.Verbose,
+            "TileResult_" + str(level),
+            g.TileIndexFieldName,
+            g.Source_SRS,
+            g.TileIndexDriverTyp,
+        )
+        jobs = getTileJobs(g, minfo, levelTi, level)
+        addTileFootprints(g, minfo, OGRDS, jobs, 2**level)
+        levels.append((level, levelTi, jobs, OGRDS))
+
+    nextLevel = None
+    for i in range(len(levels) - 1, 0, -1):
+        level, levelTi, jobs, _ = levels[i]
+        sourceTi = levels[i - 1][1]
+        nextLevel = pyramid_level(
+            g, minfo, level, sourceTi.width, sourceTi.height, levelTi, jobs, nextLevel
+        )
+
+    _, baseTi, baseJobs, _ = levels[0]
+    showProgress = baseLevel == 0 and not g.Quiet and not g.Verbose
+    if showProgress:
+        progress(0.0)
+
+    countX = baseTi.countTilesX
+    for row in range(baseTi.countTilesY):
+        rowJobs = baseJobs[row * countX : (row + 1) * countX]
+        createTileRow(g, minfo, baseLevel, rowJobs, nextLevel)
+        if nextLevel is not None:
+            if row + 1 < baseTi.countTilesY:
+                nextLevel.rowsDone(baseJobs[(row + 1) * countX][1])
+            else:
+                nextLevel.rowsDone(baseTi.height)
+        if showProgress:
+            progress((row + 1) / float(baseTi.countTilesY))
+
+    if g.Verbose:
+        print(
+            "Level %d source dataset cache: %d hits, %d misses"
+            % (baseLevel, minfo.cache.hits, minfo.cache.misses)
+        )
+
+    for level, _, _, OGRDS in levels:
+        saveTileIndex(g, OGRDS, level)
+
+
 def createPyramidTile(
-    g, levelMosaicInfo, offsetX, offsetY, width, height, tileName, OGRDS, feature_only
+    g,
+    levelMosaicInfo,
+    offsetX,
+    offsetY,
+    width,
+    height,
+    tileName,
+    OGRDS,
+    feature_only,
+    nextLevel=None,
 ):
 
     temp_tilename = tileName + ".tmp"
@@ -486,7 +1085,7 @@ def createPyramidTile(
     )
 
     if OGRDS is not None:
-        points = dec.pointsFor(width, height)
+        points = getTileFootprint(levelMosaicInfo, offsetX, offsetY, width, height, 2)
         addFeature(g.TileIndexFieldName, OGRDS, tileName, points[0], points[1])
 
     if feature_only:
@@ -544,12 +1143,20 @@ def createPyramidTile(
         tt_fh.FlushCache()
         tt_fh = None
 
+    # with a lossy output, the next level is built from the tile as written
+    lossy = isLossyOutput(g)
+    if nextLevel is not None and not lossy:
+        nextLevel.addTile(t_fh, offsetX, offsetY)
+
     t_fh = None
 
     if os.path.exists(tileName):
         os.remove(tileName)
     shutil.move(temp_tilename, tileName)
 
+    if nextLevel is not None and lossy:
+        nextLevel.addTileFile(tileName, offsetX, offsetY)
+
     if g.Verbose:
         print(
             tileName
@@ -565,12 +1172,23 @@ def createPyramidTile(
 
 
 def createTile(
-    g, minfo, offsetX, offsetY, width, height, tilename, OGRDS, feature_only
+    g,
+    minfo,
+    offsetX,
+    offsetY,
+    width,
+    height,
+    tilename,
+    OGRDS,
+    feature_only,
+    nextLevel=None,
 ):
     """
 
     Create tile
 
+    If nextLevel is a pyramid_level, the created tile is also added to it.
+
     """
     temp_tilename = tilename + ".tmp"
 
@@ -593,8 +1211,7 @@ def createTile(
     ]
 
     if OGRDS is not None:
-        dec2 = AffineTransformDecorator(geotransform)
-        points = dec2.pointsFor(width, height)
+        points = getTileFootprint(minfo, offsetX, offsetY, width, height)
         addFeature(g.TileIndexFieldName, OGRDS, tilename, points[0], points[1])
 
     if feature_only:
@@ -647,12 +1264,20 @@ def createTile(
         tt_fh.FlushCache()
         tt_fh = None
 
+    # with a lossy output, the next level is built from the tile as written
+    lossy = isLossyOutput(g)
+    if nextLevel is not None and not lossy:
+        nextLevel.addTile(t_fh, offsetX, offsetY)
+
     t_fh = None
 
     if os.path.exists(tilename):
         os.remove(tilename)
     shutil.move(temp_tilename, tilename)
 
+    if nextLevel is not None and lossy:
+        nextLevel.addTileFile(tilename, offsetX, offsetY)
+
     if g.Verbose:
         print(
             tilename
@@ -741,7 +1366,6 @@ def closeTileIndex(OGRDataSource):
 def buildPyramid(g, minfo, createdTileIndexDS, tileWidth, tileHeight, overlap):
     inputDS = createdTileIndexDS
     for level in range(1, g.Levels + 1):
-        g.LastRowIndx = -1
         levelMosaicInfo = mosaic_info(minfo.filename, inputDS)
         levelOutputTileInfo = tile_info(
             int(levelMosaicInfo.xsize / 2),
@@ -754,9 +1378,6 @@ def buildPyramid(g, minfo, createdTileIndexDS, tileWidth, tileHeight, overlap):
 
 
 def buildPyramidLevel(g, levelMosaicInfo, levelOutputTileInfo, level):
-    yRange = list(range(1, levelOutputTileInfo.countTilesY + 1))
-    xRange = list(range(1, levelOutputTileInfo.countTilesX + 1))
-
     OGRDS = createTileIndex(
         g.Verbose,
         "TileResult_" + str(level),
@@ -765,46 +1386,9 @@ def buildPyramidLevel(g, levelMosaicInfo, levelOutputTileInfo, level):
         g.TileIndexDriverTyp,
     )
 
-    for yIndex in yRange:
-        for xIndex in xRange:
-            offsetY = (yIndex - 1) * (
-                levelOutputTileInfo.tileHeight - levelOutputTileInfo.overlap
-            )
-            offsetX = (xIndex - 1) * (
-                levelOutputTileInfo.tileWidth - levelOutputTileInfo.overlap
-            )
-            height = levelOutputTileInfo.tileHeight
-            width = levelOutputTileInfo.tileWidth
-
-            if offsetX + width > levelOutputTileInfo.width:
-                width = levelOutputTileInfo.width - offsetX
-            if offsetY + height > levelOutputTileInfo.height:
-                height = levelOutputTileInfo.height - offsetY
-
-            tilename = getTileName(
-                g, levelMosaicInfo, levelOutputTileInfo, xIndex, yIndex, level
-            )
-
-            feature_only = g.Resume and os.path.exists(tilename)
-            createPyramidTile(
-                g,
-                levelMosaicInfo,
-                offsetX,
-                offsetY,
-                width,
-                height,
-                tilename,
-                OGRDS,
-                feature_only,
-            )
-
-    if g.TileIndexName is not None:
-        shapeName = getTargetDir(g, level) + g.TileIndexName
-        copyTileIndexToDisk(g, OGRDS, shapeName)
-
-    if g.CsvFileName is not None:
-        csvName = getTargetDir(g, level) + g.CsvFileName
-        copyTileIndexToCSV(g, OGRDS, csvName)
+    jobs = getTileJobs(g, levelMosaicInfo, levelOutputTileInfo, level)
+    createTiles(g, levelMosaicInfo, level, OGRDS, jobs)
+    saveTileIndex(g, OGRDS, level)
 
     return OGRDS
 
@@ -873,7 +1457,7 @@ def Usage():
     print("        [ -csv fileName [-csvDelim delimiter]]")
     print("        [-s_srs srs_def]  [-pyramidOnly] -levels numberoflevels")
     print("        [-r {near/bilinear/cubic/cubicspline/lanczos}]")
-    print("        [-useDirForEachRow] [-resume]")
+    print("        [-useDirForEachRow] [-resume] [-processes n]")
     print("        -targetDir TileDirectory input_files")
     return 2
 
@@ -985,6 +1569,12 @@ def main(args=None, g=None):
             g.UseDirForEachRow = True
         elif arg == "-resume":
             g.Resume = True
+        elif arg == "-processes":
+            i += 1
+            g.Processes = int(argv[i])
+            if g.Processes < 1:
+                print("Invalid number of processes : %d" % g.Processes)
+                return 1
         elif arg[:1] == "-":
             print("Unrecognized command option: %s" % arg)
             return Usage()
@@ -1054,14 +1644,19 @@ def main(args=None, g=None):
         minfo.report()
         ti.report()
 
-    if not g.PyramidOnly:
-        dsCreatedTileIndex = tileImage(g, minfo, ti)
-        tileIndexDS.Destroy()
+    if g.Levels > 0 and g.Processes <= 1:
+        buildTilesAndPyramid(g, minfo, ti)
     else:
-        dsCreatedTileIndex = tileIndexDS
+        if not g.PyramidOnly:
+            dsCreatedTileIndex = tileImage(g, minfo, ti)
+            tileIndexDS.Destroy()
+        else:
+            dsCreatedTileIndex = tileIndexDS
 
-    if g.Levels > 0:
-        buildPyramid(g, minfo, dsCreatedTileIndex, g.TileWidth, g.TileHeight, g.Overlap)
+        if g.Levels > 0:
+            buildPyramid(
+                g, minfo, dsCreatedTileIndex, g.TileWidth, g.TileHeight, g.Overlap
+            )
 
     if g.Verbose:
         print("FINISHED")
@@ -1095,6 +1690,7 @@ class RetileGlobals:
         "LastRowIndx",
         "UseDirForEachRow",
         "Resume",
+        "Processes",
     ]
 
     def __init__(self):
@@ -1125,6 +1721,7 @@ class RetileGlobals:
         self.LastRowIndx = -1
         self.UseDirForEachRow = False
         self.Resume = False
+        self.Processes = 1
 
 
 if __name__ == "__main__":
@@ -39,6 +39,7 @@ import numpy as np
 
 from osgeo import gdal
 from osgeo_utils.auxiliary.base import PathLikeOrStr
+from osgeo_utils.auxiliary.block_util import process_by_blocks
 from osgeo_utils.auxiliary.color_palette import get_color_palette
 from osgeo_utils.auxiliary.color_table import get_color_table
 from osgeo_utils.auxiliary.gdal_argparse import GDALArgumentParser, GDALScript
@@ -54,6 +55,7 @@ def pct2rgb(
     band_number: int = 1,
     out_bands: int = 3,
     driver_name: Optional[str] = None,
+    threads: Optional[int] = None,
 ):
     # Open source file
     src_ds = open_ds(src_filename)
@@ -122,19 +124,19 @@ def pct2rgb(
         tif_ds.SetGCPs(src_ds.GetGCPs(), src_ds.GetGCPProjection())
 
     # ----------------------------------------------------------------------------
-    # Do the processing one scanline at a time.
+    # Do the processing one block at a time.
 
-    progress(0.0)
-    for iY in range(src_ds.RasterYSize):
-        src_data = src_band.ReadAsArray(0, iY, src_ds.RasterXSize, 1)
-
-        for iBand in range(out_bands):
-            band_lookup = lookup[iBand]
-
-            dst_data = np.take(band_lookup, src_data)
-            tif_ds.GetRasterBand(iBand + 1).WriteArray(dst_data, 0, iY)
+    def lookup_colors(src_data):
+        return [np.take(lookup[iBand], src_data) for iBand in range(out_bands)]
 
-        progress((iY + 1.0) / src_ds.RasterYSize)
+    progress(0.0)
+    process_by_blocks(
+        [src_band],
+        [tif_ds.GetRasterBand(iBand + 1) for iBand in range(out_bands)],
+        lookup_colors,
+        threads=threads,
+        callback=progress,
+    )
 
     # ----------------------------------------------------------------------------
     # Translate intermediate file to output format if desired format is not TIFF.
@@ -208,6 +210,15 @@ class PCT2RGB(GDALScript):
             "palette or a color file in a supported format (txt, qml, qlr).",
         )
 
+        parser.add_argument(
+            "-threads",
+            dest="threads",
+            metavar="n",
+            type=int,
+            help="Look up the colors of the blocks in n threads, "
+            "while the input is read and the output written by a single thread.",
+        )
+
         parser.add_argument("src_filename", type=str, help="The input file.")
 
         parser.add_argument(
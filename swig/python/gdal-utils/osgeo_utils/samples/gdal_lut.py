@@ -34,6 +34,7 @@ import sys
 import numpy as np
 
 from osgeo import gdal
+from osgeo_utils.auxiliary.block_util import process_by_blocks
 
 gdal.TermProgress = gdal.TermProgress_nocb
 
@@ -216,16 +217,15 @@ def main(argv=sys.argv):
     dst_band = dst_ds.GetRasterBand(dst_band_n)
 
     # ----------------------------------------------------------------------------
-    # Do the processing one scanline at a time.
+    # Do the processing one block at a time.
 
     gdal.TermProgress(0.0)
-    for iY in range(src_ds.RasterYSize):
-        src_data = src_band.ReadAsArray(0, iY, src_ds.RasterXSize, 1)
-
-        dst_data = np.take(lookup, src_data)
-        dst_band.WriteArray(dst_data, 0, iY)
-
-        gdal.TermProgress((iY + 1.0) / src_ds.RasterYSize)
+    process_by_blocks(
+        [src_band],
+        [dst_band],
+        lambda src_data: [np.take(lookup, src_data)],
+        callback=gdal.TermProgress,
+    )
 
     src_ds = None
     dst_ds = None
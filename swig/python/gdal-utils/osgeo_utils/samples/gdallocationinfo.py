@@ -29,6 +29,8 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 ###############################################################################
+import collections
+import json
 import sys
 import textwrap
 from enum import Enum, auto
@@ -79,6 +81,177 @@ CoordinateTransformationOrSRS = Optional[
     Union[osr.CoordinateTransformation, LocationInfoSRS, AnySRS]
 ]
 
+# Radius, in pixels, of the resampling kernels that sample_by_blocks() computes
+SAMPLE_KERNEL_RADIUS = {
+    gdalconst.GRIORA_NearestNeighbour: 0,
+    gdalconst.GRIORA_Bilinear: 1,
+    gdalconst.GRIORA_Cubic: 2,
+}
+
+
+def _kernel_weights(resample_alg, dist: np.ndarray) -> np.ndarray:
+    dist = np.abs(dist)
+    if resample_alg == gdalconst.GRIORA_Bilinear:
+        return np.maximum(0, 1 - dist)
+    # Cubic convolution with a = -0.5, as in GDAL
+    return np.where(
+        dist <= 1,
+        (1.5 * dist - 2.5) * dist * dist + 1,
+        np.where(dist < 2, ((-0.5 * dist + 2.5) * dist - 4) * dist + 2, 0),
+    )
+
+
+def sample_by_blocks(
+    ds: gdal.Dataset,
+    bands: Sequence[gdal.Band],
+    pixels: np.ndarray,
+    lines: np.ndarray,
+    resample_alg=gdalconst.GRIORA_NearestNeighbour,
+    dataset_bands: bool = True,
+) -> np.ndarray:
+    """
+    Returns the values of the given bands at the given pixel/line locations, shape (bands, points)
+
+    The points are grouped by the block of the bands they fall in, and each touched block
+    is read once, for all the bands at once if dataset_bands is True (the bands are bands of ds,
+    not overviews). The sampled pixels are the ones a 1x1 RasterIO window at
+    (pixel - 0.5, line - 0.5) would return: nearest neighbour, or the bilinear or cubic kernels
+    of GDAL, renormalized to ignore the pixels outside the raster or equal to the nodata value.
+    Locations out of the raster get the band nodata value, or 0.
+    """
+    radius = SAMPLE_KERNEL_RADIUS[resample_alg]
+    buf_type, typecode = GDALTypeCodeAndNumericTypeCodeFromDataSet(ds)
+    bnd_count = len(bands)
+    xsize, ysize = bands[0].XSize, bands[0].YSize
+    block_xsize, block_ysize = bands[0].GetBlockSize()
+    nodatas = [band.GetNoDataValue() for band in bands]
+
+    pixels = np.asarray(pixels, dtype=np.float64)
+    lines = np.asarray(lines, dtype=np.float64)
+    results = np.empty((bnd_count, len(pixels)), dtype=typecode)
+    for bnd_idx, nodata in enumerate(nodatas):
+        results[bnd_idx] = 0 if nodata is None else nodata
+
+    # A 1x1 window at (pixel - 0.5) is accepted by RasterIO if int(pixel) is in the raster
+    with np.errstate(invalid="ignore"):
+        valid = (
+            (np.trunc(pixels) >= 0)
+            & (np.trunc(pixels) < xsize)
+            & (np.trunc(lines) >= 0)
+            & (np.trunc(lines) < ysize)
+        )
+    (point_idx,) = np.nonzero(valid)
+    if not len(point_idx):
+        return results
+    pixels = pixels[point_idx]
+    lines = lines[point_idx]
+
+    # First kernel tap of each point, and the block it falls in
+    if radius == 0:
+        col0 = np.trunc(pixels).astype(np.int64)
+        row0 = np.trunc(lines).astype(np.int64)
+    else:
+        col0 = np.floor(pixels - 0.5).astype(np.int64) - (radius - 1)
+        row0 = np.floor(lines - 0.5).astype(np.int64) - (radius - 1)
+    taps = max(1, 2 * radius)
+    block_x = np.clip(col0 + radius, 0, xsize - 1) // block_xsize
+    block_y = np.clip(row0 + radius, 0, ysize - 1) // block_ysize
+    block_ids = block_y * ((xsize + block_xsize - 1) // block_xsize) + block_x
+
+    order = np.argsort(block_ids, kind="stable")
+    starts = np.flatnonzero(np.diff(block_ids[order], prepend=-1))
+    ends = np.append(starts[1:], len(order))
+
+    is_int = np.issubdtype(typecode, np.integer)
+    for start, end in zip(starts, ends):
+        group = order[start:end]
+        bx, by = block_x[group[0]], block_y[group[0]]
+        x0 = max(0, bx * block_xsize - radius)
+        y0 = max(0, by * block_ysize - radius)
+        x1 = min(xsize, (bx + 1) * block_xsize + radius)
+        y1 = min(ysize, (by + 1) * block_ysize + radius)
+        if dataset_bands:
+            data = ds.ReadAsArray(
+                int(x0),
+                int(y0),
+                int(x1 - x0),
+                int(y1 - y0),
+                band_list=[band.GetBand() for band in bands],
+                buf_type=buf_type,
+            )
+        else:
+            data = np.stack(
+                [
+                    band.ReadAsArray(
+                        int(x0), int(y0), int(x1 - x0), int(y1 - y0), buf_type=buf_type
+                    )
+                    for band in bands
+                ]
+            )
+        data = data.reshape(bnd_count, y1 - y0, x1 - x0)
+
+        if radius == 0:
+            values = data[:, row0[group] - y0, col0[group] - x0]
+        else:
+            cols = col0[group, np.newaxis] + np.arange(taps)
+            rows = row0[group, np.newaxis] + np.arange(taps)
+            wx = _kernel_weights(resample_alg, cols + 0.5 - pixels[group, np.newaxis])
+            wy = _kernel_weights(resample_alg, rows + 0.5 - lines[group, np.newaxis])
+            wx[(cols < 0) | (cols >= xsize)] = 0
+            wy[(rows < 0) | (rows >= ysize)] = 0
+            # dims: (points, taps, taps)
+            weights = wy[:, :, np.newaxis] * wx[:, np.newaxis, :]
+            window = data[
+                :,
+                np.clip(rows, y0, y1 - 1)[:, :, np.newaxis] - y0,
+                np.clip(cols, x0, x1 - 1)[:, np.newaxis, :] - x0,
+            ].astype(np.float64)
+            values = np.empty((bnd_count, len(group)), dtype=typecode)
+            for bnd_idx, nodata in enumerate(nodatas):
+                invalid = np.isnan(window[bnd_idx])
+                if nodata is not None:
+                    invalid |= window[bnd_idx] == nodata
+                band_weights = np.where(invalid, 0, weights)
+                weight_sum = band_weights.sum(axis=(1, 2))
+                has_value = weight_sum != 0
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    value = (
+                        np.nansum(window[bnd_idx] * band_weights, axis=(1, 2))
+                        / weight_sum
+                    )
+                if is_int:
+                    info = np.iinfo(typecode)
+                    value = np.clip(
+                        np.sign(value) * np.floor(np.abs(value) + 0.5),
+                        info.min,
+                        info.max,
+                    )
+                values[bnd_idx] = np.where(
+                    has_value, value, 0 if nodata is None else nodata
+                )
+
+        results[:, point_idx[group]] = values
+
+    return results
+
+
+def get_points_transform(
+    ds: gdal.Dataset,
+    srs: CoordinateTransformationOrSRS,
+    axis_order: Optional[OAMS_AXIS_ORDER] = None,
+) -> Optional[osr.CoordinateTransformation]:
+    """Returns the transformation from the points srs to the srs of ds, or None if there is nothing to do"""
+    if srs in [LocationInfoSRS.PixelLine, LocationInfoSRS.SameAsDS_SRS]:
+        return None
+    if isinstance(srs, osr.CoordinateTransformation):
+        return srs
+    ds_srs = ds.GetSpatialRef()
+    if srs == LocationInfoSRS.SameAsDS_SRS_GeogCS:
+        points_srs = ds_srs.CloneGeogCS()
+    else:
+        points_srs = get_srs(srs, axis_order=axis_order)
+    return get_transform(points_srs, ds_srs)
+
 
 def gdallocationinfo(
     filename_or_ds: PathOrDS,
@@ -121,26 +294,16 @@ def gdallocationinfo(
 
     # Build Spatial Reference object based on coordinate system, fetched from the opened dataset
     if srs != LocationInfoSRS.PixelLine:
-        if srs != LocationInfoSRS.SameAsDS_SRS:
-            ds_srs = ds.GetSpatialRef()
-            ct = None
-            if isinstance(srs, osr.CoordinateTransformation):
-                ct = srs
-            else:
-                if srs == LocationInfoSRS.SameAsDS_SRS_GeogCS:
-                    points_srs = ds_srs.CloneGeogCS()
-                else:
-                    points_srs = get_srs(srs, axis_order=axis_order)
-                ct = get_transform(points_srs, ds_srs)
-            if ct is not None:
-                if not inline_xy_replacement:
-                    x = x.copy()
-                    y = y.copy()
-                    inline_xy_replacement = True
-                transform_points(ct, x, y)
-                if transform_round_digits is not None:
-                    x.round(transform_round_digits, out=x)
-                    y.round(transform_round_digits, out=y)
+        ct = get_points_transform(ds, srs, axis_order)
+        if ct is not None:
+            if not inline_xy_replacement:
+                x = x.copy()
+                y = y.copy()
+                inline_xy_replacement = True
+            transform_points(ct, x, y)
+            if transform_round_digits is not None:
+                x.round(transform_round_digits, out=x)
+                y.round(transform_round_digits, out=y)
 
         # Read geotransform matrix and calculate corresponding pixel coordinates
         geotransform = ds.GetGeoTransform()
@@ -192,29 +355,39 @@ def gdallocationinfo(
     else:
         lines_q = y * line_fact
 
-    buf_xsize = buf_ysize = 1
-    buf_type, typecode = GDALTypeCodeAndNumericTypeCodeFromDataSet(ds)
-    buf_obj = np.empty([buf_ysize, buf_xsize], dtype=typecode)
-
-    for idx, (pixel, line) in enumerate(zip(pixels_q, lines_q)):
-        for bnd_idx, band in enumerate(bands):
-            if (
-                BandRasterIONumPy(
-                    band,
-                    0,
-                    pixel - 0.5,
-                    line - 0.5,
-                    1,
-                    1,
-                    buf_obj,
-                    buf_type,
-                    resample_alg,
-                    None,
-                    None,
-                )
-                == 0
-            ):
-                results[bnd_idx][idx] = buf_obj[0][0]
+    if resample_alg in SAMPLE_KERNEL_RADIUS:
+        results = sample_by_blocks(
+            ds,
+            bands,
+            pixels_q,
+            lines_q,
+            resample_alg=resample_alg,
+            dataset_bands=not ovr_idx,
+        )
+    else:
+        buf_xsize = buf_ysize = 1
+        buf_type, typecode = GDALTypeCodeAndNumericTypeCodeFromDataSet(ds)
+        buf_obj = np.empty([buf_ysize, buf_xsize], dtype=typecode)
+
+        for idx, (pixel, line) in enumerate(zip(pixels_q, lines_q)):
+            for bnd_idx, band in enumerate(bands):
+                if (
+                    BandRasterIONumPy(
+                        band,
+                        0,
+                        pixel - 0.5,
+                        line - 0.5,
+                        1,
+                        1,
+                        buf_obj,
+                        buf_type,
+                        resample_alg,
+                        None,
+                        None,
+                    )
+                    == 0
+                ):
+                    results[bnd_idx][idx] = buf_obj[0][0]
 
     is_scaled, scales, offsets = get_scales_and_offsets(bands)
     if is_scaled:
@@ -294,6 +467,152 @@ def gdallocationinfo_util(
     return results
 
 
+def json_values(a: np.ndarray) -> list:
+    """Returns the values of a as (nested) lists, with None in place of NaN, which JSON lacks"""
+    if a.dtype.kind != "f":
+        return a.tolist()
+    return np.where(np.isnan(a), None, a.astype(object)).tolist()
+
+
+class LocationSampler:
+    """
+    A long lived sampler, for answering many location queries without reopening the datasets.
+
+    The opened datasets, their inverse geotransforms and the coordinate transformations
+    to their srs are kept between queries; at most max_datasets datasets are kept open,
+    the least recently used one is closed first.
+    Raster blocks are cached by the GDAL block cache, its size can be bounded with cache_max (bytes).
+    """
+
+    def __init__(
+        self,
+        max_datasets: int = 64,
+        cache_max: Optional[int] = None,
+        open_options: Optional[dict] = None,
+        axis_order: Optional[OAMS_AXIS_ORDER] = None,
+    ):
+        self.max_datasets = max_datasets
+        self.open_options = open_options
+        self.axis_order = axis_order
+        self.datasets = collections.OrderedDict()
+        if cache_max is not None:
+            gdal.SetCacheMax(cache_max)
+
+    def get_dataset(self, filename: str):
+        """Returns (ds, inv_geotransform, transforms) of the given filename, opening it if needed"""
+        entry = self.datasets.get(filename)
+        if entry is not None:
+            self.datasets.move_to_end(filename)
+            return entry
+        ds = open_ds(filename, open_options=self.open_options)
+        if ds is None:
+            raise Exception(f"Could not open {filename}.")
+        geotransform = ds.GetGeoTransform()
+        entry = (ds, gdal.InvGeoTransform(geotransform), {})
+        if len(self.datasets) >= self.max_datasets:
+            self.datasets.popitem(last=False)
+        self.datasets[filename] = entry
+        return entry
+
+    def sample(
+        self,
+        filename: str,
+        x: ArrayOrScalarLike,
+        y: ArrayOrScalarLike,
+        srs: CoordinateTransformationOrSRS = None,
+        band_nums: Optional[Sequence[int]] = None,
+        ovr_idx: Optional[int] = None,
+        resample_alg=gdalconst.GRIORA_NearestNeighbour,
+        axis_order: Optional[OAMS_AXIS_ORDER] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Same as gdallocationinfo(), using the cached dataset, geotransform and transformation
+        The axis order of srs defaults to the one given to the constructor.
+        """
+        ds, inv_geotransform, transforms = self.get_dataset(filename)
+        if axis_order is None:
+            axis_order = self.axis_order
+        x = np.array(x, dtype=np.float64, ndmin=1)
+        y = np.array(y, dtype=np.float64, ndmin=1)
+        if len(x) != len(y):
+            raise Exception(f"len(x)={len(x)} should be the same as len(y)={len(y)}")
+        if srs is None:
+            srs = LocationInfoSRS.PixelLine
+        if srs != LocationInfoSRS.PixelLine:
+            if isinstance(srs, (osr.CoordinateTransformation, osr.SpatialReference)):
+                ct = get_points_transform(ds, srs, axis_order)
+            else:
+                key = (srs, axis_order)
+                if key not in transforms:
+                    transforms[key] = get_points_transform(ds, srs, axis_order)
+                ct = transforms[key]
+            if inv_geotransform is None:
+                raise Exception("Failed InvGeoTransform()")
+            transform_points(ct, x, y)
+            x, y = (
+                inv_geotransform[0] + inv_geotransform[1] * x + inv_geotransform[2] * y
+            ), (inv_geotransform[3] + inv_geotransform[4] * x + inv_geotransform[5] * y)
+        return gdallocationinfo(
+            filename_or_ds=ds,
+            x=x,
+            y=y,
+            ovr_idx=ovr_idx,
+            band_nums=band_nums,
+            inline_xy_replacement=True,
+            resample_alg=resample_alg,
+        )
+
+    def answer(self, request: dict, **defaults) -> dict:
+        """
+        Answers a single JSON request, i.e.
+        {"filename": ..., "x": [...], "y": [...], "srs": ..., "axis_order": "gis" or "authority",
+        "band_nums": [...], "ovr_idx": ..., "interp": ...}
+        The keys missing from the request are taken from defaults, except that the srs of a request
+        is in the traditional GIS axis order (as with -l_srs) unless the request gives axis_order.
+        Returns {"pixel": [...], "line": [...], "values": [[...], ...]} with a list of values per band
+        (null for NaN values), or {"error": message}
+        """
+        kwargs = dict(defaults)
+        kwargs.update(request)
+        try:
+            interp = kwargs.pop("interp", False)
+            kwargs["resample_alg"] = (
+                gdal.GRIORA_Bilinear if interp else gdal.GRIORA_NearestNeighbour
+            )
+            axis_order = kwargs.get("axis_order")
+            if isinstance(axis_order, str):
+                if axis_order.lower() not in ["gis", "authority"]:
+                    raise Exception(f"Unknown axis order {axis_order}")
+                axis_order = get_axis_order_from_gis_order(axis_order.lower() == "gis")
+            elif "srs" in request and "axis_order" not in request:
+                axis_order = get_axis_order_from_gis_order(True)
+            kwargs["axis_order"] = axis_order
+            pixels, lines, results = self.sample(**kwargs)
+        except Exception as e:
+            return {"error": str(e)}
+        return {
+            "pixel": json_values(pixels),
+            "line": json_values(lines),
+            "values": json_values(results),
+        }
+
+    def serve(self, input_file=None, output_file=None, **defaults):
+        """Answers JSON requests, one per line of input_file, writing one JSON response per line to output_file"""
+        input_file = input_file or sys.stdin
+        output_file = output_file or sys.stdout
+        for line in input_file:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"error": str(e)}
+            else:
+                response = self.answer(request, **defaults)
+            output_file.write(json.dumps(response) + "\n")
+            output_file.flush()
+
+
 def val_at_coord(
     filename: str,
     longitude: Real,
@@ -437,6 +756,16 @@ class GDALLocationInfo(GDALScript):
             help="If set, a Bilinear interpolation would be used, otherwise the NearestNeighbour sampling.",
         )
 
+        parser.add_argument(
+            "-serve",
+            dest="serve",
+            action="store_true",
+            help="Keep the dataset open and answer JSON requests read from stdin, one per line, "
+            'i.e. {"x": [...], "y": [...]}, writing one JSON response per line to stdout. '
+            'A request may also give "filename", "srs", "axis_order", "band_nums", "ovr_idx" '
+            'and "interp", otherwise the ones of the command line are used. NaN values are null.',
+        )
+
         parser.add_argument(
             "-b",
             dest="band_nums",
@@ -556,6 +885,18 @@ class GDALLocationInfo(GDALScript):
         return kwargs
 
     def doit(self, **kwargs):
+        if kwargs.pop("serve"):
+            sampler = LocationSampler(
+                open_options=kwargs["open_options"], axis_order=kwargs["axis_order"]
+            )
+            return sampler.serve(
+                filename=kwargs["filename_or_ds"],
+                srs=kwargs["srs"],
+                axis_order=kwargs["axis_order"],
+                band_nums=kwargs["band_nums"],
+                ovr_idx=kwargs["ovr_idx"],
+                interp=kwargs["resample_alg"] == gdal.GRIORA_Bilinear,
+            )
         if self.interactive_mode:
             is_pixel_line = kwargs["srs"] == LocationInfoSRS.PixelLine
             while True:
@@ -36,6 +36,7 @@ import sys
 import numpy
 
 from osgeo import gdal
+from osgeo_utils.auxiliary.block_util import process_by_blocks
 
 # =============================================================================
 # rgb_to_hsv()
@@ -204,24 +205,18 @@ def main(argv=sys.argv):
         print("Color and hillshade must be the same size in pixels.")
         return 1
 
-    # loop over lines to apply hillshade
-    for i in range(hillband.YSize):
-        # load RGB and Hillshade arrays
-        rScanline = rBand.ReadAsArray(0, i, hillband.XSize, 1, hillband.XSize, 1)
-        gScanline = gBand.ReadAsArray(0, i, hillband.XSize, 1, hillband.XSize, 1)
-        bScanline = bBand.ReadAsArray(0, i, hillband.XSize, 1, hillband.XSize, 1)
-        hillScanline = hillband.ReadAsArray(0, i, hillband.XSize, 1, hillband.XSize, 1)
-
+    # apply hillshade block by block
+    def merge_block(rBlock, gBlock, bBlock, hillBlock, aBlock=None):
         # convert to HSV
-        hsv = rgb_to_hsv(rScanline, gScanline, bScanline)
+        hsv = rgb_to_hsv(rBlock, gBlock, bBlock)
 
         # if there's nodata on the hillband, use the v value from the color
         # dataset instead of the hillshade value.
         if hillbandnodatavalue is not None:
-            equal_to_nodata = numpy.equal(hillScanline, hillbandnodatavalue)
-            v = numpy.choose(equal_to_nodata, (hillScanline, hsv[2]))
+            equal_to_nodata = numpy.equal(hillBlock, hillbandnodatavalue)
+            v = numpy.choose(equal_to_nodata, (hillBlock, hsv[2]))
         else:
-            v = hillScanline
+            v = hillBlock
 
         # replace v with hillshade
         hsv_adjusted = numpy.asarray([hsv[0], hsv[1], v])
@@ -229,21 +224,25 @@ def main(argv=sys.argv):
         # convert back to RGB
         dst_color = hsv_to_rgb(hsv_adjusted)
 
-        # write out new RGB bands to output one band at a time
-        outband = outdataset.GetRasterBand(1)
-        outband.WriteArray(dst_color[0], 0, i)
-        outband = outdataset.GetRasterBand(2)
-        outband.WriteArray(dst_color[1], 0, i)
-        outband = outdataset.GetRasterBand(3)
-        outband.WriteArray(dst_color[2], 0, i)
-        if aBand is not None:
-            aScanline = aBand.ReadAsArray(0, i, hillband.XSize, 1, hillband.XSize, 1)
-            outband = outdataset.GetRasterBand(4)
-            outband.WriteArray(aScanline, 0, i)
-
-        # update progress line
-        if not quiet:
-            gdal.TermProgress_nocb((float(i + 1) / hillband.YSize))
+        # new RGB bands, and the alpha band copied as is
+        if aBlock is None:
+            return list(dst_color)
+        return list(dst_color) + [aBlock]
+
+    src_bands = [rBand, gBand, bBand, hillband]
+    if aBand is not None:
+        src_bands.append(aBand)
+    process_by_blocks(
+        src_bands,
+        [
+            outdataset.GetRasterBand(iBand)
+            for iBand in range(1, colordataset.RasterCount + 1)
+        ],
+        merge_block,
+        # rgb_to_hsv() and hsv_to_rgb() allocate about 20 float64 arrays per block
+        work_bytes_per_pixel=20 * 8,
+        callback=None if quiet else gdal.TermProgress_nocb,
+    )
 
     return 0
 
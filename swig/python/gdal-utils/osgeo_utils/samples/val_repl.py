@@ -38,6 +38,7 @@ import sys
 import numpy as np
 
 from osgeo import gdal
+from osgeo_utils.auxiliary.block_util import process_by_blocks
 
 gdal.TermProgress = gdal.TermProgress_nocb
 
@@ -127,14 +128,22 @@ def main(argv=sys.argv):
     if prj:
         outdataset.SetProjection(prj)
 
-    for iBand in range(1, indataset.RasterCount + 1):
-        inband = indataset.GetRasterBand(iBand)
-        outband = outdataset.GetRasterBand(iBand)
-
-        for i in range(inband.YSize - 1, -1, -1):
-            scanline = inband.ReadAsArray(0, i, inband.XSize, 1, inband.XSize, 1)
-            scanline = np.choose(np.equal(scanline, inNoData), (scanline, outNoData))
-            outband.WriteArray(scanline, 0, i)
+    def replace_nodata(*blocks):
+        return [
+            np.choose(np.equal(block, inNoData), (block, outNoData)) for block in blocks
+        ]
+
+    process_by_blocks(
+        [
+            indataset.GetRasterBand(iBand)
+            for iBand in range(1, indataset.RasterCount + 1)
+        ],
+        [
+            outdataset.GetRasterBand(iBand)
+            for iBand in range(1, indataset.RasterCount + 1)
+        ],
+        replace_nodata,
+    )
     return 0
 
 